@@ -0,0 +1,113 @@
+"""stress benchmark of VersionedITree - how many reads per second reader
+threads get out of a tree, first on their own and then while a writer thread
+keeps publishing batches of changes.
+
+    python benchmarks/concurrent_stress.py --nodes 100000 --readers 4
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+# so the benchmarks run from a checkout, without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+
+from itree import ITree, VersionedITree, utils
+
+
+def build(nodes):
+    return ITree.from_nested_list([0, utils.generate_nested_list(
+        nodes, max(nodes // 20, 1))])
+
+
+def reader(versioned, stop, counts, slot, seed):
+    """read random nodes and the children of their parents, with a fresh
+    version every 100 reads"""
+    rng = random.Random(seed)
+    reads = 0
+    while not stop.is_set():
+        tree = versioned.read()
+        levels = tree.tree.levels
+        for _ in range(100):
+            row = rng.randrange(1, len(levels))
+            node = tree[row, rng.randrange(len(levels[row]))]
+            node.parent.children
+            reads += 1
+    counts[slot] = reads
+
+
+def writer(versioned, stop, counts, batch, seed):
+    """publish batches of appends and data changes as fast as possible"""
+    rng = random.Random(seed)
+    batches = 0
+    while not stop.is_set():
+        with versioned.write() as tree:
+            levels = tree.tree.levels
+            for _ in range(batch):
+                row = rng.randrange(len(levels) - 1)
+                node = tree[row, rng.randrange(len(levels[row]))]
+                if rng.random() < 0.5:
+                    node.append_child(-1)
+                else:
+                    node.data = -1
+        batches += 1
+    counts['batches'] = batches
+
+
+def run(versioned, readers, duration, batch=None):
+    stop = threading.Event()
+    counts = {}
+    threads = [threading.Thread(target=reader,
+                                args=(versioned, stop, counts, i, i))
+               for i in range(readers)]
+    if batch is not None:
+        threads.append(threading.Thread(target=writer,
+                                        args=(versioned, stop, counts,
+                                              batch, readers)))
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - start
+    result = {'reads_per_second': sum(counts[i] for i in range(readers)) /
+              elapsed}
+    if batch is not None:
+        result['batches_per_second'] = counts['batches'] / elapsed
+        result['writes_per_second'] = counts['batches'] * batch / elapsed
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--nodes', type=int, default=100000)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--batch', type=int, default=100,
+                        help='changes published per version')
+    parser.add_argument('--duration', type=float, default=5.,
+                        help='seconds to run each phase for')
+    parser.add_argument('--output', help='write the results to this json file')
+    args = parser.parse_args()
+
+    random.seed(0)
+    versioned = VersionedITree(build(args.nodes))
+    results = {'nodes': args.nodes, 'readers': args.readers,
+               'batch': args.batch,
+               'read_only': run(versioned, args.readers, args.duration),
+               'read_write': run(versioned, args.readers, args.duration,
+                                 args.batch)}
+    results['versions'] = versioned.version
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
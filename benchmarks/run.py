@@ -0,0 +1,269 @@
+"""benchmarks of the structural hot paths of the itree - building, indexing,
+iterating, converting and deleting - over tree shapes and sizes. results are
+written as json so runs on different versions can be compared:
+
+    python benchmarks/run.py --sizes 1e3 1e4 1e5 --output new.json
+    python benchmarks/run.py --sizes 1e3 1e4 1e5 --compare old.json
+
+each case reports the best time of --repeat runs. cases that change the tree
+get a fresh tree for every run, building it isn't timed.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+# so the benchmarks run from a checkout, without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+
+from itree import ITree, ITreeMatrix, ColumnarITreeMatrix, utils
+
+ENGINES = {'list': ITreeMatrix, 'columnar': ColumnarITreeMatrix}
+SHAPES = ('wide', 'deep', 'random')
+# cases that do a number of operations on a tree of the given size, at most
+# this many operations are timed
+MAX_OPS = 100000
+
+
+def parent_arrays(shape, size, rng):
+    """parent index arrays, one per level, of a tree of :size: nodes.
+    wide is a root with size - 1 children, deep a chain and random a tree
+    whose levels grow by a random factor, with random parents"""
+    if shape == 'wide':
+        return [[-1], [0] * (size - 1)]
+    if shape == 'deep':
+        return [[-1]] + [[0] for _ in range(size - 1)]
+    levels, left = [[-1]], size - 1
+    while left:
+        above = len(levels[-1])
+        width = min(left, max(1, int(above * rng.uniform(1.5, 4))))
+        levels.append(sorted(rng.randrange(above) for _ in range(width)))
+        left -= width
+    return levels
+
+
+def build(engine, shape, size, rng):
+    return ITree.from_arrays(parent_arrays(shape, size, rng),
+                             tree=ENGINES[engine]())
+
+
+def bench_generate(engine, shape, size, rng):
+    """build the tree with the generators of itree.utils: a root with size -
+    1 children for wide, chain for deep and random_recursive_tree for
+    random"""
+    start = time.perf_counter()
+    if shape == 'wide':
+        utils.branching_tree(size, max(size - 1, 1), tree=ENGINES[engine]())
+    elif shape == 'deep':
+        utils.chain(size, tree=ENGINES[engine]())
+    else:
+        utils.random_recursive_tree(size, rng.randrange(2 ** 32),
+                                    tree=ENGINES[engine]())
+    return time.perf_counter() - start, size
+
+
+def bench_append_build(engine, shape, size, rng):
+    """build the tree node by node with append_child, the parent of each
+    node is (one of) the deepest nodes for deep, the root for wide and a
+    random node for random"""
+    tree = ITree(tree=ENGINES[engine]())
+    root = tree.append_child(0)
+    ops = size if shape != 'random' else min(size, MAX_OPS)
+    start = time.perf_counter()
+    if shape == 'wide':
+        for data in range(1, ops):
+            root.append_child(data)
+    elif shape == 'deep':
+        node = root
+        for data in range(1, ops):
+            node = node.append_child(data)
+    else:
+        # random parents from the nodes added so far, appending can move
+        # nodes to the right so only the level of the parent is kept
+        levels = tree.tree.levels
+        for data in range(1, ops):
+            level_index = rng.randrange(len(levels))
+            if level_index + 1 == len(levels) and rng.random() < 0.5:
+                level_index = max(level_index - 1, 0)
+            sibling_index = rng.randrange(len(levels[level_index]))
+            tree[level_index, sibling_index].append_child(data)
+    return time.perf_counter() - start, ops
+
+
+def bench_first_children(engine, shape, size, rng):
+    """give each node of the deepest level its first child, right to left,
+    so each child goes before the children of the nodes already done"""
+    tree = build(engine, shape, size, rng)
+    level_index = len(tree.tree.levels) - 1
+    parents = min(len(tree.tree.levels[level_index]), MAX_OPS // 5)
+    start = time.perf_counter()
+    for sibling_index in reversed(range(parents)):
+        tree[level_index, sibling_index].append_child(sibling_index)
+    return time.perf_counter() - start, parents
+
+
+def bench_getitem(engine, shape, size, rng):
+    """random tree[level, sibling] accesses"""
+    tree = build(engine, shape, size, rng)
+    levels = tree.tree.levels
+    indices = []
+    for _ in range(min(size, MAX_OPS)):
+        level_index = rng.randrange(len(levels))
+        indices.append((level_index, rng.randrange(len(levels[level_index]))))
+    start = time.perf_counter()
+    for index in indices:
+        tree[index]
+    return time.perf_counter() - start, len(indices)
+
+
+def bench_bfs(engine, shape, size, rng):
+    """iterate over all the node data in level order"""
+    tree = build(engine, shape, size, rng)
+    start = time.perf_counter()
+    for _ in tree.traverse('levelorder', output='data'):
+        pass
+    return time.perf_counter() - start, size
+
+
+def bench_nested_round_trip(engine, shape, size, rng):
+    """to_nested_list followed by from_nested_list"""
+    tree = build(engine, shape, size, rng)
+    start = time.perf_counter()
+    ITree.from_nested_list(tree.to_nested_list(), tree=ENGINES[engine]())
+    return time.perf_counter() - start, size
+
+
+def _leaves(tree, count, rng):
+    """random leaves, deepest level first and right to left on each level
+    so deleting one doesn't move the others"""
+    levels = tree.tree.levels
+    leaves = [(level_index, sibling_index)
+              for level_index, level in enumerate(levels)
+              for sibling_index, node in enumerate(level)
+              if node._first_child_index is None and level_index > 0]
+    leaves = rng.sample(leaves, min(count, len(leaves)))
+    return sorted(leaves, reverse=True)
+
+
+def bench_delete_leaves(engine, shape, size, rng):
+    """delete random leaves with remove_node"""
+    tree = build(engine, shape, size, rng)
+    leaves = _leaves(tree, min(size // 2, MAX_OPS // 10), rng)
+    remove_node = tree.tree.remove_node
+    start = time.perf_counter()
+    for level_index, sibling_index in leaves:
+        remove_node(level_index, sibling_index)
+    return time.perf_counter() - start, len(leaves)
+
+
+def bench_delete_leaves_tombstones(engine, shape, size, rng):
+    """delete random leaves in tombstones mode and compact"""
+    tree = ITree.from_arrays(parent_arrays(shape, size, rng),
+                             tree=ENGINES[engine](tombstones=True,
+                                                     compact_threshold=None))
+    leaves = _leaves(tree, min(size // 2, MAX_OPS), rng)
+    remove_node = tree.tree.remove_node
+    start = time.perf_counter()
+    for level_index, sibling_index in leaves:
+        remove_node(level_index, sibling_index)
+    tree.compact()
+    return time.perf_counter() - start, len(leaves)
+
+
+CASES = {'generate': bench_generate,
+         'append_build': bench_append_build,
+         'first_children': bench_first_children,
+         'getitem': bench_getitem,
+         'bfs': bench_bfs,
+         'nested_round_trip': bench_nested_round_trip,
+         'delete_leaves': bench_delete_leaves,
+         'delete_leaves_tombstones': bench_delete_leaves_tombstones}
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                       stderr=subprocess.DEVNULL
+                                       ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(cases, engines, shapes, sizes, repeat, seed):
+    results = []
+    for case in cases:
+        for engine in engines:
+            for shape in shapes:
+                for size in sizes:
+                    timings = []
+                    for attempt in range(repeat):
+                        rng = random.Random(seed + attempt)
+                        seconds, ops = CASES[case](engine, shape, size, rng)
+                        timings.append(seconds)
+                    seconds = min(timings)
+                    result = {'case': case, 'engine': engine,
+                              'shape': shape, 'size': size, 'ops': ops,
+                              'seconds': seconds,
+                              'ops_per_second': ops / seconds if seconds
+                              else None}
+                    results.append(result)
+                    print('%-26s %-9s %-7s %10d %10.4fs %12.0f ops/s'
+                          % (case, engine, shape, size, seconds,
+                             result['ops_per_second'] or 0))
+                    sys.stdout.flush()
+    return results
+
+
+def compare(results, path):
+    """print how each result changed relative to the results in :path:"""
+    with open(path) as f:
+        old = json.load(f)['results']
+    key = lambda result: (result['case'], result['engine'], result['shape'],
+                          result['size'])
+    before = dict((key(result), result) for result in old)
+    print('\nchange of time against %s (> 1 is slower)' % path)
+    for result in results:
+        if key(result) in before and before[key(result)]['seconds']:
+            ratio = result['seconds'] / before[key(result)]['seconds']
+            print('%-26s %-9s %-7s %10d %8.2fx' % (key(result) + (ratio,)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--cases', nargs='+', choices=sorted(CASES),
+                        default=sorted(CASES))
+    parser.add_argument('--engines', nargs='+', choices=sorted(ENGINES),
+                        default=sorted(ENGINES))
+    parser.add_argument('--shapes', nargs='+', choices=SHAPES,
+                        default=list(SHAPES))
+    parser.add_argument('--sizes', nargs='+', type=float,
+                        default=[1e3, 1e4, 1e5],
+                        help='tree sizes, up to 1e7 (eg: 1e3 1e4 1e7)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results to this json file')
+    parser.add_argument('--compare', help='json results of an earlier run')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes]
+    results = run(args.cases, args.engines, args.shapes, sizes, args.repeat,
+                  args.seed)
+    report = {'python': platform.python_version(),
+              'platform': platform.platform(),
+              'revision': git_revision(),
+              'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
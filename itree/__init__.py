@@ -1,5 +1,27 @@
 """ itree api """
+import copy
+
 from itree.structs import ITreeMatrix, ITreeError
+from itree.columnar import ColumnarITreeMatrix
+from itree.versioned import VersionedITree
+from itree import (aggregates, ancestors, arrays, binary, handles,
+                   instrument, levelwise, lookup, nested, parallel,
+                   traversal)
+
+
+def make_node(node_class, level_index, sibling_index, tree):
+    """create a node_class proxy for the node at (level, sibling) of tree.
+    proxies are small (see AugmentedITreeNode) and cheaper to make than to
+    look up in a cache, so a new one is made every time.
+
+    :node_class: type - AugmentedITreeNode or subclass
+    :tree: ITreeMatrix - the tree implementation
+
+    """
+    node = node_class(level_index, sibling_index, tree)
+    if tree.proxy_hook is not None:
+        tree.proxy_hook(node)
+    return node
 
 
 class AugmentedITreeNode(object):
@@ -8,6 +30,10 @@ class AugmentedITreeNode(object):
     this object is usable as a node object but has access to more information
     about the actual tree through the tree variable - reference."""
 
+    # proxies get created all the time, keep them small. subclasses that
+    # don't define __slots__ still get a __dict__ and work as before
+    __slots__ = ('level_index', 'sibling_index', 'tree')
+
     def __init__(self, level_index, sibling_index, tree):
         """
 
@@ -64,7 +90,7 @@ class AugmentedITreeNode(object):
         try:
             level_index, sibling_index = indices[:2]
             # check if node exists
-            self.tree[level_index][sibling_index]
+            self.tree.get_node(level_index, sibling_index)
         except (ValueError, TypeError):
             raise ITreeError('%s is not a valid ITree index, '
                              '(level, width) expected' % indices)
@@ -74,7 +100,8 @@ class AugmentedITreeNode(object):
         # use self.__class__ to support extending this class using inheritance
         # we don't return the value of the node, we keep the information
         # needed to access it when we have to
-        return self.__class__(level_index, sibling_index, self.tree)
+        return make_node(self.__class__, level_index, sibling_index,
+                         self.tree)
 
     def __getitem__(self, indices):
         """get itree node at indices [level, left_index]. python style getter,
@@ -88,7 +115,7 @@ class AugmentedITreeNode(object):
         try:
             level_index, sibling_index = indices
             # check if node exists
-            self.tree[level_index][sibling_index]
+            self.tree.get_node(level_index, sibling_index)
         except TypeError:
             raise ITreeError('%s is not a valid ITree index, '
                              '(level, width) expected' % indices)
@@ -98,7 +125,8 @@ class AugmentedITreeNode(object):
         # use self.__class__ to support extending this class using inheritance
         # we don't return the value of the node, we keep the information
         # needed to access it when we have to
-        return self.__class__(level_index, sibling_index, self.tree)
+        return make_node(self.__class__, level_index, sibling_index,
+                         self.tree)
 
     @property
     def index(self):
@@ -108,6 +136,18 @@ class AugmentedITreeNode(object):
         """
         return (self.level_index, self.sibling_index)
 
+    @property
+    def handle(self):
+        """get a stable handle to this node. unlike the index, which changes
+        when nodes are added or deleted to the left of this node, the handle
+        keeps referring to it until it is deleted. get the node back with
+        ITree.resolve
+
+        :returns: int - the handle, the id of the node in this tree
+        """
+        return handles.get_handle_index(self.tree).handle(self.level_index,
+                                                          self.sibling_index)
+
     @property
     def height(self):
         """get level index
@@ -131,7 +171,7 @@ class AugmentedITreeNode(object):
 
         :returns: ITreeNode - the node this proxy object references
         """
-        return self.tree[self.level_index][self.sibling_index]
+        return self.tree.levels[self.level_index][self.sibling_index]
 
     @property
     def data(self):
@@ -142,14 +182,22 @@ class AugmentedITreeNode(object):
         """
         return self.node.data
 
+    @data.setter
+    def data(self, value):
+        # through the matrix, so it can copy a shared row and tell observers
+        self.tree.set_data(self.level_index, self.sibling_index, value)
+
     @property
     def children(self):
         """get the children of this node as a list
 
         :returns: list - of proxy objects of this class or subclass you made
         """
-        return [self.__class__(self.level_index + 1, sibling_index, self.tree)
-                for sibling_index in self.node.children_indices]
+        level_index = self.level_index + 1
+        return [make_node(self.__class__, level_index, sibling_index,
+                          self.tree)
+                for sibling_index in self.tree.live_children(
+                    self.level_index, self.sibling_index)]
 
     @property
     def parent(self):
@@ -159,7 +207,31 @@ class AugmentedITreeNode(object):
         parent ITreeNode
         """
         parent_index = self.node.parent_index
-        return self.__class__(self.level_index - 1, parent_index, self.tree)
+        return make_node(self.__class__, self.level_index - 1, parent_index,
+                         self.tree)
+
+    def ancestor(self, k):
+        """get the ancestor :k: levels above this node, in O(log(k)) using
+        the ancestor index of the tree (see itree.ancestors)
+
+        :k: int - how many levels up, 1 is the parent and 0 this node
+        :returns: AugmentedITreeNode - or subclass you made
+        """
+        index = ancestors.get_ancestor_index(self.tree)
+        level_index, sibling_index = index.ancestor(self.level_index,
+                                                    self.sibling_index, k)
+        return make_node(self.__class__, level_index, sibling_index,
+                         self.tree)
+
+    def is_ancestor_of(self, other):
+        """whether this node is an ancestor of node :other:, a node is not
+        an ancestor of itself
+
+        :other: AugmentedITreeNode - a node of the same tree
+        :returns: bool
+        """
+        index = ancestors.get_ancestor_index(self.tree)
+        return index.is_ancestor(self.index, other.index)
 
     @property
     def siblings(self):
@@ -177,16 +249,85 @@ class AugmentedITreeNode(object):
         """
         args = (data, self.level_index, self.sibling_index)
         level_index, sibling_index = self.tree.append_child(*args)
-        return self.__class__(level_index, sibling_index, self.tree)
+        return make_node(self.__class__, level_index, sibling_index,
+                         self.tree)
+
+    def append_children(self, data):
+        """append many children to this node at once, see
+        ITreeMatrix.append_children. much faster than calling append_child
+        for each of them
+
+        :data: iterable - the data of the children, in order
+        :returns: list - of AugmentedITreeNode (or subclass), the children
+        """
+        level_index, first, stop = self.tree.append_children(
+            data, self.level_index, self.sibling_index)
+        return [make_node(self.__class__, level_index, sibling_index,
+                          self.tree)
+                for sibling_index in range(first, stop)]
 
     def add_sibling(self, data):
         # TODO: guess what..
         raise NotImplemented
 
     def delete(self):
-        """delete this node. only allowed if this node doesn't have children"""
+        """delete this node. only allowed if this node doesn't have children.
+        if the tree keeps tombstones, the node is only marked as deleted"""
         self.tree.remove_node(self.level_index, self.sibling_index)
 
+    def subtree_ranges(self):
+        """get the nodes of the subtree rooted at this node, level by level.
+        the descendants of a node on each level are contiguous.
+
+        :returns: list - of (level, first, stop) tuples, the nodes of the
+        subtree on level are level[first:stop]
+        """
+        return self.tree.subtree_ranges(self.level_index, self.sibling_index)
+
+    def subtree_size(self):
+        """get the number of nodes in the subtree rooted at this node,
+        including this node
+
+        :returns: int - the subtree size
+        """
+        return self.tree.subtree_size(self.level_index, self.sibling_index)
+
+    def aggregate(self, name):
+        """get the value of aggregate :name: for the subtree rooted at this
+        node, see ITree.add_aggregate
+
+        :returns: the reduction of the values of the nodes in the subtree
+        """
+        return aggregates.get_aggregate(self.tree, name).get(
+            self.level_index, self.sibling_index)
+
+    def extract_subtree(self):
+        """copy the subtree rooted at this node into a new tree, with this
+        node as its root
+
+        :returns: ITree - the copy, using this class for its nodes
+        """
+        return ITree(tree=self.tree.extract(self.level_index,
+                                            self.sibling_index),
+                     node_class=self.__class__)
+
+    def delete_subtree(self):
+        """delete this node along with all of its descendants
+
+        :returns: int - how many nodes were deleted
+        """
+        return self.tree.remove_subtree(self.level_index, self.sibling_index)
+
+    def traverse(self, order='levelorder', max_depth=None, output='node'):
+        """traverse the subtree rooted at this node. see ITree.traverse
+
+        :returns: generator - of proxies of this class, indices or data
+        """
+        return traversal.traverse(
+            self.tree, order, self.index, max_depth, output,
+            lambda level_index, sibling_index: make_node(
+                self.__class__, level_index, sibling_index, self.tree))
+
 
 class ITree(object):
 
@@ -198,13 +339,16 @@ class ITree(object):
         """
 
         :tree: ITreeMatrix - internal tree structure incase we want to
-        construct an ITree from an existing one (useful for cloning probably)
+        construct an ITree from an existing one (the matrix is shared, see
+        clone to copy it) or want to use another storage engine, eg:
+        ColumnarITreeMatrix
         :node_class: type - subclass of AugmentedITreeNode, used for wrapping
         ITreeNode and encompassing custom functionality. set this if you want
         to add custom functionality to your tree.
 
         """
-        self.tree = tree or ITreeMatrix()
+        # an empty matrix is falsy (it has no nodes) so we can't use `or` here
+        self.tree = tree if tree is not None else ITreeMatrix()
         self.node_class = node_class
 
     def __call__(self, *indices):
@@ -219,7 +363,7 @@ class ITree(object):
         try:
             level_index, sibling_index = indices[:2]
             # check if node exists
-            self.tree[level_index][sibling_index]
+            self.tree.get_node(level_index, sibling_index)
         except (ValueError, TypeError):
             raise ITreeError('%s is not a valid ITree index, '
                              '(level, width) expected' % indices)
@@ -229,7 +373,8 @@ class ITree(object):
         # use self.__class__ to support extending this class using inheritance
         # we don't return the value of the node, we keep the information
         # needed to access it when we have to
-        return self.node_class(level_index, sibling_index, self.tree)
+        return make_node(self.node_class, level_index, sibling_index,
+                         self.tree)
 
     def __getitem__(self, indices):
         """get itree node at indices [level, left_index]. python style getter,
@@ -243,7 +388,7 @@ class ITree(object):
         try:
             level_index, sibling_index = indices
             # check if node exists
-            self.tree[level_index][sibling_index]
+            self.tree.get_node(level_index, sibling_index)
         except TypeError:
             raise ITreeError('%s is not a valid ITree index, '
                              '(level, width) expected' % indices)
@@ -253,7 +398,34 @@ class ITree(object):
         # use self.__class__ to support extending this class using inheritance
         # we don't return the value of the node, we keep the information
         # needed to access it when we have to
-        return self.node_class(level_index, sibling_index, self.tree)
+        return make_node(self.node_class, level_index, sibling_index,
+                         self.tree)
+
+    def data_at(self, level_index, sibling_index):
+        """get the data of the node at (level, sibling) without creating a
+        proxy for it
+
+        :returns: YouKnowWhatTypeSinceYouPutItHere - the data of the node
+        """
+        try:
+            return self.tree.get_node(level_index, sibling_index).data
+        except IndexError:
+            raise ITreeError("(%s, %s) doesn't reference a valid ITreeNode"
+                             % (level_index, sibling_index))
+
+    def get_many(self, indices):
+        """get the data of many nodes at once without creating proxies
+
+        :indices: iterable - of (level, sibling) tuples
+        :returns: list - the data of the nodes in the order of indices
+        """
+        get_node = self.tree.get_node
+        try:
+            return [get_node(level_index, sibling_index).data
+                    for level_index, sibling_index in indices]
+        except IndexError:
+            raise ITreeError("indices contain a position that doesn't "
+                             "reference a valid ITreeNode")
 
     def __repr__(self):
         return repr(self.tree)
@@ -266,10 +438,38 @@ class ITree(object):
         return len(self.tree)
 
     def __iter__(self):
-        """support iteration on tree - built in iteration is breadth first"""
-        # TODO support more ways of traversing the tree..
+        """support iteration on tree - built in iteration is breadth first,
+        use traverse for other orders"""
         for level_index, sibling_index in self.tree:
-            yield self.node_class(level_index, sibling_index, self.tree)
+            yield make_node(self.node_class, level_index, sibling_index,
+                            self.tree)
+
+    def traverse(self, order='levelorder', start=None, max_depth=None,
+                 output='node'):
+        """traverse the tree iteratively
+
+        :order: str - levelorder (breadth first), preorder (depth first,
+        parents before children) or postorder (depth first, children before
+        parents)
+        :start: tuple - optional (level, sibling) of the node whose subtree
+        to traverse, defaults to the root
+        :max_depth: int - optional, how many levels below start to visit
+        :output: str - node yields node_class proxies, index yields
+        (level, sibling) tuples and data yields the node data. the last two
+        don't create any proxies, use them for whole tree passes.
+
+        :returns: generator - of proxies, indices or data
+        """
+        if start is None:
+            # check the root exists
+            self.tree.root
+            start = (0, 0)
+        else:
+            start = self[start].index
+        return traversal.traverse(
+            self.tree, order, start, max_depth, output,
+            lambda level_index, sibling_index: make_node(
+                self.node_class, level_index, sibling_index, self.tree))
 
     @property
     def height(self):
@@ -286,7 +486,7 @@ class ITree(object):
         """get this tree's root"""
         # check it exists
         self.tree.root
-        return self.node_class(0, 0, self.tree)
+        return make_node(self.node_class, 0, 0, self.tree)
 
     @property
     def children(self):
@@ -299,16 +499,287 @@ class ITree(object):
     def set_root(self, data):
         """creates and appends the root of the tree."""
         level_index, sibling_index = self.tree.set_root(data)
-        return self.node_class(level_index, sibling_index, self.tree)
+        return make_node(self.node_class, level_index, sibling_index,
+                         self.tree)
 
     def append_child(self, data):
         """creates and appends the root of the tree - alias for set_root.
         exists to follow naming convention with nodes to assist in cases
         where recursion is required"""
         level_index, sibling_index = self.tree.set_root(data)
-        return self.node_class(level_index, sibling_index, self.tree)
+        return make_node(self.node_class, level_index, sibling_index,
+                         self.tree)
+
+    def resolve(self, handle):
+        """get the node :handle: (see AugmentedITreeNode.handle) refers to,
+        wherever it is now. a dict lookup, plus replaying the shifts of its
+        level since it was last resolved
+
+        :returns: AugmentedITreeNode - or subclass you made
+        :raises: ITreeError - if the node was deleted
+        """
+        level_index, sibling_index = handles.get_handle_index(
+            self.tree).resolve(handle)
+        return make_node(self.node_class, level_index, sibling_index,
+                         self.tree)
+
+    def bulk_append(self, pairs):
+        """append many children to many nodes in one linear pass over each
+        level that gets children, see ITreeMatrix.bulk_append. meant for
+        ingesting large batches of nodes
+
+        :pairs: iterable - of (parent, data), parent being a node or its
+        (level, sibling) index as it was before the call
+        :returns: list - the (level, sibling) index of each new node, in the
+        order of pairs
+        """
+        return self.tree.bulk_append(
+            (parent.index if isinstance(parent, AugmentedITreeNode)
+             else parent, data) for parent, data in pairs)
+
+    def _nested_transformer(self, transformer):
+        """adapt a transformer of nodes to the (level, sibling) transformer
+        itree.nested expects"""
+        if transformer is None:
+            return None
+        return lambda level_index, sibling_index: transformer(
+            make_node(self.node_class, level_index, sibling_index,
+                      self.tree))
+
+    def clone(self):
+        """copy this itree. the levels are shared with the copy until either
+        tree changes them, then only the changed levels are copied (copy on
+        write), so many variants of a large tree can be kept cheaply. the
+        node data isn't copied.
+
+        :returns: ITree - or subclass instance, the copy
+        """
+        clone = copy.copy(self)
+        clone.tree = self.tree.copy()
+        return clone
+
+    def snapshot(self):
+        """get a read only copy of this itree as it is now, the levels are
+        shared like with clone. changing the snapshot raises ITreeError
+
+        :returns: ITree - or subclass instance, the snapshot
+        """
+        snapshot = copy.copy(self)
+        snapshot.tree = self.tree.copy(frozen=True)
+        return snapshot
+
+    def compact(self, rebuild=False, intern=False):
+        """remove the tombstones of deleted nodes, see ITreeMatrix. the
+        sibling indices of the nodes to the right of them change
+
+        :rebuild: bool - if set, rebuild every level so it takes just the
+        memory its nodes need, eg: after pruning a large part of the tree
+        :intern: bool - if set, rebuild and keep equal data values once,
+        so repeated values share one object
+        :returns: int - how many tombstones were removed
+        """
+        return self.tree.compact(rebuild=rebuild, intern=intern)
+
+    def memory_usage(self, deep=False):
+        """estimate how many bytes this itree takes, by level and split into
+        structure (the rows and nodes) and data
+
+        :deep: bool - if set, count what list, tuple, set and dict data
+        contains too
+        :returns: dict - see ITreeMatrix.memory_usage
+        """
+        return self.tree.memory_usage(deep)
+
+    def prune(self, predicate):
+        """delete all the leaves whose data satisfies :predicate: in one
+        linear pass per level. leaves that appear because their children got
+        pruned are kept.
+
+        :predicate: callable - called with the data of each leaf
+        :returns: int - how many nodes were deleted
+        """
+        return self.tree.prune(predicate)
+
+    def reduce_up(self, fn, init=None):
+        """compute a value for every node by folding the values of its
+        children into it, one level at a time from the bottom up. eg: the
+        subtree sizes are tree.reduce_up(operator.add, lambda data: 1)
+
+        :fn: callable - fn(value, child value) returns the new value, the
+        children are folded left to right. numpy ufuncs (eg: numpy.add) are
+        applied to each level with reduceat
+        :init: callable or value - optional, the value of a node before its
+        children are folded in, given its data. defaults to the data
+
+        :returns: list - the values of each level, indexed like the tree
+        """
+        return levelwise.reduce_up(self.tree, fn, init)
+
+    def broadcast_down(self, fn, root_value):
+        """compute a value for every node from the value of its parent, one
+        level at a time from the top down. eg: the sum of the data on the
+        path from the root to each node is
+        tree.broadcast_down(operator.add, 0)
+
+        :fn: callable - fn(parent value, data) returns the value of a node.
+        numpy ufuncs are applied to each level in one call
+        :root_value: the value of the root
+
+        :returns: list - the values of each level, indexed like the tree
+        """
+        return levelwise.broadcast_down(self.tree, fn, root_value)
+
+    def parallel_map(self, fn, workers=None, chunk_size=None):
+        """apply :fn: to the data of every node in a pool of processes, the
+        levels are split into contiguous chunks
+
+        :fn: callable - picklable (eg: a module level function), called with
+        the data of each node
+        :workers: int - how many processes, defaults to the number of cpus
+        :chunk_size: int - how many nodes to send to a worker at a time
+
+        :returns: list - the results of each level, indexed like the tree
+        """
+        return parallel.parallel_map(self.tree, fn, workers, chunk_size)
 
-    def to_nested_list(self, transformer=lambda x: x.data):
+    def parallel_reduce_up(self, fn, init=None, workers=None):
+        """reduce_up in a pool of processes. the tree is split into runs of
+        subtrees that are reduced in the workers, with the parent indices
+        shared with them through shared memory. see reduce_up, fn and init
+        have to be picklable
+
+        :returns: list - the values of each level, indexed like the tree
+        """
+        return parallel.parallel_reduce_up(self.tree, fn, init, workers)
+
+    def lca(self, a, b):
+        """get the lowest common ancestor of nodes :a: and :b:. the first
+        query builds the ancestor index of the tree (O(n log(height))), after
+        that each query is O(log(height)) until the tree changes shape
+
+        :a: AugmentedITreeNode - a node of this tree
+        :b: AugmentedITreeNode - a node of this tree
+        :returns: AugmentedITreeNode - or subclass you made
+        """
+        index = ancestors.get_ancestor_index(self.tree)
+        level_index, sibling_index = index.lca(a.index, b.index)
+        return make_node(self.node_class, level_index, sibling_index,
+                         self.tree)
+
+    def distance(self, a, b):
+        """get the number of edges on the path between nodes :a: and :b:,
+        see lca"""
+        return ancestors.get_ancestor_index(self.tree).distance(a.index,
+                                                                b.index)
+
+    def add_aggregate(self, name, reducer, value=None, inverse=None):
+        """keep a subtree aggregate of the node data up to date as the tree
+        changes, eg: tree.add_aggregate('total', 'sum'). the aggregate of any
+        node is then an O(1) read with node.aggregate('total'), and each
+        append, delete or data change updates the path to the root.
+
+        :name: str - what to call the aggregate
+        :reducer: callable or str - combines two values, it must be
+        associative and commutative. sum, count, min and max can be given by
+        name
+        :value: callable - optional, the value of a node given its data,
+        defaults to the data
+        :inverse: callable - optional, inverse(total, value) takes a value
+        back out of a total (eg: operator.sub for operator.add). makes
+        deletes and data changes O(depth) for reducers without one built in
+
+        """
+        aggregates.add_aggregate(self.tree, name, reducer, value, inverse)
+
+    def remove_aggregate(self, name):
+        """stop keeping aggregate :name: up to date"""
+        aggregates.remove_aggregate(self.tree, name)
+
+    def aggregate(self, name, node=None):
+        """get the value of aggregate :name: for the subtree rooted at :node:
+
+        :node: AugmentedITreeNode - optional, the root if not set
+        """
+        index = (0, 0) if node is None else node.index
+        return aggregates.get_aggregate(self.tree, name).get(*index)
+
+    def add_value_index(self, key=None):
+        """index the nodes by their data so find and find_all don't have to
+        scan the tree. the index follows appends, deletes and data changes,
+        shifted nodes are brought up to date when they are looked up.
+        replaces the value index the tree had
+
+        :key: callable - optional, index the nodes by key(data) instead of
+        by their data, eg: lambda data: data['id']. keys must be hashable
+
+        """
+        lookup.add_value_index(self.tree, key)
+
+    def remove_value_index(self):
+        """stop keeping the value index up to date"""
+        lookup.remove_value_index(self.tree)
+
+    def find(self, key):
+        """get the first node (in level order) with :key:, see
+        add_value_index. costs a couple of dict lookups
+
+        :returns: AugmentedITreeNode - or subclass you made, None if no node
+        has the key
+        """
+        position = lookup.get_value_index(self.tree).find(key)
+        if position is None:
+            return None
+        return make_node(self.node_class, position[0], position[1],
+                         self.tree)
+
+    def find_all(self, key):
+        """get all the nodes with :key:, in level order, see
+        add_value_index
+
+        :returns: list - of AugmentedITreeNode or subclass you made
+        """
+        return [make_node(self.node_class, level_index, sibling_index,
+                          self.tree)
+                for level_index, sibling_index
+                in lookup.get_value_index(self.tree).find_all(key)]
+
+    def instrument(self, callback=None):
+        """start recording stats about the operations on this itree: how
+        many times each one ran, how many nodes it shifted, a histogram of
+        its latency and how many node proxies were made. the methods of the
+        matrix are only wrapped while instrumented, so an itree that isn't
+        instrumented pays nothing for it.
+
+        :callback: callable - optional, called after every operation with
+        its name, how long it took in seconds and a dict of what else was
+        measured (or None)
+
+        """
+        instrument.instrument(self.tree, callback)
+
+    def uninstrument(self):
+        """stop recording stats, see instrument"""
+        instrument.uninstrument(self.tree)
+
+    def stats(self):
+        """get the stats recorded since instrument or reset_stats
+
+        :returns: dict - operations maps each operation to its count,
+        seconds, shifted (total nodes shifted), max_shifted, bisect (how
+        many appends had to search for where the child goes) and histogram
+        (upper bound in microseconds: count). proxies is how many node
+        proxies were made. None if the itree isn't instrumented
+        """
+        stats = getattr(self.tree, 'stats', None)
+        return None if stats is None else stats.as_dict()
+
+    def reset_stats(self):
+        """forget the stats recorded so far, keep recording"""
+        stats = getattr(self.tree, 'stats', None)
+        if stats is not None:
+            stats.reset()
+
+    def to_nested_list(self, transformer=None):
         """convert this itree to a nested list
 
         :transformer: callable - hook to override what to put in the nested
@@ -321,36 +792,42 @@ class ITree(object):
         nested list format
 
         """
+        return nested.to_nested_list(self.tree,
+                                     self._nested_transformer(transformer))
+
+    def iter_nested_json(self, transformer=None, chunk_size=65536):
+        """yield the json text of the nested list of this itree in chunks,
+        without building the nested list in memory.
+
+        :transformer: callable - see to_nested_list
+        :chunk_size: int - about how many characters each chunk has
 
-        def collapse_one_level(l):
-            """collapses contained lists of a list once (not recursive)"""
-            for each in l:
-                if isinstance(each, list):
-                    for other in each:
-                        yield other
-                else:
-                    yield each
+        :returns: generator - of str chunks
+
+        """
+        return nested.iter_nested_json(self.tree,
+                                       self._nested_transformer(transformer),
+                                       chunk_size)
 
-        def recursively_nest(node):
-            """recurse into tree and nest children on the right of
-            the parent in a list"""
-            if node.children:
-                current = [transformer(node)]
-                nested_children = map(recursively_nest, node.children)
-                children = list(collapse_one_level(nested_children))
-                current.append(children)
-                return current
-            else:
-                return transformer(node)
+    def write_nested_json(self, fileobj, transformer=None, chunk_size=65536):
+        """write the json text of the nested list of this itree to a file
+        like object chunk by chunk.
 
-        return recursively_nest(self.root)
+        :fileobj: file like object - anything with a write method for str
+        :transformer: callable - see to_nested_list
+        :chunk_size: int - about how many characters to write at a time
+
+        """
+        nested.write_nested_json(self.tree, fileobj,
+                                 self._nested_transformer(transformer),
+                                 chunk_size)
 
     @classmethod
     def from_nested_list(cls, nested_list, *args, **kwargs):
         """create an itree from a nested list itree format
 
         :nested_list: list of lists that represent a tree in our itree format
-        :transformer: optional - defaults to lambda x: x - the identity lambda.
+        :transformer: optional - defaults to None - the data is stored as is.
         a callable which is given the data corresponding to each node in the
         nested list as an argument and may modify it as it pleases. the node
         data attribute is set to the return value of the transformer callable.
@@ -359,46 +836,104 @@ class ITree(object):
 
         :returns: itree or itree subclass instance
 
+        the nested list is walked iteratively and each level is filled in
+        order, so building is linear and there is no limit on the depth.
+
         """
         # we can't add :transformer: as a default value to the argument list,
         # since if we do and only a single positional argument is passed, it
         # will be set with the value of that positional argument. we therefore
         # expect it to be a keyword argument and if it doesn't exist, we set it
-        # to our default value
-        transformer = kwargs.pop('transformer', lambda x: x)
-
-        def recursively_append(l, node):
-            child = None
-            for index in range(len(l)):
-                data = l[index]
-                # next data point (first item never a list in a valid tree)
-                next_data = l[(index + 1) % len(l)]
-                # if we find a list, it means the previous node
-                # has the list nodes as children
-                # we keep a reference to the previous node (child)
-                # in the else block which should always have run first
-                # at least once if this is a valid tree representation
-                if isinstance(data, list):
-                    if child is None:
-                        raise ITreeError('this multi list cannot be a tree')
-                    if isinstance(next_data, list):
-                        raise ITreeError('this multi list cannot be a tree, '
-                                         'it contains two consecutive lists')
-                    recursively_append(data, child)
-                else:
-                    # if next element is a list, this node has children
-                    # we need to keep a reference to it to pass to recursion
-                    if isinstance(next_data, list):
-                        child = node.append_child(transformer(data))
-                    # no children - don't need to keep reference
-                    else:
-                        node.append_child(transformer(data))
-
-        if len(nested_list) > 2:
-            raise ITreeError('this list represents a bush not a tree '
-                             ' - it has many roots')
+        # to our default value (None - store the data as is)
+        transformer = kwargs.pop('transformer', None)
+        t = cls(*args, **kwargs)
+        nested.load_nested_list(t.tree, nested_list, transformer)
+        return t
+
+    @classmethod
+    def from_nested_json_stream(cls, fileobj, *args, **kwargs):
+        """create an itree from the json text of a nested list in a file, eg:
+        one written by write_nested_json. the text is read in chunks and the
+        tree is built as it is read, so neither the text nor the nested list
+        are ever held in memory as a whole.
+
+        :fileobj: file like object - opened in text or binary (utf-8) mode
+        :transformer: optional keyword - see from_nested_list
+        :chunk_size: optional keyword - how many characters to read at a time
+        :args: positional arguments to pass to itree subclass constructor
+        :kwargs: keyword arguments to pass to itree subclass constructor
+
+        :returns: itree or itree subclass instance
+
+        """
+        transformer = kwargs.pop('transformer', None)
+        chunk_size = kwargs.pop('chunk_size', 65536)
+        t = cls(*args, **kwargs)
+        nested.load_nested_json(t.tree, fileobj, transformer, chunk_size)
+        return t
+
+    def to_arrays(self, flat=False):
+        """export this itree as numpy arrays in parent pointer form - needs
+        numpy
+
+        :flat: bool - if set, concatenate the levels into single arrays and
+        add level_offsets. indices then refer to positions in the flat arrays
+
+        :returns: dict - parent, first_child, last_child and data arrays, a
+        list with one per level unless flat
+        """
+        return arrays.to_arrays(self.tree, flat)
+
+    @classmethod
+    def from_arrays(cls, parent, data=None, *args, **kwargs):
+        """create an itree from parent pointer arrays, eg: the output of
+        to_arrays. works with lists too, numpy makes it vectorized
+
+        :parent: list - of parent index sequences, one per level. the root
+        level must be [-1] and each level must be sorted by parent index
+        :data: list - optional, of data sequences, one per level
+        :level_offsets: optional keyword - for the flat output of to_arrays
+        :args: positional arguments to pass to itree subclass constructor
+        :kwargs: keyword arguments to pass to itree subclass constructor
+
+        :returns: itree or itree subclass instance
+
+        """
+        level_offsets = kwargs.pop('level_offsets', None)
+        t = cls(*args, **kwargs)
+        arrays.load_arrays(t.tree, parent, data, level_offsets)
+        return t
+
+    def save(self, path, data_format=None, encode=binary.encode_json):
+        """write this itree to :path: in the itree binary format, which
+        open_mmap can serve without loading it
+
+        :path: str - the file to write
+        :data_format: str - optional, an array typecode (eg: 'd' or 'q') to
+        store the data as a fixed width column. the data is json encoded
+        (or encoded with :encode:) value by value if not set
+
+        """
+        binary.save(self.tree, path, data_format, encode)
+
+    @classmethod
+    def open_mmap(cls, path, *args, **kwargs):
+        """open an itree saved with save as a read only tree. the file is
+        memory mapped and nodes are read straight from it, nothing is loaded
+        up front. close it with tree.tree.close()
+
+        :path: str - the file to open
+        :decode: optional keyword - decodes the bytes of a data value, needed
+        if the file was saved with a custom encode
+        :args: positional arguments to pass to itree subclass constructor
+        :kwargs: keyword arguments to pass to itree subclass constructor
+
+        :returns: itree or itree subclass instance
+
+        """
+        decode = kwargs.pop('decode', binary.decode_json)
         t = cls(*args, **kwargs)
-        recursively_append(nested_list, t)
+        t.tree = binary.MmapITreeMatrix(path, decode)
         return t
 
 
@@ -0,0 +1,210 @@
+"""subtree aggregates - the reduction of the data of all the nodes in the
+subtree of each node, eg: the sum of the data below a node. the value of
+every node is kept in a column per level, and as an observer of the matrix
+(see ITreeMatrix.notify) the aggregate only updates the path from a changed
+node to the root. reading an aggregate is O(1) and keeping it up to date
+costs O(depth) per change."""
+import operator
+
+from itree.structs import ITreeError, TOMBSTONE
+
+
+class Empty(object):
+
+    """the value of a subtree without any live nodes, ie: a tombstone"""
+
+    def __repr__(self):
+        return 'EMPTY'
+
+
+EMPTY = Empty()
+
+
+def _one(data):
+    return 1
+
+
+# name: (reducer, value, inverse) of the aggregates we know by name
+REDUCERS = {'sum': (operator.add, None, operator.sub),
+            'count': (operator.add, _one, operator.sub),
+            'min': (min, None, None),
+            'max': (max, None, None)}
+
+
+class Aggregate(object):
+
+    """reduction of node data over subtrees, kept up to date as the matrix
+    changes. the reducer is applied in no particular order, so it must be
+    associative and commutative."""
+
+    def __init__(self, matrix, name, reducer, value=None, inverse=None):
+        """
+
+        :matrix: ITreeMatrix - the tree to aggregate
+        :name: str - what the aggregate is called
+        :reducer: callable - combines two values, eg: operator.add
+        :value: callable - optional, the value of a node given its data. the
+        data is used as is if not set
+        :inverse: callable - optional, inverse(total, value) takes value
+        back out of total, eg: operator.sub. without it removing a node or
+        changing its data recomputes each node on the path to the root from
+        its children, which is O(depth * children) instead of O(depth)
+
+        """
+        self.matrix = matrix
+        self.name = name
+        self.reducer = reducer
+        self.value = value
+        self.inverse = inverse
+        # one list of subtree values per level, None until the first read
+        self.levels = None
+
+    def _own(self, data):
+        if data is TOMBSTONE:
+            return EMPTY
+        return data if self.value is None else self.value(data)
+
+    def _reduce(self, total, value):
+        if total is EMPTY:
+            return value
+        if value is EMPTY:
+            return total
+        return self.reducer(total, value)
+
+    def rebuild(self):
+        """compute the values of all the nodes from scratch, one pass over
+        each level from the bottom up"""
+        levels = []
+        for level in self.matrix.levels:
+            _, _, _, data = level.columns()
+            levels.append([self._own(datum) for datum in data])
+        for row in range(len(levels) - 1, 0, -1):
+            parents = self.matrix.levels[row].columns()[0]
+            above = levels[row - 1]
+            for parent_index, value in zip(parents, levels[row]):
+                if value is not EMPTY:
+                    above[parent_index] = self._reduce(above[parent_index],
+                                                       value)
+        self.levels = levels
+
+    def get(self, row, column):
+        """get the aggregate of the subtree rooted at (row, column)"""
+        if self.levels is None:
+            self.rebuild()
+        return self.levels[row][column]
+
+    def _recompute(self, row, column):
+        """recompute the value of (row, column) from its children"""
+        level = self.matrix.levels[row]
+        total = self._own(level[column].data)
+        children = level.child_range(column)
+        if children is not None:
+            below = self.levels[row + 1]
+            for index in range(children[0], children[1] + 1):
+                total = self._reduce(total, below[index])
+        self.levels[row][column] = total
+
+    def _update_ancestors(self, row, parent_index, update):
+        """call update(row, column) for the ancestors of a node, starting
+        from its parent at :parent_index: on :row:"""
+        levels = self.matrix.levels
+        while row >= 0:
+            update(row, parent_index)
+            parent_index = levels[row][parent_index].parent_index
+            row -= 1
+
+    def _add(self, value):
+        def update(row, column):
+            values = self.levels[row]
+            values[column] = self._reduce(values[column], value)
+        return update
+
+    def _remove(self, value):
+        if self.inverse is None or value is EMPTY:
+            return self._recompute
+
+        def update(row, column):
+            values = self.levels[row]
+            values[column] = self.inverse(values[column], value)
+        return update
+
+    # the observer events, see ITreeMatrix.notify
+
+    def node_inserted(self, row, column):
+        if self.levels is None:
+            return
+        node = self.matrix.levels[row][column]
+        value = self._own(node.data)
+        if row == len(self.levels):
+            self.levels.append([])
+        self.levels[row].insert(column, value)
+        self._update_ancestors(row - 1, node.parent_index, self._add(value))
+
+    def node_removed(self, row, column, removed):
+        if self.levels is None:
+            return
+        if self.matrix.tombstones:
+            self.levels[row][column] = EMPTY
+        else:
+            self.levels[row].pop(column)
+            if not self.levels[row]:
+                self.levels.pop(row)
+        self._update_ancestors(row - 1, removed.parent_index,
+                               self._remove(self._own(removed.data)))
+
+    def data_changed(self, row, column, previous):
+        if self.levels is None:
+            return
+        node = self.matrix.levels[row][column]
+        previous, value = self._own(previous), self._own(node.data)
+        if self.inverse is None:
+            self._recompute(row, column)
+            self._update_ancestors(row - 1, node.parent_index,
+                                   self._recompute)
+            return
+
+        def update(row, column):
+            values = self.levels[row]
+            values[column] = self.reducer(self.inverse(values[column],
+                                                       previous), value)
+        update(row, column)
+        self._update_ancestors(row - 1, node.parent_index, update)
+
+    def levels_replaced(self):
+        # the positions moved, rebuild on the next read
+        self.levels = None
+
+
+def add_aggregate(matrix, name, reducer, value=None, inverse=None):
+    """keep the aggregate :name: of the subtrees of :matrix: up to date. see
+    Aggregate, reducer can also be the name of one we know: sum, count, min
+    or max
+
+    :returns: Aggregate - the aggregate, it is computed on the first read
+    """
+    if any(observer.name == name for observer in matrix.observers
+           if isinstance(observer, Aggregate)):
+        raise ITreeError('there already is an aggregate named %s' % name)
+    if not callable(reducer):
+        try:
+            reducer, default_value, inverse = REDUCERS[reducer]
+        except KeyError:
+            raise ITreeError('unknown reducer %s, expected a callable or one '
+                             'of %s' % (reducer, ', '.join(sorted(REDUCERS))))
+        value = value or default_value
+    aggregate = Aggregate(matrix, name, reducer, value, inverse)
+    matrix.add_observer(aggregate)
+    return aggregate
+
+
+def get_aggregate(matrix, name):
+    """get the aggregate :name: added to :matrix: with add_aggregate"""
+    for observer in matrix.observers:
+        if isinstance(observer, Aggregate) and observer.name == name:
+            return observer
+    raise ITreeError('there is no aggregate named %s' % name)
+
+
+def remove_aggregate(matrix, name):
+    """stop keeping the aggregate :name: of :matrix: up to date"""
+    matrix.remove_observer(get_aggregate(matrix, name))
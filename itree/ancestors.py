@@ -0,0 +1,130 @@
+"""ancestor index - binary lifting tables over the levels of an
+ITreeMatrix. for every node we keep the sibling index of its ancestor 1, 2,
+4, .. levels up, so the k-th ancestor is found with one jump per set bit of
+k and the lowest common ancestor with O(log(height)) jumps. the ancestor
+2 ** j levels above any node of a level is a column like the parent index
+column, so the tables are built one level at a time by indexing the column
+of 2 ** (j - 1) with itself. the index is an observer of the matrix and is
+rebuilt lazily the first time it is used after the tree changes shape."""
+from array import array
+
+from itree.structs import ITreeError
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def _gather(values, indices):
+    """array('q') of values[index] for each of indices"""
+    if numpy is not None and len(indices):
+        gathered = numpy.frombuffer(values, numpy.int64)[
+            numpy.frombuffer(indices, numpy.int64)]
+        return array('q', gathered.tobytes())
+    return array('q', [values[index] for index in indices])
+
+
+class AncestorIndex(object):
+
+    """binary lifting tables of an ITreeMatrix, answers ancestor and lowest
+    common ancestor queries in O(log(height))"""
+
+    def __init__(self, matrix):
+        """
+
+        :matrix: ITreeMatrix - the tree to index
+
+        """
+        self.matrix = matrix
+        # jumps[j][row] - the sibling index of the ancestor 2 ** j levels up
+        # of each node on row, None if row is less than 2 ** j deep
+        self.jumps = None
+
+    def build(self):
+        levels = self.matrix.levels
+        jumps = [[level.columns()[0] for level in levels]]
+        step = 1
+        while 2 * step < len(levels):
+            previous = jumps[-1]
+            current = [None] * len(levels)
+            for row in range(2 * step, len(levels)):
+                current[row] = _gather(previous[row - step], previous[row])
+            jumps.append(current)
+            step *= 2
+        self.jumps = jumps
+
+    def ancestor(self, row, column, k):
+        """get the (row, column) of the ancestor :k: levels above (row,
+        column), k = 0 is the node itself"""
+        if not 0 <= k <= row:
+            raise ITreeError('node (%s, %s) has no ancestor %s levels up'
+                             % (row, column, k))
+        if self.jumps is None:
+            self.build()
+        jump = 0
+        while k:
+            if k & 1:
+                column = self.jumps[jump][row][column]
+                row -= 1 << jump
+            k >>= 1
+            jump += 1
+        return (row, column)
+
+    def lca(self, a, b):
+        """get the (row, column) of the lowest common ancestor of the nodes
+        at indices :a: and :b:"""
+        if self.jumps is None:
+            self.build()
+        (row_a, column_a), (row_b, column_b) = a, b
+        if row_a > row_b:
+            row_a, column_a = self.ancestor(row_a, column_a, row_a - row_b)
+        elif row_b > row_a:
+            row_b, column_b = self.ancestor(row_b, column_b, row_b - row_a)
+        if column_a == column_b:
+            return (row_a, column_a)
+        row = row_a
+        # jump as high as we can while the ancestors are still different
+        for jump in range(len(self.jumps) - 1, -1, -1):
+            table = self.jumps[jump][row] if row >= 1 << jump else None
+            if table is not None and table[column_a] != table[column_b]:
+                column_a, column_b = table[column_a], table[column_b]
+                row -= 1 << jump
+        return (row - 1, self.jumps[0][row][column_a])
+
+    def distance(self, a, b):
+        """get the number of edges on the path between :a: and :b:"""
+        row, _ = self.lca(a, b)
+        return a[0] + b[0] - 2 * row
+
+    def is_ancestor(self, a, b):
+        """whether the node at :a: is a proper ancestor of the node at :b:"""
+        if b[0] <= a[0]:
+            return False
+        return self.ancestor(b[0], b[1], b[0] - a[0]) == a
+
+    # the observer events, see ITreeMatrix.notify
+
+    def node_inserted(self, row, column):
+        self.jumps = None
+
+    def node_removed(self, row, column, removed):
+        # tombstones don't move any nodes
+        if not self.matrix.tombstones:
+            self.jumps = None
+
+    def data_changed(self, row, column, previous):
+        pass
+
+    def levels_replaced(self):
+        self.jumps = None
+
+
+def get_ancestor_index(matrix):
+    """get the AncestorIndex of :matrix:, it is created the first time"""
+    for observer in matrix.observers:
+        if isinstance(observer, AncestorIndex):
+            return observer
+    index = AncestorIndex(matrix)
+    matrix.add_observer(index)
+    return index
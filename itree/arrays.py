@@ -0,0 +1,198 @@
+"""conversion between itrees and parent pointer arrays. each level of the
+tree becomes an array with the parent index of every node on it, along with
+arrays of first and last child indices and a data column. numpy is optional,
+it is needed to get numpy arrays out of a tree and it vectorizes loading."""
+from array import array
+
+from itree.structs import ITreeError, NO_CHILD, child_ranges
+from itree.columnar import as_column
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# levels with fewer nodes are checked and indexed in pure python, a handful of
+# numpy calls per level costs more than the loop on them (deep, narrow trees
+# have one tiny level per node)
+NUMPY_MIN_LEVEL = 64
+
+
+def _require_numpy():
+    if numpy is None:
+        raise ImportError('numpy is needed to export itree arrays, '
+                          'pip install numpy')
+
+
+def _data_array(data):
+    """numpy array for a data column, an object array if the data can't be
+    stored in a flat array of scalars"""
+    try:
+        values = numpy.array(data)
+    except ValueError:
+        values = None
+    if values is None or values.ndim != 1:
+        values = numpy.empty(len(data), dtype=object)
+        for index, datum in enumerate(data):
+            values[index] = datum
+    return values
+
+
+def to_arrays(matrix, flat=False):
+    """export the tree in :matrix: as numpy arrays
+
+    :matrix: ITreeMatrix - the tree to export
+    :flat: bool - if set, concatenate the levels into single arrays. parent
+    and child indices then refer to positions in the flat arrays and the
+    nodes of level i are at level_offsets[i]:level_offsets[i + 1]
+
+    :returns: dict - parent, first_child, last_child and data, each a list
+    with an array per level (or a single array if flat). nodes without
+    children have first and last child NO_CHILD (-1), the root has parent -1
+    """
+    _require_numpy()
+    if matrix.dead:
+        # export a copy without the tombstones rather than compact the
+        # matrix under the feet of whoever holds indices into it
+        matrix = matrix.extract(0, 0)
+    parents, firsts, lasts, data = [], [], [], []
+    for row in matrix.levels:
+        if len(row) == 0:
+            continue
+        level_parents, level_firsts, level_lasts, level_data = row.columns()
+        parents.append(numpy.array(level_parents, dtype=numpy.int64))
+        firsts.append(numpy.array(level_firsts, dtype=numpy.int64))
+        lasts.append(numpy.array(level_lasts, dtype=numpy.int64))
+        data.append(level_data)
+    if not flat:
+        return {'parent': parents, 'first_child': firsts,
+                'last_child': lasts, 'data': [_data_array(each)
+                                              for each in data]}
+    level_offsets = numpy.zeros(len(parents) + 1, dtype=numpy.int64)
+    numpy.cumsum([len(each) for each in parents], out=level_offsets[1:])
+    for level_index in range(len(parents)):
+        if level_index > 0:
+            parents[level_index] += level_offsets[level_index - 1]
+        has_children = firsts[level_index] != NO_CHILD
+        firsts[level_index][has_children] += level_offsets[level_index + 1]
+        lasts[level_index][has_children] += level_offsets[level_index + 1]
+    empty = numpy.zeros(0, dtype=numpy.int64)
+    return {'parent': numpy.concatenate(parents) if parents else empty,
+            'first_child': numpy.concatenate(firsts) if firsts else empty,
+            'last_child': numpy.concatenate(lasts) if lasts else empty,
+            'data': _data_array([datum for each in data for datum in each]),
+            'level_offsets': level_offsets}
+
+
+def _int_column(values):
+    """array('q') copy of a column of ints - numpy arrays are converted in one
+    go through their buffer"""
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        return array('q', numpy.ascontiguousarray(values, dtype=numpy.int64)
+                     .tobytes())
+    return as_column(values)
+
+
+def _split_levels(values, level_offsets, rebase=False):
+    """split a flat column into levels. if :rebase: is set, the values are
+    positions on the level above and become sibling indices"""
+    levels = []
+    for level_index in range(len(level_offsets) - 1):
+        level = values[level_offsets[level_index]:
+                       level_offsets[level_index + 1]]
+        if rebase and level_index > 0:
+            offset = level_offsets[level_index - 1]
+            if numpy is not None and isinstance(level, numpy.ndarray):
+                level = level - offset
+            else:
+                level = [value - offset for value in level]
+        levels.append(level)
+    return levels
+
+
+def _check_parents(parents, level_index, parent_size):
+    """make sure the parent indices of a level describe a valid itree level"""
+    if level_index == 0:
+        if len(parents) != 1 or parents[0] != -1:
+            raise ITreeError('the first level must only hold the root, '
+                             'with parent index -1')
+        return
+    if len(parents) == 0:
+        raise ITreeError('level %d is empty but has levels below it'
+                         % level_index)
+    if numpy is not None and len(parents) >= NUMPY_MIN_LEVEL:
+        ascending = bool((numpy.diff(numpy.frombuffer(parents, numpy.int64))
+                          >= 0).all())
+    else:
+        ascending = all(parents[index] <= parents[index + 1]
+                        for index in range(len(parents) - 1))
+    if not (ascending and 0 <= parents[0] and parents[-1] < parent_size):
+        raise ITreeError('the parent indices of level %d must be ascending '
+                         'and reference nodes of level %d'
+                         % (level_index, level_index - 1))
+
+
+def _child_ranges(child_parents, size):
+    """first and last child columns of a level of :size: nodes, given the
+    parent indices of the level below"""
+    if numpy is not None and len(child_parents) >= NUMPY_MIN_LEVEL:
+        parents = numpy.frombuffer(child_parents, numpy.int64)
+        indices = numpy.arange(size)
+        first = numpy.searchsorted(parents, indices, 'left')
+        stop = numpy.searchsorted(parents, indices, 'right')
+        has_children = stop > first
+        first = numpy.where(has_children, first, NO_CHILD)
+        last = numpy.where(has_children, stop - 1, NO_CHILD)
+        return (array('q', first.astype(numpy.int64).tobytes()),
+                array('q', last.astype(numpy.int64).tobytes()))
+    return child_ranges(child_parents, size)
+
+
+def load_arrays(matrix, parent, data=None, level_offsets=None):
+    """replace the levels of :matrix: with the tree described by parent
+    index arrays. the child ranges are computed from the parent indices, with
+    numpy installed that is one vectorized pass per level.
+
+    :matrix: ITreeMatrix - the matrix to load the tree into
+    :parent: list - of parent index sequences, one per level. the root level
+    must be [-1] and the parent indices of each level must be ascending.
+    :data: list - optional, of data sequences, one per level. None if unset
+    :level_offsets: sequence - optional, if set parent and data are single
+    flat sequences as returned by to_arrays(flat=True)
+
+    """
+    if level_offsets is not None:
+        parent = _split_levels(parent, level_offsets, rebase=True)
+        if data is not None:
+            data = _split_levels(data, level_offsets)
+    parents = [_int_column(each) for each in parent]
+    while parents and len(parents[-1]) == 0:
+        parents.pop()
+    for level_index, level_parents in enumerate(parents):
+        parent_size = len(parents[level_index - 1]) if level_index else 1
+        _check_parents(level_parents, level_index, parent_size)
+    rows = []
+    for level_index, level_parents in enumerate(parents):
+        size = len(level_parents)
+        if level_index + 1 < len(parents):
+            firsts, lasts = _child_ranges(parents[level_index + 1], size)
+        else:
+            firsts = array('q', [NO_CHILD]) * size
+            lasts = array('q', [NO_CHILD]) * size
+        if data is None:
+            level_data = [None] * size
+        elif numpy is not None and isinstance(data[level_index],
+                                              numpy.ndarray):
+            level_data = data[level_index].tolist()
+        else:
+            level_data = list(data[level_index])
+        if len(level_data) != size:
+            raise ITreeError('level %d has %d parent indices but %d data '
+                             'values' % (level_index, size, len(level_data)))
+        rows.append(matrix.row_class.from_columns(
+            level_index, level_parents, firsts, lasts, level_data))
+    matrix.levels = rows
+    if not rows:
+        matrix.add_row()
+    matrix.levels_replaced()
+    return matrix
@@ -0,0 +1,279 @@
+"""compact binary file format for itrees, and read only trees served
+straight from a memory mapped file.
+
+the file starts with a header, followed by one block per level:
+
+    header:  magic, byte order mark, version, data typecode, number of levels
+             and a (node count, block position) pair per level
+    block:   parent indices, first child indices, last child indices
+             then either the data as a fixed width column (data typecode)
+             or data offsets followed by a blob of encoded data values
+
+all integers are native 64 bit and every block starts 8 byte aligned, so the
+columns can be used in place through memoryview casts."""
+import json
+import mmap
+import struct
+from array import array
+
+from itree.structs import ITreeError, ITreeMatrix
+from itree.columnar import ColumnarITreeRow, ColumnarITreeMatrix
+
+MAGIC = b'ITREEBIN'
+VERSION = 1
+# written natively, reads differently on a machine of the other endianness
+BYTE_ORDER_MARK = 0x0102030405060708
+# fields after the magic: byte order mark, version, typecode, levels
+HEADER = struct.Struct('=4q')
+LEVEL = struct.Struct('=2q')
+# typecodes that can be used for fixed width data
+DATA_FORMATS = 'bBhHiIlLqQfd'
+
+
+def encode_json(data):
+    return json.dumps(data).encode('utf-8')
+
+
+def decode_json(data):
+    return json.loads(data.decode('utf-8'))
+
+
+def _padding(size):
+    return b'\0' * (-size % 8)
+
+
+def save(matrix, path, data_format=None, encode=encode_json):
+    """write the tree in :matrix: to :path: in the itree binary format
+
+    :matrix: ITreeMatrix - the tree to write
+    :path: str - where to write it
+    :data_format: str - optional, an array typecode (eg: 'd' or 'q'). if set
+    the data is stored as a fixed width column of that type, otherwise each
+    value is encoded separately
+    :encode: callable - encodes a data value to bytes, unless data_format
+
+    """
+    if data_format is not None and data_format not in DATA_FORMATS:
+        raise ITreeError('data_format must be one of %s' % DATA_FORMATS)
+    if matrix.dead:
+        matrix = matrix.extract(0, 0)
+    levels = matrix.levels
+    typecode = ord(data_format) if data_format is not None else 0
+    header_size = len(MAGIC) + HEADER.size + LEVEL.size * len(levels)
+    positions = []
+    with open(path, 'wb') as fileobj:
+        fileobj.write(b'\0' * header_size)
+        for level in levels:
+            positions.append(fileobj.tell())
+            parents, firsts, lasts, data = level.columns()
+            fileobj.write(parents.tobytes())
+            fileobj.write(firsts.tobytes())
+            fileobj.write(lasts.tobytes())
+            if data_format is not None:
+                values = array(data_format, data).tobytes()
+            else:
+                encoded = [encode(datum) for datum in data]
+                offsets = array('q', [0])
+                for value in encoded:
+                    offsets.append(offsets[-1] + len(value))
+                fileobj.write(offsets.tobytes())
+                values = b''.join(encoded)
+            fileobj.write(values)
+            fileobj.write(_padding(len(values)))
+        fileobj.seek(0)
+        fileobj.write(MAGIC)
+        fileobj.write(HEADER.pack(BYTE_ORDER_MARK, VERSION, typecode,
+                                  len(levels)))
+        for level, position in zip(levels, positions):
+            fileobj.write(LEVEL.pack(len(level), position))
+
+
+class BlobColumn(object):
+
+    """read only data column of values encoded one after the other in a
+    blob. values are decoded when accessed."""
+
+    def __init__(self, offsets, blob, decode=decode_json):
+        """
+
+        :offsets: sequence - start of each value in blob, plus the end
+        :blob: memoryview - the encoded values
+        :decode: callable - decodes the bytes of a value
+
+        """
+        self.offsets = offsets
+        self.blob = blob
+        self.decode = decode
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('column index out of range')
+        return self.decode(self.blob[self.offsets[index]:
+                                     self.offsets[index + 1]].tobytes())
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+class MmapITreeRow(ColumnarITreeRow):
+
+    """A row of a MmapITreeMatrix. a ColumnarITreeRow whose columns are views
+    into the memory mapped file, it can't be modified."""
+
+    def __init__(self, level, parent_indices, first_child_indices,
+                 last_child_indices, data):
+        self.level = level
+        self.dead = 0
+        self.parent_indices = parent_indices
+        self.first_child_indices = first_child_indices
+        self.last_child_indices = last_child_indices
+        self.data = data
+
+    def columns(self, start=0, stop=None):
+        """get the nodes of this row (or the slice start:stop of it) as
+        columns, see ITreeRow.columns. these are copies, not views"""
+        parents, firsts, lasts = array('q'), array('q'), array('q')
+        parents.frombytes(self.parent_indices[start:stop].cast('B'))
+        firsts.frombytes(self.first_child_indices[start:stop].cast('B'))
+        lasts.frombytes(self.last_child_indices[start:stop].cast('B'))
+        data = self.data[start:stop]
+        if isinstance(data, memoryview):
+            data = data.tolist()
+        return parents, firsts, lasts, data
+
+    def memory_usage(self, deep=False, seen=None):
+        """how many bytes of the file this row maps, the data counted as
+        it is encoded in the file"""
+        structure = sum(column.nbytes for column in (
+            self.parent_indices, self.first_child_indices,
+            self.last_child_indices))
+        if isinstance(self.data, memoryview):
+            return structure, self.data.nbytes
+        return structure + self.data.offsets.nbytes, self.data.blob.nbytes
+
+    def _read_only(self, *args, **kwargs):
+        raise ITreeError('this itree is read only')
+
+    __setitem__ = __delitem__ = insert = pop = _read_only
+    append_child = append_children = set_id = _read_only
+    shift_children = shift_parents = _read_only
+
+
+class MmapITreeMatrix(ITreeMatrix):
+
+    """read only ITreeMatrix served straight from a file in the itree binary
+    format. nothing is deserialized up front - the index columns are memory
+    mapped and data values are decoded when accessed, so opening is instant
+    and processes that open the same file share its pages."""
+
+    def __init__(self, path, decode=decode_json):
+        """
+
+        :path: str - the file to open, written by save
+        :decode: callable - decodes the bytes of a data value, must match
+        the encode the file was saved with
+
+        """
+        self.tombstones = False
+        self.compact_threshold = None
+        self.proxy_hook = None
+        self.version = 0
+        self.observers = []
+        self.next_id = 0
+        self.frozen = True
+        self.path = path
+        self.fileobj = open(path, 'rb')
+        try:
+            self.mmap = mmap.mmap(self.fileobj.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files can't be mapped
+            self.fileobj.close()
+            raise ITreeError('%s is not an itree binary file' % path)
+        self.view = memoryview(self.mmap)
+        try:
+            self.levels = self._read_levels(decode)
+        except Exception:
+            self.close()
+            raise
+
+    def _read_levels(self, decode):
+        view = self.view
+        if view[:len(MAGIC)].tobytes() != MAGIC:
+            raise ITreeError('%s is not an itree binary file' % self.path)
+        byte_order, version, typecode, height = HEADER.unpack_from(
+            view, len(MAGIC))
+        if byte_order != BYTE_ORDER_MARK:
+            raise ITreeError('%s was written on a machine with different '
+                             'byte order' % self.path)
+        if version != VERSION:
+            raise ITreeError('%s has unknown version %d' % (self.path,
+                                                             version))
+        levels = []
+        offset = len(MAGIC) + HEADER.size
+        for level_index in range(height):
+            size, position = LEVEL.unpack_from(view, offset)
+            offset += LEVEL.size
+            columns = []
+            for _ in range(3):
+                columns.append(view[position:position + 8 * size].cast('q'))
+                position += 8 * size
+            if typecode:
+                data_format = chr(typecode)
+                itemsize = array(data_format).itemsize
+                data = view[position:position + itemsize * size].cast(
+                    data_format)
+            else:
+                offsets = view[position:position + 8 * (size + 1)].cast('q')
+                position += 8 * (size + 1)
+                data = BlobColumn(offsets,
+                                  view[position:position + offsets[-1]],
+                                  decode)
+            levels.append(MmapITreeRow(level_index, *(columns + [data])))
+        return levels
+
+    def close(self):
+        """release the memory mapped file. the matrix can't be used after"""
+        # the views have to go before the map can be closed
+        for level in getattr(self, 'levels', []):
+            for column in (level.parent_indices, level.first_child_indices,
+                           level.last_child_indices):
+                column.release()
+            if isinstance(level.data, memoryview):
+                level.data.release()
+            else:
+                level.data.offsets.release()
+                level.data.blob.release()
+        self.levels = []
+        self.view.release()
+        self.mmap.close()
+        self.fileobj.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get_node(self, row, column):
+        # there are no tombstones to check for, which would decode the data
+        return self.levels[row][column]
+
+    def empty_like(self):
+        # copies out of a read only tree are columnar, so they can be changed
+        return ColumnarITreeMatrix(levels=0)
+
+    def _read_only(self, *args, **kwargs):
+        raise ITreeError('this itree is read only')
+
+    set_root = append_child = append_last = remove_node = _read_only
+    append_children = bulk_append = _read_only
+    remove_subtree = prune = add_row = _read_only
@@ -0,0 +1,360 @@
+"""columnar storage engine for the itree. instead of keeping an ITreeNode
+object (and its __dict__) per node, each level keeps the parent, first child
+and last child indices of its nodes in typed arrays and the data in a
+separate list. nodes are handed out as light views over these columns, so the
+rest of the itree code can't tell the difference."""
+import sys
+from array import array
+from bisect import bisect_right
+
+from itree.structs import (BaseITreeNode, ITreeNode, ITreeMatrix, ITreeError,
+                           MAX_SHIFTS, NO_CHILD, NO_ID, TOMBSTONE,
+                           PendingShifts, sizeof)
+
+
+def as_column(values):
+    """get :values: as an array('q') column, copying only if they aren't one
+    already"""
+    if isinstance(values, array) and values.typecode == 'q':
+        return values
+    return array('q', values)
+
+
+class ColumnarITreeNode(BaseITreeNode):
+
+    """view of a node stored in a ColumnarITreeRow. it behaves like an
+    ITreeNode, but reads and writes go straight to the columns of the row.
+    views only hold the row and the index, they have no instance dict."""
+
+    __slots__ = ('row', 'index')
+
+    def __init__(self, row, index):
+        """
+
+        :row: ColumnarITreeRow - the row the node is stored in
+        :index: int - the sibling index of the node in the row
+
+        """
+        self.row = row
+        self.index = index
+
+    @property
+    def data(self):
+        return self.row.data[self.index]
+
+    @data.setter
+    def data(self, value):
+        self.row.data[self.index] = value
+
+    @property
+    def parent_index(self):
+        return self.row.parent_indices[self.index]
+
+    @parent_index.setter
+    def parent_index(self, value):
+        self.row.parent_indices[self.index] = value
+
+    # the child ranges add the pending shifts of the row, see PendingShifts
+
+    @property
+    def _first_child_index(self):
+        index = self.row.first_child_indices[self.index]
+        if index == NO_CHILD:
+            return None
+        return index + self.row._offset(self.index)
+
+    @_first_child_index.setter
+    def _first_child_index(self, value):
+        self.row.first_child_indices[self.index] = (
+            NO_CHILD if value is None
+            else value - self.row._offset(self.index))
+
+    @property
+    def _last_child_index(self):
+        index = self.row.last_child_indices[self.index]
+        if index == NO_CHILD:
+            return None
+        return index + self.row._offset(self.index)
+
+    @_last_child_index.setter
+    def _last_child_index(self, value):
+        self.row.last_child_indices[self.index] = (
+            NO_CHILD if value is None
+            else value - self.row._offset(self.index))
+
+    @property
+    def node_id(self):
+        node_ids = self.row.node_ids
+        if node_ids is None or node_ids[self.index] == NO_ID:
+            return None
+        return node_ids[self.index]
+
+
+class ColumnarITreeRow(object):
+
+    """A row of the ColumnarITreeMatrix. same interface as ITreeRow, but the
+    nodes are stored as columns - one array per node attribute."""
+
+    # the matrix the row belongs to, told when node data is set
+    matrix = None
+    # set once the row is shared by copies of the matrix, see
+    # ITreeMatrix.copy. it is then copied before it is changed
+    shared = False
+    # array('q') of node ids, only made once a node of the row is given one
+    node_ids = None
+    # PendingShifts of the child ranges, see ITreeRow
+    pending = None
+
+    def __init__(self, level):
+        """
+
+        :level: int - the index of the level this row represents
+
+        """
+        self.level = level
+        # how many nodes of this row are tombstones
+        self.dead = 0
+        self.data = []
+        self.parent_indices = array('q')
+        self.first_child_indices = array('q')
+        self.last_child_indices = array('q')
+
+    @classmethod
+    def from_columns(cls, level, parent_indices, first_child_indices,
+                     last_child_indices, data, ids=None):
+        """create a row from its columns, array('q') columns are used as they
+        are without copying"""
+        row = cls(level)
+        if ids is not None:
+            row.node_ids = as_column(ids)
+        row.data = data if isinstance(data, list) else list(data)
+        row.parent_indices = as_column(parent_indices)
+        row.first_child_indices = as_column(first_child_indices)
+        row.last_child_indices = as_column(last_child_indices)
+        row.dead = sum(1 for datum in row.data if datum is TOMBSTONE)
+        return row
+
+    def columns(self, start=0, stop=None):
+        """get the nodes of this row (or the slice start:stop of it) as
+        columns, see ITreeRow.columns"""
+        self.settle()
+        return (self.parent_indices[start:stop],
+                self.first_child_indices[start:stop],
+                self.last_child_indices[start:stop],
+                self.data[start:stop])
+
+    def ids(self, start=0, stop=None):
+        """get the ids of the nodes of this row (or the slice start:stop of
+        it), see ITreeRow.ids"""
+        if self.node_ids is None:
+            return array('q', [NO_ID]) * len(self.parent_indices[start:stop])
+        return self.node_ids[start:stop]
+
+    def set_id(self, column, node_id):
+        if self.node_ids is None:
+            self.node_ids = array('q', [NO_ID]) * len(self)
+        self.node_ids[column] = node_id
+
+    def memory_usage(self, deep=False, seen=None):
+        """how many bytes this row takes, see ITreeRow.memory_usage"""
+        seen = set() if seen is None else seen
+        structure = sys.getsizeof(self) + sys.getsizeof(self.data)
+        for column in (self.parent_indices, self.first_child_indices,
+                       self.last_child_indices, self.node_ids):
+            if column is not None:
+                structure += sys.getsizeof(column)
+        data = sum(sizeof(datum, seen, deep) for datum in self.data)
+        return structure, data
+
+    def __len__(self):
+        return len(self.data)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield ColumnarITreeNode(self, index)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [ColumnarITreeNode(self, i)
+                    for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('row index out of range')
+        return ColumnarITreeNode(self, index)
+
+    def __setitem__(self, index, item):
+        """ allow setting node data with setter, like ITreeRow does"""
+        previous = self.data[index]
+        if previous is TOMBSTONE:
+            raise ITreeError('cannot set the data of a deleted node')
+        if self.shared:
+            matrix = self.matrix
+            if (matrix is None or self.level >= len(matrix.levels) or
+                    matrix.levels[self.level] is not self):
+                raise ITreeError('this row is shared with a copy of the '
+                                 'tree, set the data with '
+                                 'ITreeMatrix.set_data')
+            # copy on write, the matrix puts a copy of this row in its place
+            matrix.set_data(self.level, index, item)
+            return
+        self.data[index] = item
+        if self.matrix is not None:
+            if index < 0:
+                index += len(self)
+            self.matrix.notify('data_changed', self.level, index, previous)
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def __delitem__(self, index):
+        """delete the node (or slice of nodes) at :index:"""
+        if self.pending is not None:
+            if isinstance(index, slice):
+                first, stop, _ = index.indices(len(self))
+            else:
+                first, stop = index, index + 1
+            self.pending.removed(first, max(first, stop))
+        del self.data[index]
+        del self.parent_indices[index]
+        del self.first_child_indices[index]
+        del self.last_child_indices[index]
+        if self.node_ids is not None:
+            del self.node_ids[index]
+
+    def insert(self, index, node):
+        """insert a copy of ITreeNode :node: at sibling index :index:"""
+        first, last = node._first_child_index, node._last_child_index
+        if self.pending is not None:
+            self.pending.inserted(index, 1)
+            if first is not None:
+                offset = self.pending.offset(index)
+                first, last = first - offset, last - offset
+        if node.node_id is not None and self.node_ids is None:
+            self.node_ids = array('q', [NO_ID]) * len(self)
+        if self.node_ids is not None:
+            self.node_ids.insert(index, NO_ID if node.node_id is None
+                                 else node.node_id)
+        self.data.insert(index, node.data)
+        self.parent_indices.insert(index, node.parent_index)
+        self.first_child_indices.insert(index,
+                                        NO_CHILD if first is None else first)
+        self.last_child_indices.insert(index,
+                                       NO_CHILD if last is None else last)
+
+    def append(self, node):
+        self.insert(len(self), node)
+
+    def pop(self, index=-1):
+        """remove the node at :index: and return it as a standalone
+        ITreeNode"""
+        if index < 0:
+            index += len(self)
+        offset = self._offset(index)
+        if self.pending is not None:
+            self.pending.removed(index, index + 1)
+        node = ITreeNode(self.data.pop(index), self.parent_indices.pop(index))
+        first = self.first_child_indices.pop(index)
+        last = self.last_child_indices.pop(index)
+        if first != NO_CHILD:
+            node._first_child_index = first + offset
+            node._last_child_index = last + offset
+        if self.node_ids is not None:
+            node_id = self.node_ids.pop(index)
+            if node_id != NO_ID:
+                node.node_id = node_id
+        return node
+
+    def bisect_parent(self, parent_index):
+        """find how many nodes of this row have a parent index less than or
+        equal to :parent_index:. see ITreeRow.bisect_parent"""
+        return bisect_right(self.parent_indices, parent_index)
+
+    def append_child(self, data, parent_column, sibling_index=None):
+        """ append data as node next to its siblings, namely next to the nodes
+        which have the same parent with it. see ITreeRow.append_child"""
+        if sibling_index is None:
+            sibling_index = self.bisect_parent(parent_column)
+        self.insert(sibling_index, ITreeNode(data, parent_index=parent_column))
+        return (self.level, sibling_index)
+
+    def append_children(self, data, parent_column, sibling_index=None):
+        """append_child for many children of the same parent, see
+        ITreeRow.append_children"""
+        if sibling_index is None:
+            sibling_index = self.bisect_parent(parent_column)
+        count = len(data)
+        if self.pending is not None:
+            self.pending.inserted(sibling_index, count)
+        empty = array('q', [NO_CHILD]) * count
+        position = slice(sibling_index, sibling_index)
+        self.data[position] = data
+        self.parent_indices[position] = array('q', [parent_column]) * count
+        self.first_child_indices[position] = empty
+        self.last_child_indices[position] = empty
+        if self.node_ids is not None:
+            self.node_ids[position] = array('q', [NO_ID]) * count
+        return (self.level, sibling_index)
+
+    def _offset(self, column):
+        return 0 if self.pending is None else self.pending.offset(column)
+
+    def child_range(self, column):
+        """get the (first, last) child indices of the node at :column:, see
+        ITreeRow.child_range"""
+        first = self.first_child_indices[column]
+        if first == NO_CHILD:
+            return None
+        offset = self._offset(column)
+        return (first + offset, self.last_child_indices[column] + offset)
+
+    def add_children(self, column, sibling_index, count=1):
+        """see ITreeRow.add_children"""
+        self[column].append_children(sibling_index, count)
+
+    def shift_children(self, start, offset):
+        """shift the child ranges of the nodes from :start: onwards by
+        :offset:, lazily, see ITreeRow.shift_children"""
+        if start >= len(self) or not offset:
+            return
+        if self.pending is None:
+            self.pending = PendingShifts()
+        self.pending.shift(start, offset)
+        if len(self.pending) > MAX_SHIFTS:
+            self.settle()
+
+    def settle(self):
+        """apply the pending shifts to the child range columns, one slice
+        assignment per run of nodes that moved the same"""
+        pending, self.pending = self.pending, None
+        if pending is None:
+            return
+        for first, stop, offset in pending.runs(len(self)):
+            for column in (self.first_child_indices, self.last_child_indices):
+                column[first:stop] = array('q', [
+                    index if index == NO_CHILD else index + offset
+                    for index in column[first:stop]])
+
+    def shift_parents(self, parent_index, offset):
+        """shift the parent index of the nodes whose parent index is at least
+        :parent_index: by :offset:, with one slice assignment"""
+        parents = self.parent_indices
+        start = self.bisect_parent(parent_index - 1)
+        parents[start:] = array('q', [index + offset
+                                      for index in parents[start:]])
+
+    def remove_child(self, parent_index, child_index):
+        """remove child :child_index: from node :parent_index: of this row
+        and shift the child indices of the nodes to its right"""
+        self[parent_index].remove_child(child_index)
+        self.shift_children(parent_index + 1, -1)
+
+
+class ColumnarITreeMatrix(ITreeMatrix):
+
+    """ITreeMatrix that stores each level in columns rather than as a list of
+    ITreeNode objects. uses a fraction of the memory for large trees and
+    scans over a level touch contiguous memory. use it as the tree argument
+    of ITree, eg: ITree(tree=ColumnarITreeMatrix())"""
+
+    row_class = ColumnarITreeRow
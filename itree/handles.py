@@ -0,0 +1,139 @@
+"""stable handles - node ids that keep finding their node while inserts and
+deletes shift the sibling indices around it. a node is given an id the
+first time a handle to it is asked for (see ITreeMatrix.node_id) and the id
+moves with the node. nodes never change level, so the index keeps the level
+of each id and, for each level, a dict from id to sibling index. the index
+is an observer of the matrix: a change that shifts the nodes of a level is
+logged and replayed on the column of an id when it is resolved (see
+structs.shifted), a level is only rebuilt from its id column after
+MAX_SHIFTS shifts or a change that replaces the levels."""
+from itree.structs import ITreeError, MAX_SHIFTS, NO_ID, TOMBSTONE, shifted
+
+
+class HandleIndex(object):
+
+    """resolves node ids to the (row, column) the node is at now"""
+
+    def __init__(self, matrix):
+        """
+
+        :matrix: ITreeMatrix - the tree to index
+
+        """
+        self.matrix = matrix
+        # the level of each id handed out through this index
+        self.rows = {}
+        # columns[row] - dict from id to [column, seen], the column of the
+        # node of row with that id as it was after seen shifts of the row.
+        # None if the row has to be rebuilt
+        self.columns = []
+        # shifts[row] - the (at, delta) shifts of row since it was built
+        self.shifts = []
+
+    def _build(self, row):
+        columns = {}
+        for column, node_id in enumerate(self.matrix.levels[row].ids()):
+            if node_id != NO_ID:
+                columns[node_id] = [column, 0]
+        self.columns[row] = columns
+        self.shifts[row] = []
+        return columns
+
+    def _level(self, row):
+        """the dict of :row:, rebuilt if it is out of date"""
+        height = len(self.matrix.levels)
+        if len(self.columns) != height:
+            del self.columns[height:]
+            del self.shifts[height:]
+            self.columns.extend([None] * (height - len(self.columns)))
+            self.shifts.extend([] for _ in range(height - len(self.shifts)))
+        columns = self.columns[row]
+        if columns is None:
+            columns = self._build(row)
+        return columns
+
+    def _column(self, row, node_id):
+        """the column of the node of :row: with id :node_id:, replaying the
+        shifts of the row it hasn't seen. None if the row has no such id"""
+        entry = self._level(row).get(node_id)
+        if entry is None:
+            return None
+        shifts = self.shifts[row]
+        if entry[1] != len(shifts):
+            entry[0] = shifted(entry[0], shifts, entry[1])
+            entry[1] = len(shifts)
+        return entry[0]
+
+    def _shift(self, row, at, delta):
+        shifts = self.shifts[row]
+        shifts.append((at, delta))
+        if len(shifts) > MAX_SHIFTS:
+            self.columns[row] = None
+
+    def handle(self, row, column):
+        """get the id of the node at (row, column), see
+        ITreeMatrix.node_id"""
+        node_id = self.matrix.node_id(row, column)
+        self.rows[node_id] = row
+        if row < len(self.columns) and self.columns[row] is not None:
+            self.columns[row][node_id] = [column, len(self.shifts[row])]
+        return node_id
+
+    def resolve(self, node_id):
+        """get the (row, column) of the node with id :node_id:
+
+        :raises: ITreeError - if the node was deleted
+        """
+        if node_id not in self.rows:
+            # ids given before this index existed, eg: by the tree this one
+            # was copied from
+            for row in range(len(self.matrix.levels)):
+                for known in self._level(row):
+                    self.rows[known] = row
+        row = self.rows.get(node_id)
+        if row is not None and row < len(self.matrix.levels):
+            column = self._column(row, node_id)
+            if (column is not None and
+                    self.matrix.levels[row][column].data is not TOMBSTONE):
+                return (row, column)
+        self.rows.pop(node_id, None)
+        raise ITreeError('no node has handle %s, it was deleted' % node_id)
+
+    # the observer events, see ITreeMatrix.notify
+
+    def node_inserted(self, row, column):
+        # new nodes have no id, but the nodes to their right moved
+        if (row < len(self.columns) and self.columns[row] is not None and
+                column != len(self.matrix.levels[row]) - 1):
+            self._shift(row, column, 1)
+
+    def node_removed(self, row, column, removed):
+        if removed.node_id is not None:
+            self.rows.pop(removed.node_id, None)
+        if self.matrix.tombstones or row >= len(self.columns):
+            return
+        if row == len(self.matrix.levels):
+            # it was the last node of the last level, the level is gone
+            del self.columns[row:]
+            del self.shifts[row:]
+        elif self.columns[row] is not None:
+            self.columns[row].pop(removed.node_id, None)
+            if column != len(self.matrix.levels[row]):
+                self._shift(row, column + 1, -1)
+
+    def data_changed(self, row, column, previous):
+        pass
+
+    def levels_replaced(self):
+        self.columns = []
+        self.shifts = []
+
+
+def get_handle_index(matrix):
+    """get the HandleIndex of :matrix:, it is created the first time"""
+    for observer in matrix.observers:
+        if isinstance(observer, HandleIndex):
+            return observer
+    index = HandleIndex(matrix)
+    matrix.add_observer(index)
+    return index
@@ -0,0 +1,164 @@
+"""instrumentation of an ITreeMatrix - counts of operations, how many nodes
+each one had to shift, latency histograms and node proxy allocations.
+instrumenting a matrix wraps its methods on the instance (and sets its
+proxy_hook to count proxies), so nothing changes for a matrix that isn't
+instrumented and there is next to no overhead when it is disabled."""
+import time
+
+# the matrix methods that are timed
+OPERATIONS = ('get_node', 'set_data', 'append_child', 'append_children',
+              'append_last', 'bulk_append', 'remove_node', 'remove_subtree',
+              'compact', 'prune', 'extract')
+
+
+class Stats(object):
+
+    """what the instrumentation of a matrix recorded. each operation has a
+    count, the total time, the number of nodes it shifted (moved to another
+    sibling index or whose indices had to be fixed) and a histogram of its
+    latency with power of 2 microsecond buckets"""
+
+    def __init__(self, callback=None):
+        """
+
+        :callback: callable - optional, called after every operation with
+        the name of the operation, how long it took in seconds and a dict of
+        what else was measured (eg: shifted, bisect)
+
+        """
+        self.callback = callback
+        self.reset()
+
+    def reset(self):
+        self.operations = {}
+        # proxies created by make_node
+        self.proxies = 0
+
+    def record(self, operation, seconds, info):
+        try:
+            entry = self.operations[operation]
+        except KeyError:
+            entry = self.operations[operation] = {
+                'count': 0, 'seconds': 0., 'shifted': 0, 'max_shifted': 0,
+                'bisect': 0, 'histogram': {}}
+        entry['count'] += 1
+        entry['seconds'] += seconds
+        if info:
+            shifted = info.get('shifted', 0)
+            entry['shifted'] += shifted
+            entry['max_shifted'] = max(entry['max_shifted'], shifted)
+            entry['bisect'] += info.get('bisect', 0)
+        # bucket b holds latencies under 2 ** b microseconds
+        bucket = 1 << int(seconds * 1e6).bit_length()
+        histogram = entry['histogram']
+        histogram[bucket] = histogram.get(bucket, 0) + 1
+        if self.callback is not None:
+            self.callback(operation, seconds, info)
+
+    def proxy_made(self, node):
+        self.proxies += 1
+
+    def as_dict(self):
+        """a copy of the stats, safe to keep after a reset"""
+        operations = {}
+        for operation, entry in self.operations.items():
+            entry = dict(entry, histogram=dict(entry['histogram']))
+            operations[operation] = entry
+        return {'operations': operations, 'proxies': self.proxies}
+
+
+def _append_child_info(matrix, data, parent_row, parent_column):
+    """measure before append_child: will it bisect, and a function that
+    measures the shifts once we know where the child went"""
+    levels = matrix.levels
+    bisect = (parent_row < 0 or
+              levels[parent_row].child_range(parent_column) is None)
+
+    def after(result):
+        row, column = result
+        shifted = len(levels[row]) - column - 1
+        if shifted and parent_row >= 0:
+            shifted += len(levels[parent_row]) - parent_column - 1
+            if row + 1 < len(levels):
+                below = levels[row + 1]
+                shifted += len(below) - below.bisect_parent(column - 1)
+        return {'shifted': shifted, 'bisect': int(bisect)}
+    return after
+
+
+def _remove_node_info(matrix, row, column):
+    if matrix.tombstones:
+        return lambda result: {'shifted': 0}
+    shifted = len(matrix.levels[row]) - column - 1
+    if row > 0:
+        shifted += len(matrix.levels[row - 1]) - 1 - matrix.levels[
+            row][column].parent_index
+    return lambda result: {'shifted': shifted}
+
+
+def _remove_subtree_info(matrix, row, column):
+    ranges = matrix.subtree_ranges(row, column)
+    shifted = sum(len(matrix.levels[level]) - stop
+                  for level, _, stop in ranges)
+    return lambda result: {'shifted': shifted}
+
+
+# what to measure about an operation besides its latency, called with the
+# arguments of the operation before it runs and returning a function of its
+# result
+MEASURES = {'append_child': _append_child_info,
+            'remove_node': _remove_node_info,
+            'remove_subtree': _remove_subtree_info}
+
+
+def _wrap(matrix, operation, method, stats):
+    measure = MEASURES.get(operation)
+    clock = time.perf_counter
+
+    def instrumented(*args, **kwargs):
+        after = None
+        if measure is not None:
+            try:
+                after = measure(matrix, *args, **kwargs)
+            except (IndexError, TypeError):
+                # the operation will fail on its own, let it
+                pass
+        start = clock()
+        result = method(*args, **kwargs)
+        seconds = clock() - start
+        stats.record(operation, seconds,
+                     after(result) if after is not None else None)
+        return result
+    instrumented.__name__ = operation
+    instrumented.__doc__ = method.__doc__
+    return instrumented
+
+
+def instrument(matrix, callback=None):
+    """start recording stats for :matrix:. does nothing more than set a
+    new callback if it is already instrumented
+
+    :callback: callable - see Stats
+    :returns: Stats - where the stats are recorded, also matrix.stats
+    """
+    stats = getattr(matrix, 'stats', None)
+    if stats is not None:
+        stats.callback = callback
+        return stats
+    stats = matrix.stats = Stats(callback)
+    for operation in OPERATIONS:
+        setattr(matrix, operation, _wrap(matrix, operation,
+                                         getattr(matrix, operation), stats))
+    matrix.proxy_hook = stats.proxy_made
+    return stats
+
+
+def uninstrument(matrix):
+    """stop recording stats for :matrix: and remove the instrumentation"""
+    stats = getattr(matrix, 'stats', None)
+    if stats is None:
+        return
+    for operation in OPERATIONS:
+        delattr(matrix, operation)
+    matrix.proxy_hook = None
+    del matrix.stats
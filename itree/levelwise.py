@@ -0,0 +1,162 @@
+"""computations that go through the tree one level at a time instead of one
+node at a time. the children of a node are a contiguous range of the level
+below it, so combining children into parents (reduce_up) and pushing parent
+values down to children (broadcast_down) are a pass over the parent indices
+of each level. if the function is a numpy ufunc each pass is vectorized."""
+from itree.structs import TOMBSTONE
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def _is_ufunc(fn):
+    return numpy is not None and isinstance(fn, numpy.ufunc)
+
+
+def start_values(data, init):
+    """the value of each node before its children are folded into it, see
+    reduce_up"""
+    if init is None:
+        return list(data)
+    if callable(init):
+        return [None if datum is TOMBSTONE else init(datum) for datum in data]
+    return [init] * len(data)
+
+
+def fold_children(values, parents, child_values, child_data, fn, offset=0):
+    """fold the values of a run of nodes into the values of their parents,
+    in order
+
+    :values: list - the values of the parents, changed in place
+    :parents: sequence - the parent index of each child
+    :child_values: sequence - the value of each child
+    :child_data: sequence - the data of each child, to skip the deleted
+    :fn: callable - see reduce_up
+    :offset: int - the sibling index of values[0] on its level
+
+    """
+    for parent_index, value, datum in zip(parents, child_values, child_data):
+        if datum is not TOMBSTONE:
+            index = parent_index - offset
+            values[index] = fn(values[index], value)
+
+
+def _fill_dead(data, dead):
+    """the data column with tombstones replaced by a live value, whatever
+    is computed for them is ignored"""
+    if not dead:
+        return data
+    fill = next((datum for datum in data if datum is not TOMBSTONE), 0)
+    return [fill if datum is TOMBSTONE else datum for datum in data]
+
+
+def _numeric_start_values(data, dead, init):
+    data = _fill_dead(data, dead)
+    if init is None:
+        return numpy.asarray(data)
+    if _is_ufunc(init):
+        return init(numpy.asarray(data))
+    if callable(init):
+        return numpy.asarray([init(datum) for datum in data])
+    return numpy.full(len(data), init)
+
+
+def _live(parents, data, dead):
+    """numpy parent indices of the live nodes of a level and their mask"""
+    parents = numpy.frombuffer(parents, numpy.int64)
+    if not dead:
+        return parents, None
+    alive = numpy.array([datum is not TOMBSTONE for datum in data], bool)
+    return parents[alive], alive
+
+
+def reduce_up(matrix, fn, init=None):
+    """compute a value for every node by folding the values of its children
+    into it, going up from the deepest level. the children of each node are
+    folded left to right:
+
+        value = init(data)
+        for child in children: value = fn(value, child value)
+
+    eg: subtree sizes are reduce_up(matrix, operator.add, lambda data: 1)
+
+    :matrix: ITreeMatrix - the tree
+    :fn: callable - fn(value, child value) returns the new value. if it is a
+    numpy ufunc (eg: numpy.add) each level is reduced with ufunc.reduceat
+    :init: callable or value - optional, the value of a node before its
+    children are folded in, given its data. a constant if not callable.
+    defaults to the data
+
+    :returns: list - the values of each level, a list per level or a numpy
+    array per level if fn is a ufunc. deleted nodes have undefined values
+    """
+    vectorized = _is_ufunc(fn)
+    values = []
+    below = None
+    for level in reversed(matrix.levels):
+        parents, _, _, data = level.columns()
+        if vectorized:
+            level_values = _numeric_start_values(data, level.dead, init)
+        else:
+            level_values = start_values(data, init)
+        if below is not None:
+            child_parents, child_values, child_data, child_dead = below
+            if vectorized:
+                child_parents, alive = _live(child_parents, child_data,
+                                             child_dead)
+                if alive is not None:
+                    child_values = child_values[alive]
+                if len(child_parents):
+                    # where the runs of siblings start
+                    starts = numpy.flatnonzero(numpy.diff(child_parents)) + 1
+                    starts = numpy.concatenate(([0], starts))
+                    targets = child_parents[starts]
+                    reduced = fn.reduceat(child_values, starts)
+                    level_values = level_values.astype(
+                        numpy.result_type(level_values, reduced))
+                    level_values[targets] = fn(level_values[targets],
+                                               reduced)
+            else:
+                fold_children(level_values, child_parents, child_values,
+                              child_data, fn)
+        values.append(level_values)
+        below = (parents, level_values, data, level.dead)
+    values.reverse()
+    return values
+
+
+def broadcast_down(matrix, fn, root_value):
+    """compute a value for every node from the value of its parent, going
+    down from the root:
+
+        value = fn(parent value, data)
+
+    eg: depth is broadcast_down(matrix, lambda depth, data: depth + 1, 0)
+
+    :matrix: ITreeMatrix - the tree
+    :fn: callable - fn(parent value, data) returns the value of a node. if
+    it is a numpy ufunc (eg: numpy.add) each level is one vectorized call
+    :root_value: the value of the root
+
+    :returns: list - the values of each level, a list per level or a numpy
+    array per level if fn is a ufunc. deleted nodes have undefined values
+    """
+    vectorized = _is_ufunc(fn)
+    levels = matrix.levels
+    if not levels or not len(levels[0]):
+        return []
+    values = [numpy.asarray([root_value]) if vectorized else [root_value]]
+    for level in levels[1:]:
+        parents, _, _, data = level.columns()
+        above = values[-1]
+        if vectorized:
+            parents = numpy.frombuffer(parents, numpy.int64)
+            data = numpy.asarray(_fill_dead(data, level.dead))
+            values.append(fn(above[parents], data))
+        else:
+            values.append([None if datum is TOMBSTONE
+                           else fn(above[parent_index], datum)
+                           for parent_index, datum in zip(parents, data)])
+    return values
@@ -0,0 +1,194 @@
+"""value index - finds nodes by their data (or a key of it) without scanning
+the tree. for each level we keep a dict from key to the sibling indices of
+the nodes with that key, and a dict from key to the levels that have it, so
+a lookup is a couple of dict lookups whatever the height of the tree. the
+index is an observer of the matrix: appends, deletes and data changes update
+it in place. inserts and deletes that shift the sibling indices of a level
+are logged and the columns of a key are brought up to date when it is
+looked up (see structs.shifted), a level is only rebuilt after MAX_SHIFTS
+shifts or a change that replaces the levels."""
+from bisect import insort
+
+from itree.structs import ITreeError, MAX_SHIFTS, TOMBSTONE, shifted
+
+
+class ValueIndex(object):
+
+    """maps keys of node data to the (row, column) of the nodes"""
+
+    def __init__(self, matrix, key=None):
+        """
+
+        :matrix: ITreeMatrix - the tree to index
+        :key: callable - optional, the key of a node given its data,
+        defaults to the data. keys have to be hashable
+
+        """
+        self.matrix = matrix
+        self.key = key
+        # levels[row] - dict from key to [seen, columns], the ascending
+        # columns of the nodes of row with that key as they were after seen
+        # shifts of the row. None until the first lookup
+        self.levels = None
+        # shifts[row] - the (at, delta) shifts of row since it was built
+        self.shifts = []
+        # the rows to rebuild on the next lookup
+        self.stale = set()
+        # dict from key to the set of rows that have it
+        self.rows = {}
+
+    def _key(self, data):
+        return data if self.key is None else self.key(data)
+
+    def _build(self, row):
+        for key in self.levels[row] or ():
+            self._forget(key, row)
+        level = {}
+        for column, datum in enumerate(self.matrix.levels[row].columns()[3]):
+            if datum is not TOMBSTONE:
+                level.setdefault(self._key(datum), [0, []])[1].append(column)
+        for key in level:
+            self.rows.setdefault(key, set()).add(row)
+        self.levels[row] = level
+        self.shifts[row] = []
+
+    def _update(self):
+        """build the index on the first lookup, and rebuild the levels that
+        shifted too many times since"""
+        if self.levels is None:
+            height = len(self.matrix.levels)
+            self.levels = [None] * height
+            self.shifts = [[] for _ in range(height)]
+            self.rows = {}
+            self.stale = set(range(height))
+        for row in sorted(self.stale):
+            self._build(row)
+        self.stale.clear()
+
+    def _columns(self, row, key):
+        """the columns of the nodes of :row: with :key:, replaying the shifts
+        of the row they haven't seen"""
+        entry = self.levels[row].get(key)
+        if entry is None:
+            return []
+        shifts = self.shifts[row]
+        if entry[0] != len(shifts):
+            entry[1] = [shifted(column, shifts, entry[0])
+                        for column in entry[1]]
+            entry[0] = len(shifts)
+        return entry[1]
+
+    def find_all(self, key):
+        """get the (row, column) of all the nodes with :key:, in level
+        order"""
+        self._update()
+        positions = []
+        for row in sorted(self.rows.get(key, ())):
+            for column in self._columns(row, key):
+                positions.append((row, column))
+        return positions
+
+    def find(self, key):
+        """get the (row, column) of the first node with :key: in level
+        order, None if there is none"""
+        self._update()
+        rows = self.rows.get(key)
+        if not rows:
+            return None
+        row = min(rows)
+        return (row, self._columns(row, key)[0])
+
+    def _forget(self, key, row):
+        rows = self.rows[key]
+        rows.discard(row)
+        if not rows:
+            del self.rows[key]
+
+    def _add(self, row, column, data):
+        key = self._key(data)
+        if key in self.levels[row]:
+            insort(self._columns(row, key), column)
+        else:
+            self.levels[row][key] = [len(self.shifts[row]), [column]]
+            self.rows.setdefault(key, set()).add(row)
+
+    def _discard(self, row, column, data):
+        key = self._key(data)
+        columns = self._columns(row, key)
+        columns.remove(column)
+        if not columns:
+            del self.levels[row][key]
+            self._forget(key, row)
+
+    def _shift(self, row, at, delta):
+        self.shifts[row].append((at, delta))
+        if len(self.shifts[row]) > MAX_SHIFTS:
+            self.stale.add(row)
+
+    # the observer events, see ITreeMatrix.notify
+
+    def node_inserted(self, row, column):
+        if self.levels is None:
+            return
+        while row >= len(self.levels):
+            self.levels.append({})
+            self.shifts.append([])
+        if row in self.stale:
+            return
+        if column != len(self.matrix.levels[row]) - 1:
+            self._shift(row, column, 1)
+        self._add(row, column, self.matrix.levels[row][column].data)
+
+    def node_removed(self, row, column, removed):
+        if self.levels is None:
+            return
+        if row == len(self.matrix.levels):
+            # it was the last node of the last level, the level is gone
+            for key in self.levels[row]:
+                self._forget(key, row)
+            del self.levels[row:]
+            del self.shifts[row:]
+            self.stale.discard(row)
+            return
+        if row in self.stale:
+            return
+        self._discard(row, column, removed.data)
+        if (not self.matrix.tombstones and
+                column != len(self.matrix.levels[row])):
+            self._shift(row, column + 1, -1)
+
+    def data_changed(self, row, column, previous):
+        if self.levels is None or row in self.stale:
+            return
+        self._discard(row, column, previous)
+        self._add(row, column, self.matrix.levels[row][column].data)
+
+    def levels_replaced(self):
+        self.levels = None
+
+
+def add_value_index(matrix, key=None):
+    """index the nodes of :matrix: by their data, see ValueIndex. replaces
+    the value index it had
+
+    :returns: ValueIndex - the index, it is built on the first lookup
+    """
+    remove_value_index(matrix)
+    index = ValueIndex(matrix, key)
+    matrix.add_observer(index)
+    return index
+
+
+def get_value_index(matrix):
+    """get the ValueIndex added to :matrix: with add_value_index"""
+    for observer in matrix.observers:
+        if isinstance(observer, ValueIndex):
+            return observer
+    raise ITreeError('there is no value index, add one with '
+                     'add_value_index')
+
+
+def remove_value_index(matrix):
+    """stop keeping the value index of :matrix:, if it has one"""
+    matrix.observers[:] = [observer for observer in matrix.observers
+                           if not isinstance(observer, ValueIndex)]
@@ -0,0 +1,328 @@
+"""reading and writing itrees in the nested list format, eg:
+[root, [child, [grandchild, grandchild], child]]
+a node is followed by the list of its children if it has any."""
+import codecs
+import json
+
+from itree.structs import ITreeError, TOMBSTONE
+
+# what the last item we saw in an open list was
+START, VALUE, LIST = range(3)
+
+WHITESPACE = ' \t\n\r'
+# the characters a json value other than a list can start with
+VALUE_START = '"{-0123456789tfnNI'
+# the characters that can follow a complete value
+VALUE_END = WHITESPACE + ',]'
+
+
+class NestedListBuilder(object):
+
+    """builds an ITreeMatrix from a nested list read left to right as a
+    sequence of events - a value, the start of a list and the end of a list.
+    the nodes come in depth first order, so every node is appended to the end
+    of its level with ITreeMatrix.append_last and no searching is needed.
+    the builder checks the events describe a valid tree as it goes."""
+
+    def __init__(self, matrix, transformer=None):
+        """
+
+        :matrix: ITreeMatrix - empty matrix to append the nodes to
+        :transformer: callable - optional, applied to each value before it is
+        stored as node data
+
+        """
+        self.matrix = matrix
+        self.transformer = transformer
+        # one [level, last item] entry per list we are in
+        self.stack = []
+
+    def open(self):
+        """a list starts"""
+        if self.stack:
+            frame = self.stack[-1]
+            if frame[1] == START:
+                raise ITreeError('this multi list cannot be a tree')
+            if frame[1] == LIST:
+                raise ITreeError('this multi list cannot be a tree, '
+                                 'it contains two consecutive lists')
+            frame[1] = LIST
+            # the items of this list are children of the value before it
+            self.stack.append([frame[0] + 1, START])
+        else:
+            self.stack.append([0, START])
+
+    def close(self):
+        """the current list ends"""
+        if not self.stack:
+            raise ITreeError('this multi list cannot be a tree, '
+                             'it closes more lists than it opens')
+        self.stack.pop()
+
+    def value(self, data):
+        """a value - a node - is found in the current list"""
+        frame = self.stack[-1]
+        if frame[0] == 0 and frame[1] != START:
+            raise ITreeError('this list represents a bush not a tree '
+                             ' - it has many roots')
+        if self.transformer is not None:
+            data = self.transformer(data)
+        self.matrix.append_last(data, frame[0])
+        frame[1] = VALUE
+
+
+def load_nested_list(matrix, nested_list, transformer=None):
+    """fill :matrix: with the tree :nested_list: represents. walks the nested
+    list with an explicit stack, so there is no limit on how deep it can be.
+
+    :matrix: ITreeMatrix - empty matrix to append the nodes to
+    :nested_list: list of lists that represent a tree in our itree format
+    :transformer: callable - optional, applied to each value before it is
+    stored as node data
+
+    """
+    builder = NestedListBuilder(matrix, transformer)
+    builder.open()
+    stack = [iter(nested_list)]
+    while stack:
+        for item in stack[-1]:
+            if isinstance(item, list):
+                builder.open()
+                stack.append(iter(item))
+                break
+            builder.value(item)
+        else:
+            builder.close()
+            stack.pop()
+    return matrix
+
+
+class _TextReader(object):
+
+    """reads str out of a text or binary file object, decoding bytes as
+    utf-8 incrementally so characters split across reads come out whole"""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.eof = False
+
+    def read(self, size):
+        chunk = self.fileobj.read(size)
+        self.eof = not chunk
+        if isinstance(chunk, bytes):
+            return self.decoder.decode(chunk, final=self.eof)
+        return chunk
+
+
+def load_nested_json(matrix, fileobj, transformer=None, chunk_size=65536):
+    """fill :matrix: with the tree the json text of a nested list in
+    :fileobj: represents, eg: as written by write_nested_json. the text is
+    read :chunk_size: characters at a time and nodes are appended as their
+    values are read, so the json text and the nested list are never held in
+    memory - only the chunk and the value being decoded.
+
+    :matrix: ITreeMatrix - empty matrix to append the nodes to
+    :fileobj: file like object - opened in text or binary (utf-8) mode
+    :transformer: callable - optional, applied to each value before it is
+    stored as node data
+    :chunk_size: int - how many characters to read at a time
+
+    raises ValueError if the text isn't json and ITreeError if the nested
+    list it holds isn't a tree
+
+    """
+    builder = NestedListBuilder(matrix, transformer)
+    decoder = json.JSONDecoder()
+    reader = _TextReader(fileobj)
+    text, position = '', 0
+    # whether the last token was an item - a value or the end of a list -
+    # or a comma, both decide what may come next
+    after_item = after_comma = done = False
+    while True:
+        if position == len(text):
+            if reader.eof:
+                break
+            text, position = reader.read(chunk_size), 0
+            continue
+        char = text[position]
+        if char in WHITESPACE:
+            position += 1
+            continue
+        if done:
+            raise ValueError('extra data after the tree at %r' % char)
+        if char == ',':
+            if not after_item or not builder.stack:
+                raise ValueError('unexpected ,')
+            after_item, after_comma = False, True
+            position += 1
+        elif char == '[':
+            if after_item:
+                raise ValueError('expected , or ] before [')
+            builder.open()
+            after_comma = False
+            position += 1
+        elif char == ']':
+            if after_comma:
+                raise ValueError('expected a value after ,')
+            builder.close()
+            after_item, done = True, not builder.stack
+            position += 1
+        elif char in VALUE_START:
+            if after_item:
+                raise ValueError('expected , or ] before a value')
+            # read on until the value is complete. a value is only known to
+            # be complete once what follows it can end a value, otherwise it
+            # could go on in the next chunk (eg: 1. or 1e of a number)
+            while True:
+                try:
+                    value, end = decoder.raw_decode(text, position)
+                    if end < len(text) and text[end] in VALUE_END:
+                        break
+                    if reader.eof:
+                        break
+                except ValueError:
+                    if reader.eof:
+                        raise
+                # read at least as much as we have, to keep this linear
+                more = reader.read(max(chunk_size, len(text) - position))
+                text, position = text[position:] + more, 0
+            position = end
+            if builder.stack:
+                builder.value(value)
+            else:
+                # a tree with just a root is written as the root alone
+                builder.open()
+                builder.value(value)
+                builder.close()
+                done = True
+            after_item, after_comma = True, False
+        else:
+            raise ValueError('unexpected character %r' % char)
+    if builder.stack:
+        raise ValueError('the json text ends before all lists are closed')
+    return matrix
+
+
+def walk_nested(matrix):
+    """walk the tree in :matrix: in the order its nested list is written.
+    yields '[' and ']' where a list starts and ends and a (level, sibling,
+    node) tuple for each node. works straight off the matrix indices with an
+    explicit stack, so it can walk trees of any depth.
+
+    :matrix: ITreeMatrix - the tree to walk
+
+    """
+    matrix.settle()
+    levels = matrix.levels
+    skip_dead = matrix.dead > 0
+    root = matrix.root
+    if not matrix.live_children(0, 0):
+        yield (0, 0, root)
+        return
+    yield '['
+    yield (0, 0, root)
+    yield '['
+    stack = [[1, root._first_child_index, root._last_child_index]]
+    while stack:
+        frame = stack[-1]
+        level_index, sibling_index, last_index = frame
+        if sibling_index > last_index:
+            stack.pop()
+            yield ']'
+            continue
+        frame[1] = sibling_index + 1
+        node = levels[level_index][sibling_index]
+        if skip_dead:
+            if node.data is TOMBSTONE:
+                continue
+            has_children = bool(matrix.live_children(level_index,
+                                                     sibling_index))
+        else:
+            has_children = node._first_child_index is not None
+        yield (level_index, sibling_index, node)
+        if has_children:
+            yield '['
+            stack.append([level_index + 1,
+                          node._first_child_index,
+                          node._last_child_index])
+    yield ']'
+
+
+def _representer(transformer):
+    """what to put in the nested list for each node - its data, unless a
+    transformer of (level, sibling) is given"""
+    if transformer is None:
+        return lambda level_index, sibling_index, node: node.data
+    return lambda level_index, sibling_index, node: transformer(level_index,
+                                                                sibling_index)
+
+
+def to_nested_list(matrix, transformer=None):
+    """convert the tree in :matrix: to a nested list without recursion.
+
+    :matrix: ITreeMatrix - the tree to convert
+    :transformer: callable - optional, called with the level and sibling
+    index of each node, its return value represents the node in the nested
+    list. the node data is used if not set.
+
+    :returns: list - a nested list that represents an itree in our
+    nested list format
+
+    """
+    represent = _representer(transformer)
+    stack = []
+    result = None
+    for event in walk_nested(matrix):
+        if event == '[':
+            current = []
+            if stack:
+                stack[-1].append(current)
+            stack.append(current)
+        elif event == ']':
+            result = stack.pop()
+        elif stack:
+            stack[-1].append(represent(*event))
+        else:
+            result = represent(*event)
+    return result
+
+
+def iter_nested_json(matrix, transformer=None, chunk_size=65536,
+                     dumps=json.dumps):
+    """yield the json text of the nested list of the tree in :matrix: in
+    chunks of about :chunk_size: characters, without building the nested
+    list in memory. the text is the same json.dumps(to_nested_list(matrix))
+    would give.
+
+    :matrix: ITreeMatrix - the tree to convert
+    :transformer: callable - see to_nested_list
+    :chunk_size: int - how many characters to gather before yielding
+    :dumps: callable - encodes the representative of a node to json
+
+    """
+    represent = _representer(transformer)
+    pieces, size, previous = [], 0, '['
+    for event in walk_nested(matrix):
+        if event == ']':
+            piece = ']'
+        else:
+            piece = '[' if event == '[' else dumps(represent(*event))
+            if previous != '[':
+                piece = ', ' + piece
+        previous = event
+        pieces.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield ''.join(pieces)
+            pieces, size = [], 0
+    if pieces:
+        yield ''.join(pieces)
+
+
+def write_nested_json(matrix, fileobj, transformer=None, chunk_size=65536,
+                      dumps=json.dumps):
+    """write the json text of the nested list of the tree in :matrix: to
+    :fileobj: chunk by chunk. see iter_nested_json"""
+    for chunk in iter_nested_json(matrix, transformer, chunk_size, dumps):
+        fileobj.write(chunk)
@@ -0,0 +1,167 @@
+"""whole tree computations spread over a pool of processes. the functions
+are sent to the workers with pickle, so they have to be picklable - module
+level functions, not lambdas.
+
+parallel_map splits every level into contiguous chunks of node data.
+parallel_reduce_up splits the tree into subtrees: it picks the first level
+with enough nodes, cuts it into contiguous runs and gives each worker the
+subtrees rooted at one run. the descendants of a run are a contiguous range
+on every level, so a worker needs the data of those ranges and the parent
+indices of the levels, which are put in shared memory once for all the
+workers instead of being pickled for each."""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from itree.structs import TOMBSTONE
+from itree.levelwise import start_values, fold_children, reduce_up
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+
+def _map_chunk(fn, data):
+    return [None if datum is TOMBSTONE else fn(datum) for datum in data]
+
+
+def parallel_map(matrix, fn, workers=None, chunk_size=None):
+    """apply :fn: to the data of every node of :matrix: in a pool of
+    processes
+
+    :matrix: ITreeMatrix - the tree
+    :fn: callable - picklable, called with the data of each node
+    :workers: int - how many processes, defaults to the number of cpus
+    :chunk_size: int - how many nodes to send to a worker at a time,
+    defaults to splitting the tree in about 4 chunks per worker
+
+    :returns: list - the results for each level, indexed like the tree.
+    deleted nodes get None
+    """
+    workers = workers or os.cpu_count()
+    if chunk_size is None:
+        chunk_size = max(len(matrix) // (4 * workers), 1)
+    chunks = []
+    for row, level in enumerate(matrix.levels):
+        for first in range(0, len(level), chunk_size):
+            chunks.append((row, level.columns(first, first + chunk_size)[3]))
+    results = [[] for _ in matrix.levels]
+    with ProcessPoolExecutor(workers) as executor:
+        futures = [executor.submit(_map_chunk, fn, data)
+                   for _, data in chunks]
+        for (row, _), future in zip(chunks, futures):
+            results[row].extend(future.result())
+    return results
+
+
+def _share_parents(matrix, start):
+    """put the parent indices of the levels from :start: on one after the
+    other in shared memory (or a plain bytes copy without shared memory)
+
+    :returns: tuple - (shared memory block or bytes, offset of each level)
+    """
+    offsets = [0]
+    for level in matrix.levels[start:]:
+        offsets.append(offsets[-1] + len(level))
+    size = max(offsets[-1], 1) * 8
+    if shared_memory is None:
+        block = bytearray(size)
+    else:
+        block = shared_memory.SharedMemory(create=True, size=size)
+    buffer = block if shared_memory is None else block.buf
+    view = memoryview(buffer).cast('q')
+    for level, offset in zip(matrix.levels[start:], offsets):
+        view[offset:offset + len(level)] = level.columns()[0]
+    view.release()
+    return block, offsets
+
+
+def _reduce_subtrees(block, offsets, ranges, data, fn, init):
+    """reduce_up over the subtrees whose nodes are :ranges: of each level,
+    :ranges: being (first, stop) pairs from the top level of the subtrees
+    down, with their :data:. runs in a worker"""
+    shared = None
+    if isinstance(block, str):
+        shared = shared_memory.SharedMemory(name=block)
+        block = shared.buf
+    parents = memoryview(block).cast('q')
+    try:
+        values = []
+        below = None
+        for depth in range(len(ranges) - 1, -1, -1):
+            first, stop = ranges[depth]
+            level_values = start_values(data[depth], init)
+            if below is not None:
+                child_first, child_stop = ranges[depth + 1]
+                offset = offsets[depth + 1]
+                fold_children(level_values,
+                              parents[offset + child_first:
+                                      offset + child_stop],
+                              below, data[depth + 1], fn, first)
+            values.append(level_values)
+            below = level_values
+    finally:
+        parents.release()
+        if shared is not None:
+            shared.close()
+    values.reverse()
+    return values
+
+
+def parallel_reduce_up(matrix, fn, init=None, workers=None, chunks=None):
+    """reduce_up (see itree.levelwise) with the subtrees below the first
+    level of at least :chunks: nodes reduced in a pool of processes. the
+    levels above it are reduced in this process.
+
+    :matrix: ITreeMatrix - the tree
+    :fn: callable - picklable, fn(value, child value), see reduce_up
+    :init: callable or value - picklable, see reduce_up
+    :workers: int - how many processes, defaults to the number of cpus
+    :chunks: int - how many runs of subtrees to split the tree in, defaults
+    to 4 per worker
+
+    :returns: list - the values of each level, a list per level
+    """
+    workers = workers or os.cpu_count()
+    chunks = chunks or 4 * workers
+    levels = matrix.levels
+    split = next((row for row, level in enumerate(levels)
+                  if len(level) >= chunks), None)
+    if split is None:
+        return reduce_up(matrix, fn, init)
+    width = len(levels[split])
+    bounds = [width * index // chunks for index in range(chunks + 1)]
+    block, offsets = _share_parents(matrix, split)
+    name = block if shared_memory is None else block.name
+    try:
+        with ProcessPoolExecutor(workers) as executor:
+            futures = []
+            for first, stop in zip(bounds, bounds[1:]):
+                ranges, data = [], []
+                row = split
+                while first < stop:
+                    ranges.append((first, stop))
+                    data.append(levels[row].columns(first, stop)[3])
+                    first, stop = matrix.child_range(row, first, stop)
+                    row += 1
+                futures.append(executor.submit(_reduce_subtrees, name,
+                                               offsets, ranges, data, fn,
+                                               init))
+            values = [[] for _ in levels[split:]]
+            for future in futures:
+                for depth, level_values in enumerate(future.result()):
+                    values[depth].extend(level_values)
+    finally:
+        if shared_memory is not None:
+            block.close()
+            block.unlink()
+    # the few nodes above the split level
+    below = values[0]
+    for row in range(split - 1, -1, -1):
+        data = levels[row].columns()[3]
+        level_values = start_values(data, init)
+        child_parents, _, _, child_data = levels[row + 1].columns()
+        fold_children(level_values, child_parents, below, child_data, fn)
+        values.insert(0, level_values)
+        below = level_values
+    return values
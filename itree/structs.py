@@ -1,19 +1,188 @@
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import islice
+
+# marks a node without children when child indices are kept in arrays
+NO_CHILD = -1
+# marks a node that wasn't given an id, see ITreeMatrix.node_id
+NO_ID = -1
+
+
 class ITreeError(Exception):
     pass
 
 
-class ITreeNode(object):
+class Tombstone(object):
 
-    """itree node representation. we wrap the data in the node and keep indices
-    to the parent, the first child and the last child. we dont need two
-    indices, since we can figure out the depth of the parent and children nodes
-    by searching one level higher and one level lower than the current node
-    accordingly"""
+    """the data of a node deleted from a matrix in tombstones mode. the node
+    stays in its row (so no indices shift) until the row is compacted"""
 
-    def __init__(self, data, parent_index=-1):
-        self.data = data
-        self.parent_index = parent_index
-        self._first_child_index = self._last_child_index = None
+    def __repr__(self):
+        return 'TOMBSTONE'
+
+    def __reduce__(self):
+        # unpickle as the one TOMBSTONE, deleted nodes are found by identity
+        return 'TOMBSTONE'
+
+
+TOMBSTONE = Tombstone()
+
+
+def child_ranges(parent_indices, size):
+    """compute the first and last child columns of a level of :size: nodes
+    from the (ascending) parent indices of the level below it
+
+    :returns: tuple - two array('q') of child indices, NO_CHILD for leaves
+    """
+    firsts = array('q', [NO_CHILD]) * size
+    lasts = array('q', [NO_CHILD]) * size
+    for sibling_index, parent_index in enumerate(parent_indices):
+        if firsts[parent_index] == NO_CHILD:
+            firsts[parent_index] = sibling_index
+        lasts[parent_index] = sibling_index
+    return firsts, lasts
+
+
+# indices that keep the positions of some nodes follow the shifts of a level
+# by logging them and replaying them on lookup (see shifted). a level that
+# shifted more than this many times since it was indexed is rebuilt instead,
+# so a replay is never longer. rows settle their PendingShifts at the same
+# size
+MAX_SHIFTS = 256
+
+
+def shifted(column, shifts, seen):
+    """get where the node that was at :column: is now. a shift (at, delta)
+    moved the nodes at column at and to its right by delta places
+
+    :shifts: list - of (at, delta), the shifts of the level, oldest first
+    :seen: int - how many of shifts had happened when the node was at
+    column
+    """
+    for index in range(seen, len(shifts)):
+        at, delta = shifts[index]
+        if column >= at:
+            column += delta
+    return column
+
+
+class PendingShifts(object):
+
+    """shifts of the child ranges of the nodes of a row that weren't applied
+    to the nodes yet. inserting a node in the middle of a level moves the
+    children of every node to the right of its parent, so instead of
+    rewriting their child ranges each time a row adds the shift here and
+    applies them all in one pass once there are MAX_SHIFTS of them (see
+    ITreeRow.settle). the child range of a node is its stored one plus
+    offset(column).
+
+    the shifts add up to one offset per run of columns. starts are the
+    ascending columns where a run starts and offsets the offset of the nodes
+    from there to the next start"""
+
+    def __init__(self):
+        self.starts = []
+        self.offsets = []
+
+    def __len__(self):
+        return len(self.starts)
+
+    def offset(self, column):
+        """how much the child range of the node at :column: moved"""
+        index = bisect_right(self.starts, column)
+        return self.offsets[index - 1] if index else 0
+
+    def shift(self, start, offset):
+        """the child ranges of the nodes from :start: on moved by
+        :offset:"""
+        starts, offsets = self.starts, self.offsets
+        index = bisect_left(starts, start)
+        if index == len(starts) or starts[index] != start:
+            starts.insert(index, start)
+            offsets.insert(index, offsets[index - 1] if index else 0)
+        offsets[index:] = [each + offset for each in offsets[index:]]
+
+    def inserted(self, column, count):
+        """:count: nodes were inserted in the row at :column:. they have no
+        children, so they can take the offset of the run they land in"""
+        starts = self.starts
+        index = bisect_right(starts, column)
+        starts[index:] = [start + count for start in starts[index:]]
+
+    def removed(self, first, stop):
+        """the nodes first..stop - 1 of the row were removed. the runs that
+        started among them start at first now, the last of them has the
+        offset of the nodes that were right of the removed ones"""
+        count = stop - first
+        starts, offsets = [], []
+        for start, offset in zip(self.starts, self.offsets):
+            if start > first:
+                start = max(first, start - count)
+            if starts and starts[-1] == start:
+                offsets[-1] = offset
+            else:
+                starts.append(start)
+                offsets.append(offset)
+        self.starts, self.offsets = starts, offsets
+
+    def runs(self, size):
+        """the (first, stop, offset) runs of a row of :size: nodes whose
+        child ranges moved"""
+        bounds = self.starts[1:] + [size]
+        for first, stop, offset in zip(self.starts, bounds, self.offsets):
+            if offset and first < size:
+                yield first, min(stop, size), offset
+
+
+def sizeof(value, seen, deep=False):
+    """how many bytes :value: takes, 0 if it is in :seen: (a set of ids)
+    already so shared objects are only counted once. adds it to seen
+
+    :deep: bool - if set, also count what lists, tuples, sets and dicts
+    contain, all the way down
+    """
+    size = 0
+    stack = [value]
+    while stack:
+        value = stack.pop()
+        if id(value) in seen or value is TOMBSTONE:
+            continue
+        seen.add(id(value))
+        size += sys.getsizeof(value)
+        if deep:
+            if isinstance(value, dict):
+                stack.extend(value.keys())
+                stack.extend(value.values())
+            elif isinstance(value, (list, tuple, set, frozenset)):
+                stack.extend(value)
+    return size
+
+
+def node_size():
+    """the bytes an ITreeNode takes, without its data"""
+    node = ITreeNode(None)
+    return sys.getsizeof(node) + sys.getsizeof(node.__dict__)
+
+
+def interned(cache, value):
+    """get the value equal to :value: first seen by :cache:, so equal data
+    is kept once. values of different types are never merged (eg: 1 and
+    1.0) and unhashable values are kept as they are"""
+    try:
+        return cache.setdefault((type(value), value), value)
+    except TypeError:
+        return value
+
+
+class BaseITreeNode(object):
+
+    """what the nodes of every row have in common: the child range logic on
+    top of the data, parent_index, _first_child_index and _last_child_index
+    attributes subclasses provide. it has no instance dict, so subclasses
+    that declare __slots__ (eg: the columnar views) don't get one either"""
+
+    __slots__ = ()
 
     def __repr__(self):
         return str(self.data)
@@ -30,9 +199,14 @@ class ITreeNode(object):
 
     def removed_sibling(self):
         """call me if you removed left sibling"""
+        self.shift_children(-1)
+
+    def shift_children(self, offset):
+        """call me if :offset: nodes were inserted (or removed if negative)
+        to the left of the children of this node"""
         if self._first_child_index is not None:
-            self._first_child_index -= 1
-            self._last_child_index -= 1
+            self._first_child_index += offset
+            self._last_child_index += offset
 
     def append_child(self, sibling_index):
         if self._first_child_index is None:
@@ -41,6 +215,15 @@ class ITreeNode(object):
             assert(sibling_index == self._last_child_index + 1)
             self._last_child_index += 1
 
+    def append_children(self, sibling_index, count):
+        """like append_child for :count: children, the first of them at
+        :sibling_index:"""
+        if self._first_child_index is None:
+            self._first_child_index = sibling_index
+        else:
+            assert(sibling_index == self._last_child_index + 1)
+        self._last_child_index = sibling_index + count - 1
+
     def remove_child(self, sibling_index):
         """remove child with value sibling_index, since we don't want to have
         gaps in our indices, after a child removal we need to decrement the
@@ -51,7 +234,7 @@ class ITreeNode(object):
 
         """
         if sibling_index in self.children_indices:
-            if sibling_index == self._first_child_index:
+            if self._first_child_index == self._last_child_index:
                 self._first_child_index = self._last_child_index = None
             else:
                 self._last_child_index -= 1
@@ -59,11 +242,37 @@ class ITreeNode(object):
             raise ITreeError('child with index: %s not found' % sibling_index)
 
 
+class ITreeNode(BaseITreeNode):
+
+    """itree node representation. we wrap the data in the node and keep indices
+    to the parent, the first child and the last child. we dont need two
+    indices, since we can figure out the depth of the parent and children nodes
+    by searching one level higher and one level lower than the current node
+    accordingly"""
+
+    # the stable id of the node, nodes are only given one when asked for it
+    # (see ITreeMatrix.node_id) so nodes without one don't pay for it
+    node_id = None
+
+    def __init__(self, data, parent_index=-1):
+        self.data = data
+        self.parent_index = parent_index
+        self._first_child_index = self._last_child_index = None
+
+
 class ITreeRow(list):
 
     """A row of the ITreeMatrix which represents a level of the tree,
     all nodes at same height or depth are on the same level."""
 
+    # the matrix the row belongs to, told when node data is set
+    matrix = None
+    # set once the row is shared by copies of the matrix, see
+    # ITreeMatrix.copy. it is then copied before it is changed
+    shared = False
+    # PendingShifts of the child ranges, None if the nodes are up to date
+    pending = None
+
     def __init__(self, level):
         """TODO: to be defined1.
 
@@ -72,30 +281,237 @@ class ITreeRow(list):
 
         """
         self.level = level
+        # how many nodes of this row are tombstones
+        self.dead = 0
 
     def __setitem__(self, index, item):
         """ allow setting node data with setter,
         this bypasses setting the node - we can't allow that anyways
         since it could break the tree structure"""
-        self[index].data = item
+        node = self[index]
+        if node.data is TOMBSTONE:
+            raise ITreeError('cannot set the data of a deleted node')
+        if self.shared:
+            matrix = self.matrix
+            if (matrix is None or self.level >= len(matrix.levels) or
+                    matrix.levels[self.level] is not self):
+                raise ITreeError('this row is shared with a copy of the '
+                                 'tree, set the data with '
+                                 'ITreeMatrix.set_data')
+            # copy on write, the matrix puts a copy of this row in its place
+            matrix.set_data(self.level, index, item)
+            return
+        previous, node.data = node.data, item
+        if self.matrix is not None:
+            if index < 0:
+                index += len(self)
+            self.matrix.notify('data_changed', self.level, index, previous)
+
+    @classmethod
+    def from_columns(cls, level, parent_indices, first_child_indices,
+                     last_child_indices, data, ids=None):
+        """create a row from its columns, see columns
+
+        :ids: sequence - optional, the node ids, see ids
+        """
+        row = cls(level)
+        nodes = []
+        for datum, parent_index, first, last in zip(data, parent_indices,
+                                                    first_child_indices,
+                                                    last_child_indices):
+            node = ITreeNode(datum, parent_index)
+            if first != NO_CHILD:
+                node._first_child_index, node._last_child_index = first, last
+            if datum is TOMBSTONE:
+                row.dead += 1
+            nodes.append(node)
+        if ids is not None:
+            for node, node_id in zip(nodes, ids):
+                if node_id != NO_ID:
+                    node.node_id = node_id
+        # extending the empty row by all the nodes at once allocates it at
+        # its size, appending them one at a time over allocates
+        row.extend(nodes)
+        return row
+
+    def insert(self, index, node):
+        if self.pending is not None:
+            self.pending.inserted(index, 1)
+        list.insert(self, index, node)
 
-    def append_child(self, data, parent_column):
+    def pop(self, index=-1):
+        if self.pending is not None:
+            if index < 0:
+                index += len(self)
+            self.pending.removed(index, index + 1)
+        return list.pop(self, index)
+
+    def __delitem__(self, index):
+        if self.pending is not None:
+            if isinstance(index, slice):
+                first, stop, _ = index.indices(len(self))
+            else:
+                first, stop = index, index + 1
+            self.pending.removed(first, max(first, stop))
+        list.__delitem__(self, index)
+
+    def memory_usage(self, deep=False, seen=None):
+        """how many bytes this row takes
+
+        :deep: bool - see sizeof
+        :seen: set - ids of the objects counted already, see sizeof
+        :returns: tuple - bytes of structure (the list, the nodes and their
+        indices) and bytes of data
+        """
+        seen = set() if seen is None else seen
+        structure = sys.getsizeof(self) + len(self) * node_size()
+        data = 0
+        for node in self:
+            for index in (node.parent_index, node._first_child_index,
+                          node._last_child_index):
+                # small ints are cached by python, they cost nothing
+                if index is not None and not -5 <= index <= 256:
+                    structure += sizeof(index, seen)
+            data += sizeof(node.data, seen, deep)
+        return structure, data
+
+    def columns(self, start=0, stop=None):
+        """get the nodes of this row (or the slice start:stop of it) as
+        columns
+
+        :returns: tuple - array('q') of parent indices, array('q') of first
+        child indices, array('q') of last child indices (NO_CHILD if a node
+        has no children) and a list of the node data
+        """
+        self.settle()
+        nodes = self[start:stop]
+        firsts, lasts = array('q'), array('q')
+        for node in nodes:
+            if node._first_child_index is None:
+                firsts.append(NO_CHILD)
+                lasts.append(NO_CHILD)
+            else:
+                firsts.append(node._first_child_index)
+                lasts.append(node._last_child_index)
+        return (array('q', [node.parent_index for node in nodes]),
+                firsts, lasts, [node.data for node in nodes])
+
+    def ids(self, start=0, stop=None):
+        """get the ids of the nodes of this row (or the slice start:stop of
+        it), see ITreeMatrix.node_id
+
+        :returns: array('q') - the ids, NO_ID for nodes without one
+        """
+        return array('q', [NO_ID if node.node_id is None else node.node_id
+                           for node in self[start:stop]])
+
+    def set_id(self, column, node_id):
+        self[column].node_id = node_id
+
+    def bisect_parent(self, parent_index):
+        """find how many nodes of this row have a parent index less than or
+        equal to :parent_index:. parents are siblings on the level above, so
+        the parent indices of a row are an ascending sequence and we can
+        binary search them.
+
+        :parent_index: int - sibling index of a node on the level above
+        :returns: int - the index a new child of that parent would go to if
+        the parent had no children yet
+
+        """
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if parent_index < self[middle].parent_index:
+                high = middle
+            else:
+                low = middle + 1
+        return low
+
+    def append_child(self, data, parent_column, sibling_index=None):
         """ append data as node next to its siblings, namely next to the nodes
         which have the same parent with it. If it is the first sibling, it must
-        be inserted according to the parents column id ordering"""
-        # find the last child with a parent that has index target_index
-        # or find a child with a parent index less than our target index
-        # the rationale is that parents are siblings, and therefore
-        # their ids are also ordered as an ascending sequence
+        be inserted according to the parents column id ordering
+
+        :sibling_index: int - optional, where the child goes if the caller
+        already knows (eg: right after the last child of the parent). if not
+        set we binary search the parent indices of the row for it
+        """
         child = ITreeNode(data, parent_index=parent_column)
-        sibling_index = 0
-        for index, each in enumerate(reversed(self)):
-            if each.parent_index <= parent_column:
-                sibling_index = len(self) - index
-                break
+        if sibling_index is None:
+            sibling_index = self.bisect_parent(parent_column)
         self.insert(sibling_index, child)
         return (self.level, sibling_index)
 
+    def append_children(self, data, parent_column, sibling_index=None):
+        """append_child for many children of the same parent, spliced in
+        with one slice assignment
+
+        :data: list - the data of the children
+        :returns: tuple - (level, sibling index of the first child)
+        """
+        children = [ITreeNode(datum, parent_index=parent_column)
+                    for datum in data]
+        if sibling_index is None:
+            sibling_index = self.bisect_parent(parent_column)
+        if self.pending is not None:
+            self.pending.inserted(sibling_index, len(children))
+        # our __setitem__ sets node data, we want the list one
+        list.__setitem__(self, slice(sibling_index, sibling_index), children)
+        return (self.level, sibling_index)
+
+    def _offset(self, column):
+        return 0 if self.pending is None else self.pending.offset(column)
+
+    def child_range(self, column):
+        """get the (first, last) child indices of the node at :column:, None
+        if it has no children. the child ranges stored in the nodes lag
+        behind while the row has pending shifts, read them through here (or
+        settle the row first)"""
+        node = self[column]
+        if node._first_child_index is None:
+            return None
+        offset = self._offset(column)
+        return (node._first_child_index + offset,
+                node._last_child_index + offset)
+
+    def add_children(self, column, sibling_index, count=1):
+        """make the :count: nodes from :sibling_index: on of the level below
+        the last children of the node at :column:"""
+        self[column].append_children(sibling_index - self._offset(column),
+                                     count)
+
+    def shift_children(self, start, offset):
+        """shift the child ranges of the nodes from :start: onwards by
+        :offset:, eg: because a node was inserted on the level below. the
+        shift is only added to the pending shifts of the row"""
+        if start >= len(self) or not offset:
+            return
+        if self.pending is None:
+            self.pending = PendingShifts()
+        self.pending.shift(start, offset)
+        if len(self.pending) > MAX_SHIFTS:
+            self.settle()
+
+    def settle(self):
+        """apply the pending shifts to the child ranges of the nodes, in one
+        pass over the nodes that moved"""
+        pending, self.pending = self.pending, None
+        if pending is None:
+            return
+        for first, stop, offset in pending.runs(len(self)):
+            for node in islice(self, first, stop):
+                if node._first_child_index is not None:
+                    node._first_child_index += offset
+                    node._last_child_index += offset
+
+    def shift_parents(self, parent_index, offset):
+        """shift the parent index of the nodes whose parent index is at least
+        :parent_index: by :offset:, eg: because a node was inserted on the
+        level above"""
+        for node in islice(self, self.bisect_parent(parent_index - 1), None):
+            node.parent_index += offset
+
     def remove_child(self, parent_index, child_index):
         """TODO: Docstring for remove_child.
 
@@ -103,11 +519,11 @@ class ITreeRow(list):
         :returns: TODO
 
         """
-        self[parent_index].remove_child(child_index)
+        self[parent_index].remove_child(child_index -
+                                        self._offset(parent_index))
         # since the sibling_index must be a consecutive number with no gaps
         # we need to lower the indices by one for all the succeeding nodes
-        for parent_node in self[parent_index + 1:]:
-            parent_node.removed_sibling()
+        self.shift_children(parent_index + 1, -1)
 
 
 class ITreeMatrix(object):
@@ -117,27 +533,187 @@ class ITreeMatrix(object):
     with the same number - meaning nodes which have the same number of siblings
     to their left (political comment removed)"""
 
-    def __init__(self, levels=1):
+    # the class used for each level of the matrix, storage engines that keep
+    # their nodes differently (see itree.columnar) override this
+    row_class = ITreeRow
+
+    def __init__(self, levels=1, tombstones=False, compact_threshold=0.5):
+        """
+
+        :levels: int - how many empty levels to start with
+        :tombstones: bool - if set, remove_node doesn't take nodes out of
+        their row, it marks them as TOMBSTONEs. no indices shift, so deleting
+        is O(1). tombstones are skipped by iteration, indexing and len, and
+        are removed in batches by compact.
+        :compact_threshold: float - in tombstones mode, compact a level (and
+        the levels below it) once more than this fraction of it is dead. set
+        to None to only compact when compact is called.
+
+        """
         if levels < 0:
             raise ValueError('rows must be positive')
-        self.levels = [ITreeRow(i) for i in range(levels)]
+        self.tombstones = tombstones
+        self.compact_threshold = compact_threshold
+        # called with every node proxy made, eg: by itree.instrument
+        self.proxy_hook = None
+        # bumped on every change, so derived structures can tell they are
+        # out of date
+        self.version = 0
+        # objects told about every change, see notify
+        self.observers = []
+        # how many node ids were given out, see node_id
+        self.next_id = 0
+        # set for read only snapshots, see copy
+        self.frozen = False
+        self.levels = []
+        for _ in range(levels):
+            self.add_row()
 
     def __getitem__(self, slices):
-        return self.levels[slices]
+        """get level :slices: (or a list of levels for a slice), see _own"""
+        if isinstance(slices, slice):
+            return [self._own(row)
+                    for row in range(*slices.indices(len(self.levels)))]
+        return self._own(slices + len(self.levels) if slices < 0 else slices)
+
+    def notify(self, event, *args):
+        """tell the observers about a change. the events are methods of the
+        observers, called with:
+
+            node_inserted(row, column) - a leaf was added at (row, column)
+            node_removed(row, column, removed) - the leaf at (row, column)
+            was removed. removed is a detached ITreeNode with its data and
+            parent index. in tombstones mode the node is still in its row
+            data_changed(row, column, previous) - the data of (row, column)
+            was set, previous is what it used to be
+            levels_replaced() - anything else, eg: compaction. observers
+            should forget what they know about the positions of the nodes
+
+        """
+        self.version += 1
+        for observer in self.observers:
+            getattr(observer, event)(*args)
+
+    def add_observer(self, observer):
+        self.observers.append(observer)
+
+    def remove_observer(self, observer):
+        self.observers.remove(observer)
+
+    def _writable(self, row):
+        """get level :row: in order to change it. if the row is shared with
+        a copy of this matrix it is copied first and the copy takes its
+        place, so the other matrices don't see the change"""
+        if self.frozen:
+            raise ITreeError('this itree is a read only snapshot')
+        level = self.levels[row]
+        if level.shared or level.matrix is not self:
+            level = self.row_class.from_columns(row, *level.columns(),
+                                                ids=self._ids(level))
+            level.matrix = self
+            self.levels[row] = level
+        return level
+
+    def _own(self, row):
+        """get level :row: to hand it out. data can be set through the rows
+        handed out, and a row this matrix still shares with the matrix it
+        was copied from belongs to that one - setting data through it would
+        change the other matrix. so the row is copied for this matrix first,
+        a snapshot keeps its copy shared so setting data through it raises"""
+        level = self.levels[row]
+        if level.matrix is not None and level.matrix is not self:
+            level = self.row_class.from_columns(row, *level.columns(),
+                                                ids=self._ids(level))
+            level.matrix = self
+            level.shared = self.frozen
+            self.levels[row] = level
+        return level
+
+    def copy(self, frozen=False):
+        """copy this matrix without copying any of its rows. the rows are
+        shared until a change touches them, then the matrix making the
+        change copies the row for itself (copy on write), so a copy costs
+        O(height) and each changed level O(width). the data objects are
+        shared, not copied. observers (eg: aggregates) aren't carried over.
+
+        setting data through a shared row (eg: matrix[row][column] = data)
+        goes through set_data, so it copies the row as well. a row this
+        matrix gave up (it copied it and a copy still has the old one)
+        can't be assigned to, that raises ITreeError.
+
+        :frozen: bool - if set, the copy is a read only snapshot
+        :returns: ITreeMatrix - the copy
+        """
+        for level in self.levels:
+            # shared rows are read by every copy, pending shifts are
+            # applied first so reading them never changes them
+            level.settle()
+            level.shared = True
+        matrix = self.empty_like()
+        matrix.levels = list(self.levels)
+        matrix.frozen = frozen
+        matrix.next_id = self.next_id
+        return matrix
+
+    def _ids(self, level):
+        """the ids of :level: if any node was given one, else None"""
+        return level.ids() if self.next_id else None
+
+    def node_id(self, row, column):
+        """get the id of the node at (row, column), giving it one the first
+        time. the id stays with the node as it moves along its level (nodes
+        never change level) until it is deleted, so it can be used to find
+        the node again, see itree.handles. ids aren't carried over to trees
+        made from this one other than by copy.
+
+        :returns: int - the id, unique in this matrix
+        :raises: ITreeError - if the node has no id and this matrix is read
+        only (a snapshot or a memory mapped file)
+        """
+        node = self.get_node(row, column)
+        if node.node_id is None:
+            if self.frozen:
+                raise ITreeError('this itree is read only, its nodes keep '
+                                 'the handles they were given before but '
+                                 'get no new ones. take handles on the tree '
+                                 'it was made from, or on a clone of it')
+            self._writable(row).set_id(column, self.next_id)
+            self.next_id += 1
+            return self.next_id - 1
+        return node.node_id
+
+    def set_data(self, row, column, data):
+        """set the data of the node at (row, column)"""
+        self._writable(row)[column] = data
+
+    def levels_replaced(self):
+        """call after building or replacing rows wholesale instead of
+        through the matrix methods"""
+        for level in self.levels:
+            level.matrix = self
+        self.notify('levels_replaced')
 
     def __setitem__(self, item, slices):
         raise NotImplemented('Setting levels not allowed')
 
     def __iter__(self):
+        skip_dead = self.dead > 0
         for level_index, level in enumerate(self.levels):
             for sibling_index, node in enumerate(level):
+                if skip_dead and node.data is TOMBSTONE:
+                    continue
                 yield (level_index, sibling_index)
 
     def __str__(self):
         return '\n'.join(','.join(map(str, nodes)) for nodes in self.levels)
 
     def __len__(self):
-        return sum(len(level) for level in self.levels)
+        return sum(len(level) - level.dead for level in self.levels)
+
+    @property
+    def dead(self):
+        """number of tombstones in the matrix"""
+        return sum(level.dead for level in self.levels)
 
     @property
     def height(self):
@@ -150,14 +726,56 @@ class ITreeMatrix(object):
     @property
     def root(self):
         try:
-            return self.levels[0][0]
+            return self.get_node(0, 0)
         except IndexError:
             raise ITreeError('This ITree has no root')
 
+    def get_node(self, row, column):
+        """get the node at (row, column)
+
+        :returns: ITreeNode - the node
+        :raises: IndexError - if there is no node there or it was deleted
+        """
+        node = self.levels[row][column]
+        if node.data is TOMBSTONE:
+            raise IndexError('node (%s, %s) was deleted' % (row, column))
+        return node
+
+    def live_children(self, row, column):
+        """get the sibling indices of the children of the node at (row,
+        column) which weren't deleted
+
+        :returns: sequence - of sibling indices on row + 1
+        """
+        children = self.levels[row].child_range(column)
+        if children is None:
+            return range(0)
+        indices = range(children[0], children[1] + 1)
+        # only the tombstones of the child level matter, summing the dead
+        # of every level would make this O(height)
+        level = self.levels[row + 1]
+        if not level.dead:
+            return indices
+        return [index for index in indices
+                if level[index].data is not TOMBSTONE]
+
+    def settle(self, start=0):
+        """apply the pending shifts of the child ranges of the rows from
+        :start: down (see PendingShifts). readers that go through the child
+        ranges stored in the nodes of many rows, eg: depth first traversals,
+        settle them first"""
+        for level in self.levels[start:]:
+            if level.pending is not None:
+                level.settle()
+
     def set_root(self, data):
+        # a dead root means the whole tree was deleted, clear it out first
+        if self.levels and len(self.levels[0]) and self.levels[0].dead:
+            if self.levels[0][0].data is TOMBSTONE:
+                self.compact()
         # suppose root node exists and we change the value
         try:
-            self.levels[0][0].data = data
+            self.set_data(0, 0, data)
             return (0, 0)
         except IndexError:
             # node doesn't exist so we create it
@@ -169,39 +787,498 @@ class ITreeMatrix(object):
     def append_child(self, data, parent_row, parent_column):
         """append child to row that contains its siblings and cousins"""
         child_row = parent_row + 1
+        # if the parent already has children the new child goes right after
+        # the last of them, otherwise the row finds the spot by bisecting
+        parent_level, sibling_index = None, None
+        if parent_row >= 0:
+            parent_level = self._writable(parent_row)
+            if parent_level[parent_column].data is TOMBSTONE:
+                raise ITreeError('cannot append a child to a deleted node')
+            children = parent_level.child_range(parent_column)
+            if children is not None:
+                sibling_index = children[1] + 1
         try:
-            child_level = self.levels[child_row]
+            child_level = self._writable(child_row)
         # the level doesn't exist so we need to create it
         # this is an only child (no cousins either)
         except IndexError:
-            self.levels.append(ITreeRow(child_row))
-            child_level = self.levels[child_row]
+            child_level = self.add_row()
         level_index, sibling_index = child_level.append_child(
-            data, parent_column)
+            data, parent_column, sibling_index)
+        # unless the child went to the end of its row, the nodes to its right
+        # moved one place, so the parents to the right of our parent and the
+        # children of the nodes that moved need their indices fixed
+        if parent_level is not None and sibling_index != len(child_level) - 1:
+            parent_level.shift_children(parent_column + 1, 1)
+            if child_row + 1 < len(self.levels):
+                self._writable(child_row + 1).shift_parents(sibling_index, 1)
         # remember to add child to the parents children list
         # if the node has parents - negative indices correspond to no parents
-        if parent_row >= 0:
-            parent = self.levels[parent_row][parent_column]
-            parent.append_child(sibling_index)
+        if parent_level is not None:
+            parent_level.add_children(parent_column, sibling_index)
+        self.notify('node_inserted', level_index, sibling_index)
         # return the indices of the added node
         return (level_index, sibling_index)
 
+    def append_children(self, data, parent_row, parent_column):
+        """append many children to the node at (parent_row, parent_column)
+        at once. the children are spliced into their row together and the
+        indices of the nodes around them are shifted once, so appending k
+        children costs about as much as appending one.
+
+        :data: iterable - the data of the children, in order
+        :returns: tuple - (row, first, stop) the children are the nodes
+        first..stop - 1 of row
+        """
+        data = list(data)
+        child_row = parent_row + 1
+        parent_level = self._writable(parent_row)
+        if parent_level[parent_column].data is TOMBSTONE:
+            raise ITreeError('cannot append a child to a deleted node')
+        if not data:
+            return (child_row, 0, 0)
+        sibling_index = None
+        children = parent_level.child_range(parent_column)
+        if children is not None:
+            sibling_index = children[1] + 1
+        try:
+            child_level = self._writable(child_row)
+        except IndexError:
+            child_level = self.add_row()
+        _, sibling_index = child_level.append_children(data, parent_column,
+                                                       sibling_index)
+        count = len(data)
+        # see append_child, the nodes to the right moved count places
+        if sibling_index + count != len(child_level):
+            parent_level.shift_children(parent_column + 1, count)
+            if child_row + 1 < len(self.levels):
+                self._writable(child_row + 1).shift_parents(sibling_index,
+                                                            count)
+        parent_level.add_children(parent_column, sibling_index, count)
+        for column in range(sibling_index, sibling_index + count):
+            self.notify('node_inserted', child_row, column)
+        return (child_row, sibling_index, sibling_index + count)
+
+    def bulk_append(self, pairs):
+        """append many children to many nodes in one pass over each level
+        that gets children. the new children of each level are sorted by
+        parent and merged with the nodes already on it, each one after the
+        children its parent already had. only the levels that get children
+        are rebuilt, the levels right above and below them get their child
+        ranges and parent indices fixed and the others are left alone. the
+        observers are told about each new node, from the top level down and
+        left to right on each level.
+
+        :pairs: iterable - of ((row, column), data), the parents are given
+        by where they are before the append. a node added by the same call
+        can't be a parent
+        :returns: list - the (row, column) of each new node, in the order
+        of pairs
+        """
+        if self.frozen:
+            raise ITreeError('this itree is a read only snapshot')
+        # the new nodes of each level, as (parent column, order in pairs,
+        # data)
+        added = {}
+        count = 0
+        for count, ((row, column), data) in enumerate(pairs, 1):
+            if row < 0 or column < 0:
+                raise IndexError('no node at (%s, %s)' % (row, column))
+            if self.levels[row][column].data is TOMBSTONE:
+                raise ITreeError('cannot append a child to a deleted node')
+            added.setdefault(row + 1, []).append((column, count - 1, data))
+        positions = [None] * count
+        if not added:
+            return positions
+        height = len(self.levels)
+        # the [parents, firsts, lasts, data, ids] of each level to rebuild,
+        # firsts and lasts are None until the child ranges are worked out
+        rebuilt = {}
+        # remaps[row] - the new sibling index of each old node of row
+        remaps = {}
+        # inserted[row] - the sibling indices of the new nodes of row
+        inserted = {}
+        for row in sorted(added):
+            if row < height:
+                parents, _, _, data = self.levels[row].columns()
+                ids = self._ids(self.levels[row])
+            else:
+                parents, data, ids = array('q'), [], None
+            new = sorted(added[row])
+            above = remaps.get(row - 1)
+            if above is not None:
+                parents = [above[parent] for parent in parents]
+                new = sorted((above[parent], order, datum)
+                             for parent, order, datum in new)
+            merged_parents, merged_data = array('q'), []
+            merged_ids = None if ids is None else array('q')
+            remap = array('q', [NO_CHILD]) * len(data)
+            columns = inserted[row] = []
+            old = 0
+            for parent, order, datum in new:
+                # the old nodes up to the last child of parent go first
+                while old < len(data) and parents[old] <= parent:
+                    remap[old] = len(merged_data)
+                    merged_parents.append(parents[old])
+                    merged_data.append(data[old])
+                    if ids is not None:
+                        merged_ids.append(ids[old])
+                    old += 1
+                positions[order] = (row, len(merged_data))
+                columns.append(len(merged_data))
+                merged_parents.append(parent)
+                merged_data.append(datum)
+                if ids is not None:
+                    merged_ids.append(NO_ID)
+            for old in range(old, len(data)):
+                remap[old] = len(merged_data)
+                merged_parents.append(parents[old])
+                merged_data.append(data[old])
+                if ids is not None:
+                    merged_ids.append(ids[old])
+            remaps[row] = remap
+            rebuilt[row] = [merged_parents, None, None, merged_data,
+                            merged_ids]
+        for row in list(rebuilt):
+            # the nodes of the level below keep their places and child
+            # ranges but their parents moved
+            below = row + 1
+            if below < height and below not in rebuilt:
+                parents, firsts, lasts, data = self.levels[below].columns()
+                remap = remaps[row]
+                rebuilt[below] = [
+                    array('q', [remap[parent] for parent in parents]),
+                    firsts, lasts, data, self._ids(self.levels[below])]
+        for row in list(remaps):
+            # and the parents of the new nodes get new child ranges
+            if row > 0:
+                above = rebuilt.get(row - 1)
+                if above is None:
+                    parents, _, _, data = self.levels[row - 1].columns()
+                    rebuilt[row - 1] = [parents, None, None, data,
+                                        self._ids(self.levels[row - 1])]
+                else:
+                    above[1] = above[2] = None
+        for row in sorted(rebuilt):
+            parents, firsts, lasts, data, ids = rebuilt[row]
+            if firsts is None:
+                if row + 1 in rebuilt:
+                    firsts, lasts = child_ranges(rebuilt[row + 1][0],
+                                                 len(data))
+                else:
+                    firsts = array('q', [NO_CHILD]) * len(data)
+                    lasts = array('q', [NO_CHILD]) * len(data)
+            level = self.row_class.from_columns(row, parents, firsts, lasts,
+                                                data, ids)
+            level.matrix = self
+            if row < height:
+                self.levels[row] = level
+            else:
+                self.levels.append(level)
+        for row in sorted(inserted):
+            for column in inserted[row]:
+                self.notify('node_inserted', row, column)
+        return positions
+
+    def append_last(self, data, row):
+        """append a node at the end of :row: as the last child of the last
+        node on the row above. loaders that visit the nodes in depth first
+        order can use this to build the matrix without any searching, since
+        the parent of each node they visit is the node they last added to the
+        level above it"""
+        if row == len(self.levels):
+            self.add_row()
+        level = self._writable(row)
+        sibling_index = len(level)
+        if row > 0:
+            parent_level = self._writable(row - 1)
+            parent_column = len(parent_level) - 1
+            level.append_child(data, parent_column, sibling_index)
+            parent_level.add_children(parent_column, sibling_index)
+        else:
+            level.append_child(data, -1, sibling_index)
+        self.notify('node_inserted', row, sibling_index)
+        return (row, sibling_index)
+
+    def child_range(self, row, first, stop):
+        """get the nodes on the level below :row: whose parents are the nodes
+        first..stop - 1 of :row:. the children of a range of siblings are
+        contiguous, so we find them by bisecting the parent indices of the
+        level below.
+
+        :returns: tuple - (first, stop) sibling indices on row + 1, empty if
+        there is no such level or none of the nodes have children
+        """
+        try:
+            level = self.levels[row + 1]
+        except IndexError:
+            return (0, 0)
+        return (level.bisect_parent(first - 1), level.bisect_parent(stop - 1))
+
+    def subtree_ranges(self, row, column):
+        """get the nodes of the subtree rooted at (row, column). on every
+        level the descendants of a node are a contiguous slice, so we only
+        need one child_range per level - O(depth * log(width)).
+
+        :returns: list - of (level, first, stop) tuples, one per level of the
+        subtree starting with (row, column, column + 1)
+        """
+        ranges = []
+        first, stop = column, column + 1
+        while first < stop:
+            ranges.append((row, first, stop))
+            first, stop = self.child_range(row, first, stop)
+            row += 1
+        return ranges
+
+    def subtree_size(self, row, column):
+        """get the number of nodes in the subtree rooted at (row, column)"""
+        size = 0
+        for level_index, first, stop in self.subtree_ranges(row, column):
+            size += stop - first
+            if self.levels[level_index].dead:
+                size -= sum(1 for node in self.levels[level_index][first:stop]
+                            if node.data is TOMBSTONE)
+        return size
+
+    def empty_like(self):
+        """create a matrix with no levels and the settings of this one. used
+        when copying nodes out of this matrix"""
+        return self.__class__(levels=0, tombstones=self.tombstones,
+                              compact_threshold=self.compact_threshold)
+
+    def extract(self, row, column):
+        """copy the subtree rooted at (row, column) into a new matrix of the
+        same kind. each level is copied as a slice of columns and the indices
+        are moved so that the subtree root becomes the root.
+
+        :returns: ITreeMatrix - the copied subtree
+        """
+        ranges = self.subtree_ranges(row, column)
+        matrix = self.empty_like()
+        for level_index, (source_row, first, stop) in enumerate(ranges):
+            parents, firsts, lasts, data = self.levels[source_row].columns(
+                first, stop)
+            if level_index == 0:
+                parents = array('q', [-1])
+            else:
+                offset = ranges[level_index - 1][1]
+                parents = array('q', [index - offset for index in parents])
+            if level_index + 1 < len(ranges):
+                offset = ranges[level_index + 1][1]
+                firsts = array('q', [NO_CHILD if index == NO_CHILD
+                                     else index - offset for index in firsts])
+                lasts = array('q', [NO_CHILD if index == NO_CHILD
+                                    else index - offset for index in lasts])
+            matrix.levels.append(matrix.row_class.from_columns(
+                level_index, parents, firsts, lasts, data))
+        matrix.levels_replaced()
+        # the tombstones were copied along, the copy doesn't need them
+        matrix.compact()
+        return matrix
+
     def remove_node(self, row, column):
-        node = self.levels[row][column]
-        if len(node.children_indices) != 0:
+        self.get_node(row, column)
+        if self.live_children(row, column):
             raise ITreeError("cannot delete a node which has children")
+        level = self._writable(row)
+        node = level[column]
+        if self.tombstones:
+            removed = ITreeNode(node.data, node.parent_index)
+            node.data = TOMBSTONE
+            level.dead += 1
+            self.notify('node_removed', row, column, removed)
+            if (self.compact_threshold is not None and
+                    level.dead > self.compact_threshold * len(level)):
+                self.compact(row)
+            return removed
         parent_row = row - 1
         # if this isn't the root node, we need to delete
         # this child from parent nodes
         if parent_row >= 0:
-            parent_level = self.levels[parent_row]
-            parent_level.remove_child(parent_row, column)
+            parent_level = self._writable(parent_row)
+            parent_level.remove_child(node.parent_index, column)
         # remove this node from the tree
-        level = self.levels[row]
         removed = level.pop(column)
+        # the nodes to the right of it moved one place to the left,
+        # so the parent indices of their children must follow
+        if row + 1 < len(self.levels):
+            self._writable(row + 1).shift_parents(column + 1, -1)
         if len(level) == 0:
             self.levels.pop(row)
+        self.notify('node_removed', row, column, removed)
+        return removed
+
+    def remove_subtree(self, row, column):
+        """remove the node at (row, column) together with all its
+        descendants. the descendants on each level are a contiguous slice,
+        so this is one slice deletion and one pass over the nodes to the
+        right of the slice per level.
+
+        :returns: int - how many nodes were removed
+        """
+        node = self.get_node(row, column)
+        ranges = self.subtree_ranges(row, column)
+        if row > 0:
+            self._writable(row - 1).remove_child(node.parent_index, column)
+        counts = [stop - first for _, first, stop in ranges]
+        removed = 0
+        for offset, (level_index, first, stop) in enumerate(ranges):
+            level = self._writable(level_index)
+            dead = 0
+            if level.dead:
+                dead = sum(1 for each in level[first:stop]
+                           if each.data is TOMBSTONE)
+                level.dead -= dead
+            removed += counts[offset] - dead
+            del level[first:stop]
+            # what is right of the slice moves left, as do the children
+            # and parents of those nodes
+            if offset + 1 < len(counts):
+                level.shift_children(first, -counts[offset + 1])
+            if offset > 0:
+                above = ranges[offset - 1]
+                level.shift_parents(above[2], -counts[offset - 1])
+        # the level below the subtree lost nothing but its parents moved
+        last_level, _, last_stop = ranges[-1]
+        if last_level + 1 < len(self.levels):
+            self._writable(last_level + 1).shift_parents(last_stop,
+                                                         -counts[-1])
+        while self.levels and len(self.levels[-1]) == 0:
+            self.levels.pop()
+        self.notify('levels_replaced')
         return removed
 
+    def compact(self, start=0, rebuild=False, intern=False):
+        """remove the tombstones of level :start: and of the levels below it,
+        in one pass per level. the nodes left on a level move to the left to
+        fill the gaps, so their sibling indices change.
+
+        :start: int - the first level to compact
+        :rebuild: bool - if set, rebuild all the levels from start on even
+        if they have no tombstones. the rebuilt rows take just the memory
+        their nodes need, eg: to give back the memory left over after many
+        deletes
+        :intern: bool - if set, rebuild and keep equal data once, see
+        interned
+        :returns: int - how many tombstones were removed
+        """
+        # the levels above the first one with tombstones stay as they are
+        while (not rebuild and not intern and start < len(self.levels) and
+               not self.levels[start].dead):
+            start += 1
+        if start == len(self.levels):
+            return 0
+        if self.frozen:
+            raise ITreeError('this itree is a read only snapshot')
+        removed = 0
+        columns = []
+        cache = {} if intern else None
+        # new sibling index of each live node of the level above, None if
+        # the level above wasn't compacted so the indices stay the same
+        remap = None
+        for level in self.levels[start:]:
+            parents, _, _, data = level.columns()
+            ids = self._ids(level)
+            alive = [index for index, datum in enumerate(data)
+                     if datum is not TOMBSTONE]
+            removed += len(data) - len(alive)
+            if remap is None:
+                parents = array('q', [parents[index] for index in alive])
+            else:
+                parents = array('q', [remap[parents[index]]
+                                      for index in alive])
+            if cache is None:
+                live = [data[index] for index in alive]
+            else:
+                live = [interned(cache, data[index]) for index in alive]
+            if ids is not None:
+                ids = array('q', [ids[index] for index in alive])
+            # copied so the list is allocated at its size
+            columns.append((parents, list(live), ids))
+            remap = array('q', [NO_CHILD]) * len(data)
+            for new_index, old_index in enumerate(alive):
+                remap[old_index] = new_index
+        # live nodes have live parents, so once a level is empty so are all
+        # the levels below it
+        while columns and not columns[-1][1]:
+            columns.pop()
+        self._replace_levels(start, columns)
+        return removed
+
+    def _replace_levels(self, start, columns):
+        """replace the levels from :start: on with rows made from
+        :columns:, a (parent indices, data, ids) tuple per level, working
+        out the child ranges from the parent indices. the level above start
+        keeps its nodes but gets its child ranges fixed"""
+        rows = []
+        for offset, (parents, data, ids) in enumerate(columns):
+            if offset + 1 < len(columns):
+                firsts, lasts = child_ranges(columns[offset + 1][0],
+                                             len(data))
+            else:
+                firsts = array('q', [NO_CHILD]) * len(data)
+                lasts = array('q', [NO_CHILD]) * len(data)
+            rows.append(self.row_class.from_columns(start + offset, parents,
+                                                    firsts, lasts, data,
+                                                    ids))
+        if start > 0:
+            above = self.levels[start - 1]
+            parents, _, _, data = above.columns()
+            firsts, lasts = child_ranges(columns[0][0] if columns else [],
+                                         len(data))
+            self.levels[start - 1] = self.row_class.from_columns(
+                start - 1, parents, firsts, lasts, data, self._ids(above))
+        self.levels[start:] = rows
+        self.levels_replaced()
+
+    def prune(self, predicate):
+        """remove all the leaves whose data satisfies :predicate:. the leaves
+        are marked with one pass per level and removed with one compact, so
+        pruning many leaves is linear. only nodes that are leaves when prune
+        is called are removed.
+
+        :predicate: callable - called with the data of each leaf
+        :returns: int - how many nodes were removed
+        """
+        for row, level in enumerate(self.levels):
+            killed = [column for column, node in enumerate(level)
+                      if node.data is not TOMBSTONE and
+                      not self.live_children(row, column) and
+                      predicate(node.data)]
+            if killed:
+                level = self._writable(row)
+                for column in killed:
+                    level[column].data = TOMBSTONE
+                level.dead += len(killed)
+        return self.compact()
+
+    def memory_usage(self, deep=False):
+        """estimate how many bytes this matrix takes. objects shared by
+        many nodes are counted once
+
+        :deep: bool - if set, count what the data contains too when it is a
+        list, tuple, set or dict (all the way down), rather than just the
+        data objects themselves
+        :returns: dict - levels is a list of dicts with the structure bytes
+        (rows, nodes, indices) and data bytes of each level, structure, data
+        and total are the totals over the tree
+        """
+        seen = set()
+        levels = []
+        for level in self.levels:
+            structure, data = level.memory_usage(deep, seen)
+            levels.append({'structure': structure, 'data': data})
+        structure = sys.getsizeof(self.levels) + sum(level['structure']
+                                                     for level in levels)
+        data = sum(level['data'] for level in levels)
+        return {'levels': levels, 'structure': structure, 'data': data,
+                'total': structure + data}
+
     def add_row(self):
-        self.levels.append(ITreeRow(self.height))
+        if self.frozen:
+            raise ITreeError('this itree is a read only snapshot')
+        row = self.row_class(self.height)
+        row.matrix = self
+        self.levels.append(row)
+        return row
@@ -0,0 +1,69 @@
+"""subtree aggregate unittests"""
+import random
+import pytest
+from itree import ITree, ITreeError, ColumnarITreeMatrix, utils
+
+
+def subtree_data(node):
+    return [each.data for each in node.traverse(output='node')]
+
+def check(tree):
+    for node in tree.traverse(output='node'):
+        data = subtree_data(node)
+        assert(node.aggregate('sum') == sum(data))
+        assert(node.aggregate('count') == len(data))
+        assert(node.aggregate('max') == max(data))
+        assert(node.aggregate('min') == min(data))
+
+def test_aggregates():
+    tree = ITree.from_nested_list([1, utils.generate_nested_list(500, 20)])
+    for name in ('sum', 'count', 'min', 'max'):
+        tree.add_aggregate(name, name)
+    assert(tree.aggregate('count') == len(tree))
+    check(tree)
+
+def test_aggregates_follow_changes():
+    random.seed(13)
+    for matrix in (None, ColumnarITreeMatrix(),
+                   ColumnarITreeMatrix(tombstones=True)):
+        tree = ITree.from_nested_list([1, utils.generate_nested_list(300, 10)],
+                                      tree=matrix)
+        for name in ('sum', 'count', 'min', 'max'):
+            tree.add_aggregate(name, name)
+        check(tree)
+        for _ in range(200):
+            nodes = list(tree.traverse(output='node'))
+            node = random.choice(nodes)
+            choice = random.random()
+            if choice < 0.4:
+                node.append_child(random.randint(-100, 100))
+            elif choice < 0.7:
+                node.data = random.randint(-100, 100)
+            elif not node.children and node.index != (0, 0):
+                node.delete()
+        check(tree)
+        tree[1, 0].delete_subtree()
+        tree.prune(lambda data: data > 50)
+        check(tree)
+
+def test_aggregates_of_extended_tree():
+    tree = ITree()
+    tree.add_aggregate('sum', 'sum')
+    child = tree.append_child(1)
+    child.append_child(2)
+    child.append_child(3).append_child(4).append_child(5)
+    assert(tree.aggregate('sum') == sum(range(6)))
+    tree.tree[3][0] = 10
+    assert(tree.aggregate('sum', child) == 20)
+
+def test_custom_aggregate():
+    tree = ITree.from_nested_list(['a', ['bb', ['ccc'], 'd']])
+    tree.add_aggregate('longest', max, value=len)
+    assert(tree.aggregate('longest') == 3)
+    tree[2, 0].delete()
+    assert(tree.aggregate('longest') == 2)
+    tree.remove_aggregate('longest')
+    with pytest.raises(ITreeError):
+        tree.aggregate('longest')
+    with pytest.raises(ITreeError):
+        tree.add_aggregate('mean', 'mean')
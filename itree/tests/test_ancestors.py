@@ -0,0 +1,45 @@
+"""ancestor index unittests"""
+import random
+import pytest
+from itree import ITree, ITreeError, utils
+
+
+def path_to_root(node):
+    path = [node.index]
+    while path[-1][0] > 0:
+        node = node.parent
+        path.append(node.index)
+    return path
+
+def test_ancestor():
+    tree = ITree.from_nested_list([1, utils.generate_nested_list(2000, 300)])
+    for node in tree.traverse(output='node'):
+        for k, index in enumerate(path_to_root(node)):
+            assert(node.ancestor(k).index == index)
+    with pytest.raises(ITreeError):
+        tree[1, 0].ancestor(2)
+
+def test_lca_and_distance():
+    random.seed(15)
+    tree = ITree.from_nested_list([1, utils.generate_nested_list(2000, 300)])
+    nodes = list(tree.traverse(output='node'))
+    for _ in range(500):
+        a, b = random.choice(nodes), random.choice(nodes)
+        path_a, path_b = path_to_root(a), path_to_root(b)
+        common = [index for index in path_a if index in path_b][0]
+        assert(tree.lca(a, b).index == common)
+        assert(tree.distance(a, b) ==
+               path_a.index(common) + path_b.index(common))
+        assert(a.is_ancestor_of(b) == (a.index in path_b[1:]))
+    assert(tree.lca(nodes[5], nodes[5]).index == nodes[5].index)
+
+def test_ancestor_index_follows_changes():
+    tree = ITree.from_nested_list([0, [1, [3, 4], 2, [5]]])
+    assert(tree.lca(tree[2, 0], tree[2, 2]).data == 0)
+    tree[1, 0].append_child(6).append_child(7)
+    assert(tree[3, 0].ancestor(2).data == 1)
+    assert(tree.lca(tree[3, 0], tree[2, 0]).data == 1)
+    tree[1, 0].delete_subtree()
+    assert(tree.lca(tree[2, 0], tree[1, 0]).data == 2)
+    assert(tree.root.is_ancestor_of(tree[2, 0]))
+    assert(not tree[2, 0].is_ancestor_of(tree[2, 0]))
@@ -0,0 +1,62 @@
+"""parent pointer array conversion unittests"""
+import pytest
+import itree.arrays
+from itree import ITree, ITreeError, ColumnarITreeMatrix, utils
+
+NESTED_LIST = [0, [1, [3, 4, [7, 8]], 2, [5, [9], 6]]]
+PARENTS = [[-1], [0, 0], [0, 0, 1, 1], [1, 1, 2]]
+DATA = [[0], [1, 2], [3, 4, 5, 6], [7, 8, 9]]
+
+
+def test_from_arrays():
+    tree = ITree.from_arrays(PARENTS, DATA)
+    assert(tree.to_nested_list() == NESTED_LIST)
+    assert([each.data for each in tree[2, 1].children] == [7, 8])
+
+def test_from_arrays_without_numpy(monkeypatch):
+    monkeypatch.setattr(itree.arrays, 'numpy', None)
+    tree = ITree.from_arrays(PARENTS, DATA)
+    assert(tree.to_nested_list() == NESTED_LIST)
+    with pytest.raises(ITreeError):
+        ITree.from_arrays([[-1], [0, 0], [1, 0]])
+    with pytest.raises(ImportError):
+        tree.to_arrays()
+
+def test_from_arrays_columnar():
+    tree = ITree.from_arrays(PARENTS, DATA, tree=ColumnarITreeMatrix())
+    assert(isinstance(tree.tree, ColumnarITreeMatrix))
+    assert(tree.to_nested_list() == NESTED_LIST)
+    tree[1, 0].append_child(10)
+    assert(tree[2, 2].data == 10)
+
+def test_from_arrays_invalid():
+    with pytest.raises(ITreeError):
+        ITree.from_arrays([[-1, -1]])
+    with pytest.raises(ITreeError):
+        ITree.from_arrays([[-1], [0, 1]])
+    with pytest.raises(ITreeError):
+        ITree.from_arrays([[-1], [0, 0], [1, 0]])
+    with pytest.raises(ITreeError):
+        ITree.from_arrays(PARENTS, [[0], [1]])
+
+def test_to_arrays_round_trip():
+    numpy = pytest.importorskip('numpy')
+    tree = ITree.from_nested_list([1, utils.generate_nested_list(3000, 30)])
+    arrays = tree.to_arrays()
+    assert(len(arrays['parent']) == tree.height)
+    assert(arrays['parent'][0].tolist() == [-1])
+    copy = ITree.from_arrays(arrays['parent'], arrays['data'])
+    assert(copy.to_nested_list() == tree.to_nested_list())
+    assert(numpy.array_equal(arrays['first_child'][1],
+                             copy.to_arrays()['first_child'][1]))
+
+def test_to_arrays_flat():
+    pytest.importorskip('numpy')
+    tree = ITree.from_nested_list(NESTED_LIST)
+    arrays = tree.to_arrays(flat=True)
+    assert(arrays['level_offsets'].tolist() == [0, 1, 3, 7, 10])
+    assert(arrays['parent'].tolist() == [-1, 0, 0, 1, 1, 2, 2, 4, 4, 5])
+    assert(arrays['first_child'][1] == 3)
+    copy = ITree.from_arrays(arrays['parent'], arrays['data'],
+                             level_offsets=arrays['level_offsets'])
+    assert(copy.to_nested_list() == NESTED_LIST)
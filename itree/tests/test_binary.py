@@ -0,0 +1,78 @@
+"""binary format and memory mapped itree unittests"""
+import pytest
+
+from itree import ITree, ITreeError, ColumnarITreeMatrix, utils
+
+NESTED_LIST = [0, [1, [3, 4, [7, 8]], 2, [5, [9], 6]]]
+
+
+def test_save_open_mmap(tmp_path):
+    path = str(tmp_path / 'tree.itree')
+    tree = ITree.from_nested_list([1, utils.generate_nested_list(3000, 40)])
+    tree.save(path)
+    mapped = ITree.open_mmap(path)
+    assert(len(mapped) == len(tree))
+    assert(mapped.to_nested_list() == tree.to_nested_list())
+    for order in ('levelorder', 'preorder', 'postorder'):
+        assert(list(mapped.traverse(order, output='data')) ==
+               list(tree.traverse(order, output='data')))
+    mapped.tree.close()
+
+def test_mmap_node_access(tmp_path):
+    path = str(tmp_path / 'tree.itree')
+    ITree.from_nested_list(NESTED_LIST).save(path)
+    tree = ITree.open_mmap(path)
+    assert(tree[2, 1].data == 4)
+    assert([child.data for child in tree[1, 1].children] == [5, 6])
+    assert(tree[3, 0].parent.parent.data == 1)
+    assert(tree.data_at(3, 2) == 9)
+    assert([node.data for node in tree] == list(range(10)))
+    tree.tree.close()
+
+def test_mmap_fixed_width_data(tmp_path):
+    path = str(tmp_path / 'tree.itree')
+    ITree.from_nested_list([0.5, [1.5, [2.5], 3.5]]).save(path, 'd')
+    with ITree.open_mmap(path).tree as matrix:
+        tree = ITree(tree=matrix)
+        assert(tree.to_nested_list() == [0.5, [1.5, [2.5], 3.5]])
+
+def test_mmap_is_read_only(tmp_path):
+    path = str(tmp_path / 'tree.itree')
+    ITree.from_nested_list(NESTED_LIST).save(path)
+    tree = ITree.open_mmap(path)
+    with pytest.raises(ITreeError):
+        tree.root.append_child(10)
+    with pytest.raises(ITreeError):
+        tree[3, 2].delete()
+    with pytest.raises(ITreeError):
+        tree[1, 0].delete_subtree()
+    with pytest.raises(ITreeError):
+        tree.tree.levels[1][0] = 10
+    assert(tree.to_nested_list() == NESTED_LIST)
+    tree.tree.close()
+
+def test_mmap_extract_subtree(tmp_path):
+    path = str(tmp_path / 'tree.itree')
+    ITree.from_nested_list(NESTED_LIST).save(path)
+    tree = ITree.open_mmap(path)
+    subtree = tree[1, 0].extract_subtree()
+    assert(isinstance(subtree.tree, ColumnarITreeMatrix))
+    subtree.root.append_child(10)
+    assert(subtree.to_nested_list() == [1, [3, 4, [7, 8], 10]])
+    tree.tree.close()
+
+def test_save_skips_deleted_nodes(tmp_path):
+    path = str(tmp_path / 'tree.itree')
+    tree = ITree.from_nested_list(NESTED_LIST, tree=ColumnarITreeMatrix(
+        tombstones=True, compact_threshold=1.))
+    tree[3, 2].delete()
+    tree.save(path)
+    mapped = ITree.open_mmap(path)
+    assert(mapped.to_nested_list() == tree.to_nested_list())
+    mapped.tree.close()
+
+def test_open_invalid_file(tmp_path):
+    path = tmp_path / 'tree.itree'
+    path.write_bytes(b'not an itree file')
+    with pytest.raises(ITreeError):
+        ITree.open_mmap(str(path))
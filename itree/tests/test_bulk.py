@@ -0,0 +1,146 @@
+"""batched append unittests"""
+import random
+import pytest
+from itree import (ITree, ITreeError, ITreeMatrix, ColumnarITreeMatrix, lookup,
+                   utils)
+
+
+MATRICES = (ITreeMatrix, ColumnarITreeMatrix)
+
+def check_ranges(tree):
+    levels = tree.tree.levels
+    for row, level in enumerate(levels[1:], 1):
+        for column, node in enumerate(level):
+            first, last = levels[row - 1].child_range(node.parent_index)
+            assert(first <= column <= last)
+
+def random_trees(matrix):
+    """two equal random trees"""
+    nested = [0, utils.generate_nested_list(300, 10)]
+    return (ITree.from_nested_list(nested, tree=matrix()),
+            ITree.from_nested_list(nested, tree=matrix()))
+
+def test_append_children():
+    for matrix in MATRICES:
+        tree = ITree.from_nested_list([0, [1, [3], 2, [4, 5]]],
+                                      tree=matrix())
+        children = tree[1, 0].append_children(['a', 'b', 'c'])
+        assert([child.data for child in children] == ['a', 'b', 'c'])
+        assert([child.parent.data for child in children] == [1, 1, 1])
+        assert(tree.to_nested_list() ==
+               [0, [1, [3, 'a', 'b', 'c'], 2, [4, 5]]])
+        # the first children of a node go to the spot found by bisecting
+        tree[2, 0].append_children(iter('xy'))
+        tree[2, 2].append_children([])
+        assert(tree.to_nested_list() ==
+               [0, [1, [3, ['x', 'y'], 'a', 'b', 'c'], 2, [4, 5]]])
+        check_ranges(tree)
+
+def test_append_children_matches_append_child():
+    random.seed(3)
+    for matrix in MATRICES:
+        one, many = random_trees(matrix)
+        for _ in range(50):
+            row = random.randrange(one.height)
+            column = random.randrange(len(one.tree.levels[row]))
+            data = list(range(random.randrange(5)))
+            for datum in data:
+                one[row, column].append_child(datum)
+            many[row, column].append_children(data)
+        assert(one.to_nested_list() == many.to_nested_list())
+        check_ranges(many)
+
+def test_append_children_aggregates():
+    tree = ITree.from_nested_list([1, [2, 3]])
+    tree.add_aggregate('sum', 'sum')
+    assert(tree.aggregate('sum') == 6)
+    tree[1, 0].append_children([10, 20])
+    assert(tree.aggregate('sum') == 36)
+    assert(tree[1, 0].aggregate('sum') == 32)
+
+def test_bulk_append_matches_append_child():
+    random.seed(5)
+    for matrix in MATRICES:
+        one, bulk = random_trees(matrix)
+        bulk.add_aggregate('count', 'count')
+        pairs = []
+        for datum in range(500):
+            row = random.randrange(bulk.height)
+            column = random.randrange(len(bulk.tree.levels[row]))
+            pairs.append(((row, column), datum))
+        positions = bulk.bulk_append(pairs)
+        assert([bulk[position].data for position in positions] ==
+               list(range(500)))
+        # appending one at a time from the deepest level up keeps the
+        # indices of the parents valid
+        for (row, column), datum in sorted(pairs, key=lambda pair:
+                                           -pair[0][0]):
+            one[row, column].append_child(datum)
+        assert(one.to_nested_list() == bulk.to_nested_list())
+        check_ranges(bulk)
+        for node in bulk.traverse(max_depth=2):
+            assert(node.aggregate('count') == len(list(node.traverse())))
+
+def test_bulk_append_nodes_and_errors():
+    tree = ITree.from_nested_list([0, [1, 2]],
+                                  tree=ITreeMatrix(tombstones=True,
+                                                   compact_threshold=None))
+    positions = tree.bulk_append([(tree[1, 1], 'a'), (tree.root, 3),
+                                  ((1, 1), 'b')])
+    assert(positions == [(2, 0), (1, 2), (2, 1)])
+    assert(tree.to_nested_list() == [0, [1, 2, ['a', 'b'], 3]])
+    assert(tree.bulk_append([]) == [])
+    tree[1, 2].delete()
+    with pytest.raises(ITreeError):
+        tree.bulk_append([((1, 2), 'c')])
+    with pytest.raises(ITreeError):
+        tree.snapshot().bulk_append([((0, 0), 'c')])
+
+class Recorder(object):
+    """an observer that records the events of a matrix"""
+
+    def __init__(self):
+        self.events = []
+
+    def node_inserted(self, row, column):
+        self.events.append(('inserted', row, column))
+
+    def node_removed(self, row, column, removed):
+        self.events.append(('removed', row, column))
+
+    def data_changed(self, row, column, previous):
+        self.events.append(('changed', row, column))
+
+    def levels_replaced(self):
+        self.events.append(('replaced',))
+
+def test_bulk_append_keeps_observers():
+    for matrix in MATRICES:
+        tree = ITree.from_nested_list([0, [1, [2, [3, [4, [5]]]], 6]],
+                                      tree=matrix())
+        tree.add_value_index()
+        tree.add_aggregate('sum', 'sum')
+        index = lookup.get_value_index(tree.tree)
+        assert(tree.find(5).index == (5, 0))
+        recorder = Recorder()
+        tree.tree.add_observer(recorder)
+        levels = list(tree.tree.levels)
+        positions = tree.bulk_append([((1, 0), 10), ((0, 0), 20),
+                                      ((1, 1), 30)])
+        assert(positions == [(2, 1), (1, 2), (2, 2)])
+        assert(tree.to_nested_list() ==
+               [0, [1, [2, [3, [4, [5]]], 10], 6, [30], 20]])
+        # only the levels that got nodes and the ones around them change
+        assert(tree.tree.levels[4] is levels[4])
+        assert(tree.tree.levels[5] is levels[5])
+        assert(recorder.events == [('inserted', 1, 2), ('inserted', 2, 1),
+                                   ('inserted', 2, 2)])
+        # the observers follow along instead of starting over
+        assert(index.levels is not None and not index.stale)
+        assert(tree.find(10).index == (2, 1))
+        assert(tree.find(2).index == (2, 0))
+        assert(tree.find(30).index == (2, 2))
+        assert(tree.find(5).index == (5, 0))
+        assert(tree.aggregate('sum') == 81)
+        assert(tree[1, 1].aggregate('sum') == 36)
+        check_ranges(tree)
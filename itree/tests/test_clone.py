@@ -0,0 +1,75 @@
+"""copy on write clone and snapshot unittests"""
+import pytest
+from itree import ITree, ITreeError, ColumnarITreeMatrix, utils
+
+NESTED_LIST = [0, [1, [3, 4, [7, 8]], 2, [5, [9], 6]]]
+
+
+def test_clone_shares_levels():
+    tree = ITree.from_nested_list(NESTED_LIST)
+    clone = tree.clone()
+    assert(all(a is b for a, b in zip(tree.tree.levels, clone.tree.levels)))
+    clone[3, 2].append_child(10)
+    # the level of the new node and the level of its parent were copied
+    shared = [a is b for a, b in zip(tree.tree.levels, clone.tree.levels)]
+    assert(shared == [True, True, True, False])
+    assert(tree.to_nested_list() == NESTED_LIST)
+    assert(clone.to_nested_list() == [0, [1, [3, 4, [7, 8]],
+                                          2, [5, [9, [10]], 6]]])
+
+def test_clones_are_independent():
+    multi_list = [1, utils.generate_nested_list(2000, 100)]
+    for matrix in (None, ColumnarITreeMatrix(),
+                   ColumnarITreeMatrix(tombstones=True)):
+        tree = ITree.from_nested_list(multi_list, tree=matrix)
+        clones = [tree.clone() for _ in range(3)]
+        clones[0].root.children[0].append_child('new')
+        clones[1][2, 5].data = 'changed'
+        clones[2].root.children[1].delete_subtree()
+        assert(tree.to_nested_list() == multi_list)
+        assert(clones[0].root.children[0].children[-1].data == 'new')
+        assert(clones[1].data_at(2, 5) == 'changed')
+        sizes = [len(clone) for clone in clones]
+        assert(sizes[0] == len(tree) + 1 and sizes[2] < len(tree))
+        tree.root.children[2].append_child('original')
+        assert([len(clone) for clone in clones] == sizes)
+        assert(tree.root.children[2].children[-1].data == 'original')
+
+def test_snapshot_is_read_only():
+    tree = ITree.from_nested_list(NESTED_LIST)
+    snapshot = tree.snapshot()
+    with pytest.raises(ITreeError):
+        snapshot.root.append_child(10)
+    with pytest.raises(ITreeError):
+        snapshot[3, 0].delete()
+    with pytest.raises(ITreeError):
+        snapshot.root.data = 10
+    tree.root.data = 10
+    tree[3, 0].delete()
+    assert(snapshot.to_nested_list() == NESTED_LIST)
+    assert(snapshot.clone().to_nested_list() == NESTED_LIST)
+
+def test_assigning_to_shared_rows_copies_them():
+    for matrix in (None, ColumnarITreeMatrix):
+        tree = ITree.from_nested_list(NESTED_LIST,
+                                      tree=matrix and matrix())
+        clone = tree.clone()
+        snapshot = tree.snapshot()
+        row = tree.tree[1]
+        tree.tree[1][0] = 10
+        assert(tree[1, 0].data == 10)
+        assert(clone[1, 0].data == 1 and snapshot[1, 0].data == 1)
+        # the row handed out before is left to the copies
+        with pytest.raises(ITreeError):
+            row[0] = 11
+        clone.tree[1][1] = 20
+        assert(clone[1, 1].data == 20)
+        assert(tree[1, 1].data == 2 and snapshot[1, 1].data == 2)
+        with pytest.raises(ITreeError):
+            snapshot.tree[1][0] = 30
+        tree.tree[-1][0] = 70
+        assert(tree.to_nested_list() ==
+               [0, [10, [3, 4, [70, 8]], 2, [5, [9], 6]]])
+        assert(clone.to_nested_list() ==
+               [0, [1, [3, 4, [7, 8]], 20, [5, [9], 6]]])
+        assert(snapshot.to_nested_list() == NESTED_LIST)
@@ -0,0 +1,52 @@
+"""columnar storage engine unittests"""
+import pytest
+from itree import ITree, ITreeError, ColumnarITreeMatrix, utils
+
+
+def make_tree():
+    tree = ITree(tree=ColumnarITreeMatrix())
+    tree.append_child('dog')
+    tree.root.append_child('cat')
+    tree.root.append_child('mouse')
+    return tree
+
+def test_columnar_len():
+    tree = make_tree()
+    assert(len(tree) == 3)
+
+def test_columnar_children():
+    tree = make_tree()
+    assert([each.data for each in tree.root.children] == ['cat', 'mouse'])
+    assert(tree[1, 1].parent.data == 'dog')
+
+def test_columnar_set_data():
+    tree = make_tree()
+    tree.tree[1][0] = 'lion'
+    assert(tree[1, 0].data == 'lion')
+    tree.set_root('wolf')
+    assert(tree.root.data == 'wolf')
+
+def test_columnar_views_have_no_dict():
+    tree = make_tree()
+    view = tree.tree.levels[1][0]
+    assert(not hasattr(view, '__dict__'))
+    with pytest.raises(AttributeError):
+        view.color = 'grey'
+    assert(view.data == 'cat' and view.parent_index == 0)
+    assert(view.children_indices == range(0) and view.node_id is None)
+
+def test_columnar_deleting():
+    tree = make_tree()
+    tree[1, 1].delete()
+    assert(len(tree) == 2)
+    assert([each.data for each in tree.root.children] == ['cat'])
+    with pytest.raises(ITreeError):
+        tree.root.delete()
+
+def test_columnar_matches_list_storage():
+    multi_list = [1, utils.generate_nested_list(2000, 20)]
+    columnar = ITree.from_nested_list(multi_list, tree=ColumnarITreeMatrix())
+    assert(isinstance(columnar.tree, ColumnarITreeMatrix))
+    assert(columnar.to_nested_list() == multi_list)
+    listed = ITree.from_nested_list(multi_list)
+    assert([n.index for n in columnar] == [n.index for n in listed])
@@ -0,0 +1,80 @@
+"""random tree generator unittests"""
+import pytest
+import itree.arrays
+import itree.utils
+from itree import ITreeError, ColumnarITreeMatrix, utils
+
+
+def check_shapes():
+    tree = utils.branching_tree(40, branching=3)
+    assert(len(tree) == 40)
+    assert([len(level) for level in tree.tree.levels] == [1, 3, 9, 27])
+    assert(all(len(tree[2, index].children) == 3 for index in range(9)))
+    tree = utils.chain(50)
+    assert(tree.height == 50 and len(tree) == 50)
+    tree = utils.caterpillar(41, legs=3)
+    assert([len(level) for level in tree.tree.levels] == [1] + [4] * 10)
+    assert(all(len(tree[level, 0].children) == 4 for level in range(9)))
+    for generate in (utils.power_law_tree, utils.random_recursive_tree):
+        tree = generate(5000, seed=3)
+        assert(len(tree) == 5000)
+        assert(tree.to_nested_list() ==
+               generate(5000, seed=3).to_nested_list())
+        assert(tree.to_nested_list() !=
+               generate(5000, seed=4).to_nested_list())
+    # the data of each node is its position in level order
+    assert([node.data for node in tree] == list(range(5000)))
+
+def test_generators():
+    check_shapes()
+
+def test_generators_without_numpy(monkeypatch):
+    monkeypatch.setattr(itree.utils, 'numpy', None)
+    check_shapes()
+
+def test_generator_outputs():
+    arrays = utils.random_recursive_tree(1000, seed=0, output='arrays')
+    tree = utils.random_recursive_tree(1000, seed=0,
+                                       tree=ColumnarITreeMatrix())
+    assert(isinstance(tree.tree, ColumnarITreeMatrix))
+    assert([list(level) for level in arrays['parent']] ==
+           [list(level.columns()[0]) for level in tree.tree.levels])
+    with pytest.raises(ITreeError):
+        utils.chain(10, output='nested')
+    with pytest.raises(ITreeError):
+        utils.branching_tree(0)
+
+class CountingNumpy(object):
+    """stands in for numpy, counting the calls made through it"""
+
+    def __init__(self, numpy):
+        self.numpy = numpy
+        self.calls = 0
+
+    def __getattr__(self, name):
+        attribute = getattr(self.numpy, name)
+        if callable(attribute) and not isinstance(attribute, type):
+            self.calls += 1
+        return attribute
+
+def test_deep_generators_are_one_pass(monkeypatch):
+    # chain and caterpillar used to grow a level at a time through numpy,
+    # a few calls per level (4s for a chain of 10 ** 5 nodes)
+    numpy = pytest.importorskip('numpy')
+    counting = CountingNumpy(numpy)
+    monkeypatch.setattr(itree.utils, 'numpy', counting)
+    monkeypatch.setattr(itree.arrays, 'numpy', counting)
+    calls = []
+    for size in (10, 1000):
+        tree = utils.chain(size)
+        assert(tree.height == size)
+        assert(tree[size - 1, 0].data == size - 1)
+        utils.caterpillar(size, legs=2)
+        calls.append(counting.calls)
+        counting.calls = 0
+    assert(calls[0] == calls[1])
+    arrays = utils.caterpillar(9, legs=2, output='arrays')
+    assert([list(level) for level in arrays['parent']] ==
+           [[-1], [0, 0, 0], [0, 0, 0], [0, 0]])
+    assert([list(level) for level in arrays['data']] ==
+           [[0], [1, 2, 3], [4, 5, 6], [7, 8]])
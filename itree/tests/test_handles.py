@@ -0,0 +1,123 @@
+"""stable handle unittests"""
+import random
+import pytest
+from itree import (ITree, ITreeError, ITreeMatrix, ColumnarITreeMatrix,
+                   VersionedITree, handles, utils)
+from itree.structs import MAX_SHIFTS
+
+
+def test_handles_survive_shifts():
+    for matrix in (ITreeMatrix(), ColumnarITreeMatrix()):
+        tree = ITree.from_nested_list([0, [1, [3], 2, [4, 5]]], tree=matrix)
+        handle = tree[2, 2].handle
+        assert(tree[2, 2].handle == handle)
+        tree[2, 0].append_child(6)
+        tree[1, 0].append_child(7)
+        tree[1, 0].append_children([8, 9])
+        assert(tree.resolve(handle).data == 5)
+        assert(tree.resolve(handle).index == (2, 5))
+        tree[2, 0].delete_subtree()
+        tree[2, 1].delete()
+        assert(tree.resolve(handle).index == (2, 3))
+        tree.bulk_append([(tree.root, 10), (tree[1, 0], 11)])
+        assert(tree.resolve(handle).data == 5)
+        tree.resolve(handle).delete()
+        with pytest.raises(ITreeError):
+            tree.resolve(handle)
+
+def test_handles_random_changes():
+    random.seed(17)
+    for matrix in (ITreeMatrix(), ColumnarITreeMatrix(),
+                   ColumnarITreeMatrix(tombstones=True)):
+        tree = ITree.from_nested_list([0, utils.generate_nested_list(300, 10)],
+                                      tree=matrix)
+        # the data is unique, so it tells the nodes apart
+        for datum, node in enumerate(tree.traverse(output='node')):
+            node.data = datum
+        nodes = list(tree.traverse(output='node'))
+        handles = dict((node.handle, node.data)
+                       for node in random.sample(nodes, 50))
+        for datum in range(1000, 1300):
+            node = random.choice(list(tree.traverse(output='node')))
+            if random.random() < 0.6:
+                node.append_child(datum)
+            elif node.index != (0, 0) and not list(node.children):
+                if node.handle in handles:
+                    del handles[node.handle]
+                node.delete()
+        tree.compact()
+        for handle, datum in handles.items():
+            assert(tree.resolve(handle).data == datum)
+
+def test_handles_in_clones():
+    tree = ITree.from_nested_list([0, [1, 2]])
+    handle = tree[1, 1].handle
+    clone = tree.clone()
+    clone.root.append_child(3)
+    clone[1, 0].append_child(4)
+    assert(clone.resolve(handle).data == 2)
+    assert(tree.resolve(handle).index == (1, 1))
+    # the snapshot can resolve the handles given out before it was made
+    snapshot = tree.snapshot()
+    assert(snapshot.resolve(handle).data == 2)
+    assert(snapshot[1, 1].handle == handle)
+
+def test_no_new_handles_in_read_only_trees(tmp_path):
+    tree = ITree.from_nested_list([0, [1, 2]])
+    handle = tree[1, 1].handle
+    path = str(tmp_path / 'tree.itree')
+    tree.save(path)
+    mapped = ITree.open_mmap(path)
+    for read_only in (tree.snapshot(), VersionedITree(tree).read(), mapped):
+        with pytest.raises(ITreeError) as error:
+            read_only[1, 0].handle
+        assert('read only' in str(error.value))
+    # a clone can be given handles
+    clone = mapped.clone()
+    other = clone[1, 0].handle
+    clone.root.append_child(3)
+    clone[1, 0].append_child(4)
+    assert(clone.resolve(other).data == 1)
+    mapped.tree.close()
+    # the snapshots of a versioned tree resolve the handles given before
+    versioned = VersionedITree(tree)
+    with versioned.write() as writing:
+        writing[1, 0].append_child(5)
+    assert(versioned.read().resolve(handle).index == (1, 1))
+
+def test_handles_after_many_shifts():
+    for matrix in (ITreeMatrix(), ColumnarITreeMatrix()):
+        tree = ITree.from_nested_list([0, [1, [2], 3, [4, 5]]], tree=matrix)
+        first, last = tree[2, 1].handle, tree[2, 2].handle
+        assert(tree.resolve(last).index == (2, 2))
+        # every child of 1 goes left of 4 and 5, past MAX_SHIFTS the level
+        # is rebuilt from its ids
+        for count in range(2 * MAX_SHIFTS):
+            tree[1, 0].append_child(count)
+            if count % 50 == 0:
+                assert(tree.resolve(first).index == (2, count + 2))
+        tree[2, 0].delete()
+        tree.resolve(first).delete()
+        assert(tree.resolve(last).index == (2, 2 * MAX_SHIFTS))
+        with pytest.raises(ITreeError):
+            tree.resolve(first)
+
+def test_resolve_after_insert_replays_shifts(monkeypatch):
+    # resolve used to reindex the level that shifted
+    builds = []
+    build = handles.HandleIndex._build
+    monkeypatch.setattr(handles.HandleIndex, '_build', lambda index, row:
+                        builds.append(row) or build(index, row))
+    # the first 949 nodes of level 2 have children, each insert shifts
+    tree = utils.branching_tree(50000, 50)
+    known = dict((tree[3, column].handle, tree[3, column].data)
+                 for column in range(0, 40000, 400))
+    for count in range(1000):
+        tree[2, count % 900].append_child(-count)
+        for handle, datum in known.items():
+            assert(tree.resolve(handle).data == datum)
+    # built on the first resolve, so the 999 inserts after it are logged,
+    # and rebuilt only once the log is longer than MAX_SHIFTS
+    assert(builds == [3] * (1 + 999 // (MAX_SHIFTS + 1)))
+    index = handles.get_handle_index(tree.tree)
+    assert(len(index.shifts[3]) == 999 % (MAX_SHIFTS + 1))
@@ -0,0 +1,66 @@
+"""instrumentation unittests"""
+from itree import ITree, ITreeMatrix
+
+
+def test_stats_disabled():
+    tree = ITree.from_nested_list([0, [1, 2]])
+    assert(tree.stats() is None)
+    assert('append_child' not in vars(tree.tree))
+
+def test_stats_count_operations():
+    tree = ITree.from_nested_list([0, [1, 2, 3]])
+    tree.instrument()
+    tree.root.append_child(4)
+    tree[1, 0].append_child(5)
+    tree[1, 1].delete()
+    stats = tree.stats()
+    operations = stats['operations']
+    assert(operations['append_child']['count'] == 2)
+    # the first child of a node has to be searched for
+    assert(operations['append_child']['bisect'] == 1)
+    assert(operations['remove_node']['count'] == 1)
+    # the 2 nodes to the right of the deleted one move left
+    assert(operations['remove_node']['shifted'] == 2)
+    assert(operations['get_node']['count'] > 0)
+    histogram = operations['append_child']['histogram']
+    assert(sum(histogram.values()) == 2)
+    assert(stats['proxies'] > 0)
+    tree.reset_stats()
+    assert(tree.stats() == {'operations': {}, 'proxies': 0})
+
+def test_stats_shifts():
+    tree = ITree.from_nested_list([0, [1, [3, 4], 2, [5, 6]]])
+    tree.instrument()
+    # goes before the children of 2, which shift right along with the
+    # parent index of them and the first child index of 2
+    tree[1, 0].append_child(7)
+    assert(tree.stats()['operations']['append_child']['shifted'] == 3)
+    tree.reset_stats()
+    tree[1, 1].delete_subtree()
+    assert(tree.stats()['operations']['remove_subtree']['shifted'] == 0)
+
+def test_callback_and_uninstrument():
+    calls = []
+    tree = ITree(tree=ITreeMatrix(tombstones=True))
+    tree.instrument(lambda operation, seconds, info: calls.append(operation))
+    root = tree.append_child(0)
+    root.append_child(1)
+    tree.compact()
+    assert('append_child' in calls and 'compact' in calls)
+    tree.uninstrument()
+    assert(tree.stats() is None)
+    assert('append_child' not in vars(tree.tree))
+    root.append_child(2)
+    assert(len(tree) == 3)
+
+def test_copies_of_instrumented_trees():
+    tree = ITree.from_nested_list([0, [1, 2]])
+    tree.instrument()
+    tree[1, 0]
+    # proxies are counted without interning them
+    assert(tree[1, 0] is not tree[1, 0])
+    for copy in (tree.clone(), tree.snapshot()):
+        assert(copy[1, 0] is not copy[1, 0])
+        assert(copy.stats() is None)
+    # the copies aren't instrumented, only the 3 proxies of tree count
+    assert(tree.stats()['proxies'] == 3)
@@ -1,6 +1,8 @@
 """basic itree unittests"""
+import random
 import pytest
-from itree import ITree, ITreeError, utils
+from itree import ITree, ITreeError, ITreeMatrix, ColumnarITreeMatrix, utils
+from itree.structs import MAX_SHIFTS
 
 def test_len():
     tree = ITree()
@@ -31,6 +33,107 @@ def test_append_child():
     kitten2 = cat.append_child('kitten2')
     assert(kitten2.sibling_index == 1)
 
+def test_append_child_keeps_cousins_consistent():
+    tree = ITree()
+    tree.append_child('dog')
+    cat = tree.root.append_child('cat')
+    mouse = tree.root.append_child('mouse')
+    cat.append_child('kitten')
+    mouse.append_child('mouseling').append_child('mousebaby')
+    cat.append_child('kitten2')
+    assert([each.data for each in tree[1, 1].children] == ['mouseling'])
+    assert(tree[3, 0].parent.data == 'mouseling')
+    assert(tree.to_nested_list() ==
+           ['dog', ['cat', ['kitten', 'kitten2'],
+                    'mouse', ['mouseling', ['mousebaby']]]])
+
+def test_append_child_bisects_for_first_child():
+    tree = ITree()
+    tree.append_child('root')
+    for data in range(5):
+        tree.root.append_child(data)
+    for parent in (4, 0, 2):
+        tree[1, parent].append_child(parent * 10)
+    assert([each.data for each in tree.tree[2]] == [0, 20, 40])
+    assert([each.parent.data for each in tree[1, 0].children] == [0])
+    assert([each.data for each in tree[1, 4].children] == [40])
+
+def test_append_child_defers_shifts():
+    size = 2 * MAX_SHIFTS + 10
+    for matrix in (ITreeMatrix(), ColumnarITreeMatrix()):
+        tree = ITree.from_arrays([[-1], [0] * size],
+                                 [[0], list(range(size))], tree=matrix)
+        level = tree.tree.levels[1]
+        # each first child goes left of the children of the parents to the
+        # right, their child ranges are shifted lazily
+        for parent in reversed(range(size - 20, size)):
+            tree[1, parent].append_child(-parent)
+        assert(len(level.pending) == 19)
+        assert([child.data for child in tree[1, size - 3].children] ==
+               [-(size - 3)])
+        assert(tree[2, 5].parent.data == size - 15)
+        for parent in reversed(range(size - 20)):
+            tree[1, parent].append_child(-parent)
+            # settled in one pass every MAX_SHIFTS shifts
+            assert(level.pending is None or len(level.pending) <= MAX_SHIFTS)
+        assert(all(tree[1, parent].children[0].data == -parent
+                   for parent in range(size)))
+        tree[1, 7].append_children(['a', 'b'])
+        tree[2, 3].delete()
+        tree[1, 9].delete_subtree()
+        expected = []
+        for parent in range(size):
+            if parent == 9:
+                continue
+            expected.append(parent)
+            if parent == 3:
+                continue
+            expected.append([-parent] + (['a', 'b'] if parent == 7 else []))
+        assert(tree.to_nested_list() == [0, expected])
+        assert(level.pending is None)
+
+def nested_model(children, siblings):
+    nested = []
+    for data in siblings:
+        nested.append(data)
+        if children[data]:
+            nested.append(nested_model(children, children[data]))
+    return nested
+
+def test_random_changes_keep_child_ranges():
+    rng = random.Random(5)
+    for matrix in (ITreeMatrix(), ColumnarITreeMatrix()):
+        tree = ITree(tree=matrix)
+        tree.append_child(0)
+        # the model: the data of the children of each node, data is unique
+        children, parents = {0: []}, {}
+        for data in range(1, 1500):
+            nodes = dict((node.data, node)
+                         for node in tree.traverse(output='node'))
+            target = rng.choice(sorted(nodes))
+            action = rng.random()
+            if action < 0.6 or target == 0:
+                nodes[target].append_child(data)
+                children[target].append(data)
+                children[data], parents[data] = [], target
+            elif action < 0.8 and not children[target]:
+                nodes[target].delete()
+                children[parents.pop(target)].remove(target)
+                del children[target]
+            elif action < 0.85:
+                nodes[target].delete_subtree()
+                children[parents.pop(target)].remove(target)
+                stack = [target]
+                while stack:
+                    stack.extend(children.pop(stack.pop()))
+            if data % 100 == 0:
+                assert(tree.to_nested_list() == nested_model(children, [0]))
+            else:
+                node = dict((node.data, node) for node in
+                            tree.traverse(output='node'))[
+                                rng.choice(sorted(children))]
+                assert([child.data for child in node.children] ==
+                       children[node.data])
 def test_indexing_children():
     tree = ITree()
     tree.append_child('dog')
@@ -122,3 +225,21 @@ def test_large_random_nested_list():
     tree = ITree.from_nested_list(multi_list)
     list_from_tree = tree.to_nested_list()
     assert(multi_list == list_from_tree)
+
+def test_node_proxies_have_slots():
+    tree = ITree()
+    tree.append_child('dog')
+    with pytest.raises(AttributeError):
+        tree.root.whatever = 1
+
+def test_data_at():
+    tree = ITree()
+    tree.append_child('dog')
+    tree.root.append_child('cat')
+    tree.root.append_child('mouse')
+    assert(tree.data_at(1, 1) == 'mouse')
+    assert(tree.get_many([(1, 1), (0, 0)]) == ['mouse', 'dog'])
+    with pytest.raises(ITreeError):
+        tree.data_at(2, 0)
+    with pytest.raises(ITreeError):
+        tree.get_many([(0, 0), (1, 5)])
@@ -0,0 +1,57 @@
+"""level by level reduce and broadcast unittests"""
+import operator
+import pytest
+from itree import ITree, ColumnarITreeMatrix, utils
+
+NESTED_LIST = [0, [1, [3, 4, [7, 8]], 2, [5, [9], 6]]]
+
+
+def values_at(values, tree):
+    return {index: values[index[0]][index[1]]
+            for index in tree.traverse(output='index')}
+
+def test_reduce_up():
+    tree = ITree.from_nested_list(NESTED_LIST)
+    sizes = values_at(tree.reduce_up(operator.add, lambda data: 1), tree)
+    for node in tree.traverse(output='node'):
+        assert(sizes[node.index] == node.subtree_size())
+    heights = tree.reduce_up(lambda height, child: max(height, child + 1), 0)
+    assert(heights[0] == [3])
+    assert(heights[1] == [2, 2])
+    sums = tree.reduce_up(operator.add)
+    assert(sums[0] == [sum(range(10))])
+    assert(sums[1] == [1 + 3 + 4 + 7 + 8, 2 + 5 + 6 + 9])
+
+def test_reduce_up_folds_children_in_order():
+    tree = ITree.from_nested_list(['a', ['b', ['c', 'd'], 'e']])
+    assert(tree.reduce_up(operator.add)[0] == ['abcde'])
+
+def test_broadcast_down():
+    tree = ITree.from_nested_list(NESTED_LIST)
+    depths = tree.broadcast_down(lambda depth, data: depth + 1, 0)
+    assert(depths == [[0], [1, 1], [2, 2, 2, 2], [3, 3, 3]])
+    paths = tree.broadcast_down(operator.add, 0)
+    assert(paths[3] == [0 + 1 + 4 + 7, 0 + 1 + 4 + 8, 0 + 2 + 5 + 9])
+
+def test_levelwise_skips_deleted_nodes():
+    tree = ITree.from_nested_list(NESTED_LIST, tree=ColumnarITreeMatrix(
+        tombstones=True, compact_threshold=None))
+    tree[3, 2].delete()
+    tree[2, 3].delete()
+    sums = tree.reduce_up(operator.add)
+    assert(sums[0] == [sum(range(10)) - 9 - 6])
+    assert(tree.broadcast_down(operator.add, 0)[2][:3] == [4, 5, 7])
+
+def test_levelwise_ufuncs():
+    numpy = pytest.importorskip('numpy')
+    tree = ITree.from_nested_list([1, utils.generate_nested_list(3000, 40)])
+    tree.root.children[3].delete_subtree()
+    for fn, ufunc in ((operator.add, numpy.add), (max, numpy.maximum)):
+        expected = tree.reduce_up(fn)
+        reduced = tree.reduce_up(ufunc)
+        assert([list(each) for each in reduced] == expected)
+    expected = tree.reduce_up(operator.add, lambda data: 1)
+    assert([list(each) for each in tree.reduce_up(numpy.add, 1)] == expected)
+    expected = tree.broadcast_down(operator.add, 0)
+    broadcast = tree.broadcast_down(numpy.add, 0)
+    assert([list(each) for each in broadcast] == expected)
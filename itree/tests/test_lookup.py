@@ -0,0 +1,99 @@
+"""value index unittests"""
+import random
+import pytest
+from itree import (ITree, ITreeError, ITreeMatrix, ColumnarITreeMatrix, lookup,
+                   utils)
+from itree.structs import MAX_SHIFTS
+
+
+def scan(tree, key):
+    return [node.index for node in tree.traverse(output='node')
+            if node.data % 7 == key]
+
+def test_find():
+    tree = ITree.from_nested_list(['a', ['b', ['c', 'b'], 'd']])
+    with pytest.raises(ITreeError):
+        tree.find('b')
+    tree.add_value_index()
+    assert(tree.find('b').index == (1, 0))
+    assert([node.index for node in tree.find_all('b')] == [(1, 0), (2, 1)])
+    assert(tree.find('z') is None and tree.find_all('z') == [])
+    tree.remove_value_index()
+    with pytest.raises(ITreeError):
+        tree.find('b')
+
+def test_find_follows_changes():
+    random.seed(21)
+    for matrix in (ITreeMatrix(), ColumnarITreeMatrix(),
+                   ITreeMatrix(tombstones=True)):
+        tree = ITree.from_nested_list([0, utils.generate_nested_list(300, 10)],
+                                      tree=matrix)
+        tree.add_value_index(key=lambda data: data % 7)
+        for step in range(300):
+            nodes = list(tree.traverse(output='node'))
+            node = random.choice(nodes)
+            action = random.random()
+            if action < 0.4:
+                node.append_child(random.randrange(100))
+            elif action < 0.7:
+                node.data = random.randrange(100)
+            elif node.index != (0, 0) and not list(node.children):
+                node.delete()
+            if step % 10 == 0:
+                for key in range(7):
+                    assert([each.index for each in tree.find_all(key)] ==
+                           sorted(scan(tree, key)))
+        tree.compact()
+        tree.bulk_append([(tree.root, 3)])
+        for key in range(7):
+            assert([each.index for each in tree.find_all(key)] ==
+                   sorted(scan(tree, key)))
+
+def test_find_after_many_shifts():
+    for matrix in (ITreeMatrix(), ColumnarITreeMatrix()):
+        tree = ITree.from_nested_list([0, [1, [2], 3, [4]]], tree=matrix)
+        tree.add_value_index()
+        assert(tree.find(4).index == (2, 1))
+        # every child of 1 goes left of 4 and shifts it, past MAX_SHIFTS
+        # the level is rebuilt
+        for count, datum in enumerate(range(100, 100 + 2 * MAX_SHIFTS)):
+            tree[1, 0].append_child(datum)
+            if count % 50 == 0:
+                assert(tree.find(4).index == (2, count + 2))
+                assert(tree.find(datum).index == (2, count + 1))
+        assert(tree.find(4).index == (2, 2 * MAX_SHIFTS + 1))
+        tree[2, 0].delete()
+        tree.find(4).data = 5
+        assert(tree.find(4) is None)
+        assert(tree.find(5).index == (2, 2 * MAX_SHIFTS))
+        assert([node.data for node in tree.find_all(100)] == [100])
+
+def test_find_after_insert_replays_shifts(monkeypatch):
+    # finds used to reindex the level that shifted, and to probe every level
+    builds, probes = [], []
+    build, columns = lookup.ValueIndex._build, lookup.ValueIndex._columns
+    monkeypatch.setattr(lookup.ValueIndex, '_build', lambda index, row:
+                        builds.append(row) or build(index, row))
+    monkeypatch.setattr(lookup.ValueIndex, '_columns', lambda index, row, key:
+                        probes.append(row) or columns(index, row, key))
+    tree = utils.branching_tree(50000, 50)
+    tree.add_value_index()
+    tree.find(0)
+    index = lookup.get_value_index(tree.tree)
+    del builds[:], probes[:]
+    for datum in range(-1, -201, -1):
+        tree[2, -datum * 4].append_child(datum)
+        assert(tree.find(datum).data == datum)
+    # the parents all have children, so each insert shifts the level. the
+    # shifts are logged and replayed, one level is probed per find
+    assert(builds == [] and not index.stale)
+    assert(len(index.shifts[3]) == 200)
+    assert(probes == [3] * 200)
+    chain = utils.chain(20000)
+    chain.add_value_index()
+    chain.find(0)
+    del builds[:], probes[:]
+    for datum in range(0, 20000, 100):
+        assert(chain.find(datum).index == (datum, 0))
+    assert(builds == [])
+    assert(probes == list(range(0, 20000, 100)))
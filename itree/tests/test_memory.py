@@ -0,0 +1,59 @@
+"""memory accounting and compaction unittests"""
+from itree import ITree, ColumnarITreeMatrix, utils
+
+
+def test_memory_usage():
+    for matrix in (None, ColumnarITreeMatrix()):
+        tree = ITree.from_nested_list([0, utils.generate_nested_list(300, 10)],
+                                      tree=matrix)
+        usage = tree.memory_usage()
+        assert(len(usage['levels']) == tree.height)
+        assert(usage['structure'] > 0 and usage['data'] > 0)
+        assert(usage['total'] == usage['structure'] + usage['data'])
+        assert(usage['data'] == sum(level['data']
+                                    for level in usage['levels']))
+
+def test_memory_usage_deep_and_shared():
+    payload = tuple(range(1000, 1100))
+    tree = ITree.from_nested_list([payload, [payload, payload]])
+    shallow = tree.memory_usage()
+    deep = tree.memory_usage(deep=True)
+    # the payload is counted once, not once per node
+    assert(deep['data'] - shallow['data'] < 2 * 100 * 32)
+    assert(deep['data'] > shallow['data'])
+    assert(deep['structure'] == shallow['structure'])
+
+def test_compact_rebuild():
+    tree = ITree.from_nested_list([0, list(range(1, 2001))])
+    nested = tree.to_nested_list()
+    before = tree.memory_usage()['levels'][1]['structure']
+    for sibling_index in range(1999, 9, -1):
+        tree.tree.remove_node(1, sibling_index)
+    assert(tree.compact(rebuild=True) == 0)
+    after = tree.memory_usage()['levels'][1]['structure']
+    assert(after < before)
+    assert(tree.to_nested_list() == nested[:1] + [nested[1][:10]])
+
+def test_compact_intern():
+    for matrix in (None, ColumnarITreeMatrix(tombstones=True)):
+        words = [''.join(['word', str(i % 3)]) for i in range(30)]
+        tree = ITree.from_nested_list([1.0, [1, True] + words], tree=matrix)
+        tree[1, 0].delete()
+        before = tree.memory_usage()['data']
+        tree.compact(intern=True)
+        data = [node.data for node in tree.root.children]
+        assert(data == [True] + words)
+        assert(len(set(map(id, data[1:]))) == 3)
+        # equal values of different types are kept apart
+        assert(type(tree.root.data) is float and data[0] is True)
+        assert(tree.memory_usage()['data'] < before)
+
+def test_memory_usage_mmap(tmp_path):
+    tree = ITree.from_nested_list([0, [1, 2, 3]])
+    path = str(tmp_path / 'tree.itree')
+    tree.save(path)
+    mapped = ITree.open_mmap(path)
+    usage = mapped.memory_usage()
+    # three index columns and the offsets of the encoded data
+    assert(usage['levels'][1]['structure'] == 3 * 3 * 8 + 4 * 8)
+    mapped.tree.close()
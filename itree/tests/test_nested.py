@@ -0,0 +1,109 @@
+"""nested list format unittests"""
+import io
+import json
+import pytest
+from itree import ITree, ITreeError, utils
+
+
+def test_from_nested_list_transformer():
+    tree = ITree.from_nested_list([1, [2, [3], 4]], transformer=str)
+    assert(tree.to_nested_list() == ['1', ['2', ['3'], '4']])
+
+def test_from_nested_list_deeper_than_recursion_limit():
+    nested_list = leaf = [0]
+    for data in range(1, 20000):
+        child = [data]
+        leaf.append(child)
+        leaf = child
+    tree = ITree.from_nested_list(nested_list)
+    assert(tree.height == 20000)
+    assert(tree[19999, 0].parent.data == 19998)
+
+def test_from_nested_list_fills_levels_in_order():
+    tree = ITree.from_nested_list([0, [1, [3, 4], 2, [5, [6]]]])
+    assert([node.data for node in tree] == list(range(7)))
+    assert([each.data for each in tree[1, 1].children] == [5])
+
+def test_from_nested_list_invalid():
+    with pytest.raises(ITreeError):
+        ITree.from_nested_list([1, [2], 3])
+    with pytest.raises(ITreeError):
+        ITree.from_nested_list([1, 2])
+    with pytest.raises(ITreeError):
+        ITree.from_nested_list([1, [[2]]])
+    with pytest.raises(ITreeError):
+        ITree.from_nested_list([1, [2, [3], [4]]])
+
+def test_to_nested_list_node_transformer():
+    tree = ITree.from_nested_list([1, [2, [3], 4]])
+    nested_list = tree.to_nested_list(transformer=lambda node: node.index)
+    assert(nested_list == [(0, 0), [(1, 0), [(2, 0)], (1, 1)]])
+    assert(ITree.from_nested_list([7]).to_nested_list() == 7)
+
+def test_to_nested_list_deeper_than_recursion_limit():
+    nested_list = leaf = [0]
+    for data in range(1, 20000):
+        child = [data]
+        leaf.append(child)
+        leaf = child
+    tree = ITree.from_nested_list(nested_list)
+    exported = tree.to_nested_list()
+    for data in range(19998):
+        assert(exported[0] == data)
+        exported = exported[1]
+    assert(exported == [19998, [19999]])
+
+def test_write_nested_json():
+    multi_list = [1, utils.generate_nested_list(5000, 30)]
+    tree = ITree.from_nested_list(multi_list)
+    chunks = list(tree.iter_nested_json(chunk_size=100))
+    assert(len(chunks) > 1)
+    assert(''.join(chunks) == json.dumps(multi_list))
+    fileobj = io.StringIO()
+    tree.write_nested_json(fileobj, transformer=lambda node: node.data * 2)
+    assert(json.loads(fileobj.getvalue()) ==
+           tree.to_nested_list(transformer=lambda node: node.data * 2))
+
+def test_from_nested_json_stream():
+    multi_list = [1, utils.generate_nested_list(5000, 30)]
+    tree = ITree.from_nested_list(multi_list)
+    fileobj = io.StringIO()
+    tree.write_nested_json(fileobj)
+    for chunk_size in (1, 7, 65536):
+        fileobj.seek(0)
+        loaded = ITree.from_nested_json_stream(fileobj, chunk_size=chunk_size)
+        assert(loaded.to_nested_list() == multi_list)
+
+def test_from_nested_json_stream_values():
+    nested_list = ['résumé "\\[', [{'a': [1, 2], 'b': '}]'}, [None],
+                                             -12.5e3, [True, False], 'x']]
+    text = json.dumps(nested_list, ensure_ascii=False)
+    for chunk_size in (1, 3, 100):
+        fileobj = io.BytesIO(text.encode('utf-8'))
+        tree = ITree.from_nested_json_stream(fileobj, chunk_size=chunk_size)
+        assert(tree.to_nested_list() == nested_list)
+    tree = ITree.from_nested_json_stream(io.StringIO(' 7 '), transformer=str)
+    assert(tree.to_nested_list() == '7')
+
+def test_from_nested_json_stream_numbers_across_chunks():
+    # a number cut right after its ., e or - decodes as a shorter number,
+    # the loader has to read on
+    nested_list = [0, [1.5, -2.25e-3, 3E+10, -0.5, 10, 1e5, 123.456e-7]]
+    for prefix in ('', ' ', '  ', '   ', '    '):
+        text = prefix + json.dumps(nested_list)
+        for chunk_size in range(1, 12):
+            tree = ITree.from_nested_json_stream(io.StringIO(text),
+                                                 chunk_size=chunk_size)
+            assert(tree.to_nested_list() == nested_list)
+    text = '    ' + json.dumps([0, [1.5] * 20000])
+    tree = ITree.from_nested_json_stream(io.StringIO(text))
+    assert(len(tree) == 20001)
+
+def test_from_nested_json_stream_invalid():
+    for text in ('[1, [2], 3]', '[1, 2]', '[1, [[2]]]', '[1, [2, [3], [4]]]'):
+        with pytest.raises(ITreeError):
+            ITree.from_nested_json_stream(io.StringIO(text))
+    for text in ('[1, [2]', '[1, [2,]]', '[1 [2]]', '[1, [2]] 3', '[1, [x]]',
+                 '[1, ["2]]'):
+        with pytest.raises(ValueError):
+            ITree.from_nested_json_stream(io.StringIO(text), chunk_size=2)
@@ -0,0 +1,27 @@
+"""process pool map and reduce unittests"""
+import operator
+from itree import ITree, ColumnarITreeMatrix, utils
+from itree.parallel import parallel_reduce_up
+
+
+def test_parallel_map():
+    tree = ITree.from_nested_list([1, utils.generate_nested_list(3000, 300)])
+    tree.root.children[0].delete_subtree()
+    expected = [[str(node.data) for node in level] for level in
+                tree.tree.levels]
+    assert(tree.parallel_map(str, workers=2) == expected)
+
+def test_parallel_reduce_up():
+    for matrix in (None, ColumnarITreeMatrix(tombstones=True)):
+        tree = ITree.from_nested_list(
+            [1, utils.generate_nested_list(3000, 300)], tree=matrix)
+        for node in reversed(tree.root.children[2].children):
+            if not node.children:
+                node.delete()
+        for fn, init in ((operator.add, None), (operator.add, 1), (max, -1)):
+            assert(tree.parallel_reduce_up(fn, init, workers=2) ==
+                   tree.reduce_up(fn, init))
+        # subtrees split on a deeper level
+        assert(parallel_reduce_up(tree.tree, operator.add, workers=2,
+                                  chunks=len(tree.tree.levels[1]) + 1) ==
+               tree.reduce_up(operator.add))
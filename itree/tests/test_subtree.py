@@ -0,0 +1,81 @@
+"""subtree range and extraction unittests"""
+import random
+from itree import ITree, ITreeMatrix, ColumnarITreeMatrix, utils
+
+NESTED_LIST = [0, [1, [3, 4, [7, 8]], 2, [5, [9], 6]]]
+
+
+def test_subtree_ranges():
+    tree = ITree.from_nested_list(NESTED_LIST)
+    assert(tree[1, 1].subtree_ranges() == [(1, 1, 2), (2, 2, 4), (3, 2, 3)])
+    assert(tree[2, 0].subtree_ranges() == [(2, 0, 1)])
+    assert(tree.root.subtree_ranges()[-1] == (3, 0, 3))
+
+def test_subtree_size():
+    tree = ITree.from_nested_list(NESTED_LIST)
+    assert(tree.root.subtree_size() == len(tree))
+    assert(tree[1, 0].subtree_size() == 5)
+    assert(tree[2, 3].subtree_size() == 1)
+
+def test_extract_subtree():
+    tree = ITree.from_nested_list(NESTED_LIST)
+    subtree = tree[1, 1].extract_subtree()
+    assert(subtree.to_nested_list() == [2, [5, [9], 6]])
+    subtree[1, 1].append_child(10)
+    assert(len(tree) == 10)
+    assert(subtree.to_nested_list() == [2, [5, [9], 6, [10]]])
+
+def test_extract_subtree_matches_original():
+    multi_list = [1, utils.generate_nested_list(3000, 40)]
+    for matrix in (None, ColumnarITreeMatrix()):
+        tree = ITree.from_nested_list(multi_list, tree=matrix)
+        for node in tree.root.children[:50]:
+            subtree = node.extract_subtree()
+            assert(type(subtree.tree) is type(tree.tree))
+            assert(len(subtree) == node.subtree_size())
+            for order in ('levelorder', 'preorder', 'postorder'):
+                assert(list(subtree.traverse(order, output='data')) ==
+                       list(node.traverse(order, output='data')))
+
+def test_delete_subtree():
+    tree = ITree.from_nested_list(NESTED_LIST)
+    assert(tree[1, 0].delete_subtree() == 5)
+    assert(len(tree) == 5)
+    assert(tree.to_nested_list() == [0, [2, [5, [9], 6]]])
+    assert(tree[3, 0].parent.parent.data == 2)
+
+def test_delete_subtree_root():
+    tree = ITree.from_nested_list(NESTED_LIST)
+    assert(tree.root.delete_subtree() == 10)
+    assert(len(tree) == 0)
+    assert(tree.height == 0)
+    tree.set_root('b')
+    assert(tree.root.data == 'b')
+
+def test_delete_subtree_matches_nested_list():
+    # seed 0 gives a tree whose first child has children in the 4th round
+    rng = random.Random(0)
+    for _ in range(5):
+        multi_list = [-1, utils.generate_nested_list(1500, 40, rng)]
+        for matrix in (None, ColumnarITreeMatrix()):
+            tree = ITree.from_nested_list(multi_list, tree=matrix)
+            expected = list(multi_list[1])
+            while len(expected) > 10:
+                # delete the second child of the root, with its subtree
+                tree.root.children[1].delete_subtree()
+                # skip the children of the first child, if it has any
+                second = 2 if isinstance(expected[1], list) else 1
+                del expected[second]
+                if isinstance(expected[second], list):
+                    del expected[second]
+                assert(tree.to_nested_list() == [-1, expected])
+
+def test_delete_subtree_with_tombstones():
+    matrix = ITreeMatrix(tombstones=True, compact_threshold=None)
+    tree = ITree.from_nested_list(NESTED_LIST, tree=matrix)
+    tree[3, 0].delete()
+    tree[3, 2].delete()
+    assert(tree[1, 0].delete_subtree() == 4)
+    assert(len(tree) == 4)
+    assert(tree.tree.dead == 1)
+    assert(tree.to_nested_list() == [0, [2, [5, 6]]])
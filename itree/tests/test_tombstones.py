@@ -0,0 +1,111 @@
+"""tombstone deletion and compaction unittests"""
+import random
+import pytest
+from itree import ITree, ITreeError, ITreeMatrix, ColumnarITreeMatrix, utils
+
+NESTED_LIST = [0, [1, [3, 4, [7, 8]], 2, [5, [9], 6]]]
+
+
+def tombstone_tree(**kwargs):
+    matrix = ITreeMatrix(tombstones=True, **kwargs)
+    return ITree.from_nested_list(NESTED_LIST, tree=matrix)
+
+def test_tombstone_delete_keeps_indices():
+    tree = tombstone_tree(compact_threshold=None)
+    tree[2, 0].delete()
+    assert(len(tree) == 9)
+    assert(tree[2, 1].data == 4)
+    assert(tree[3, 0].parent.data == 4)
+    with pytest.raises(ITreeError):
+        tree[2, 0]
+    assert([node.data for node in tree[1, 0].children] == [4])
+    assert(4 in [node.data for node in tree])
+    assert(3 not in [node.data for node in tree])
+
+def test_tombstone_exports_skip_dead():
+    tree = tombstone_tree(compact_threshold=None)
+    four = tree[2, 1]
+    for index in ((3, 0), (3, 1), (2, 0)):
+        tree[index].delete()
+    four.delete()
+    assert(tree.to_nested_list() == [0, [1, 2, [5, [9], 6]]])
+    assert(list(tree.traverse('preorder', output='data')) ==
+           [0, 1, 2, 5, 9, 6])
+    assert(list(tree.traverse('postorder', output='data')) ==
+           [1, 9, 5, 6, 2, 0])
+    assert(tree[1, 0].subtree_size() == 1)
+    with pytest.raises(ITreeError):
+        four.append_child(10)
+
+def test_tombstone_compact():
+    tree = tombstone_tree(compact_threshold=None)
+    tree[2, 0].delete()
+    tree[2, 3].delete()
+    assert(tree.tree.dead == 2)
+    assert(tree.compact() == 2)
+    assert(tree.tree.dead == 0)
+    assert(tree.to_nested_list() == [0, [1, [4, [7, 8]], 2, [5, [9]]]])
+    assert([node.data for node in tree.tree.levels[2]] == [4, 5])
+    assert(tree[3, 2].parent.data == 5)
+
+def test_tombstone_compact_threshold():
+    tree = tombstone_tree(compact_threshold=0.5)
+    tree[3, 0].delete()
+    assert(len(tree.tree.levels[3]) == 3)
+    tree[3, 1].delete()
+    assert([node.data for node in tree.tree.levels[3]] == [9])
+    assert(tree[3, 0].parent.data == 5)
+    assert(tree.to_nested_list() == [0, [1, [3, 4], 2, [5, [9], 6]]])
+
+def test_tombstone_delete_root():
+    tree = ITree(tree=ITreeMatrix(tombstones=True))
+    tree.append_child('dog')
+    tree.root.delete()
+    assert(len(tree) == 0)
+    tree.set_root('cat')
+    assert(tree.root.data == 'cat')
+    assert(len(tree) == 1)
+
+def test_remove_node_shifts_cousins():
+    tree = ITree.from_nested_list(NESTED_LIST)
+    tree[2, 0].delete()
+    assert([node.data for node in tree[1, 0].children] == [4])
+    assert(tree[3, 0].parent.data == 4)
+    assert(tree.to_nested_list() == [0, [1, [4, [7, 8]], 2, [5, [9], 6]]])
+
+def test_prune():
+    tree = ITree.from_nested_list(NESTED_LIST)
+    assert(tree.prune(lambda data: data % 2 == 0) == 2)
+    assert(tree.to_nested_list() == [0, [1, [3, 4, [7]], 2, [5, [9]]]])
+
+def test_tombstones_match_plain_deletes():
+    multi_list = [-1, utils.generate_nested_list(1000, 20)]
+    for matrix in (ITreeMatrix(tombstones=True, compact_threshold=0.3),
+                   ColumnarITreeMatrix(tombstones=True)):
+        random.seed(5)
+        plain = ITree.from_nested_list(multi_list)
+        tree = ITree.from_nested_list(multi_list, tree=matrix)
+        for _ in range(200):
+            leaf = random.choice([node for node in tree if not node.children])
+            twin = next(node for node in plain if node.data == leaf.data)
+            leaf.delete()
+            twin.delete()
+        assert(len(tree) == len(plain))
+        assert(tree.to_nested_list() == plain.to_nested_list())
+
+def test_children_of_deep_trees_reads_one_level(monkeypatch):
+    # children used to sum the tombstones of every level, so walking down
+    # a chain was quadratic in its height (20s for 20000 levels)
+    tree = ITree.from_arrays([[-1]] + [[0]] * 2000,
+                             tree=ITreeMatrix(tombstones=True))
+    tree[2000, 0].delete()
+    scans = []
+    dead = ITreeMatrix.dead
+    monkeypatch.setattr(ITreeMatrix, 'dead', property(
+        lambda matrix: scans.append(matrix) or dead.fget(matrix)))
+    node, depth = tree.root, 0
+    while node.children:
+        node, depth = node.children[0], depth + 1
+    assert(depth == 1999)
+    # only the tombstones of the child level were looked at
+    assert(scans == [])
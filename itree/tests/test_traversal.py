@@ -0,0 +1,54 @@
+"""itree traversal unittests"""
+import pytest
+from itree import ITree, ITreeError
+
+NESTED_LIST = [0, [1, [3, 4, [7, 8]], 2, [5, [9], 6]]]
+
+
+def test_levelorder():
+    tree = ITree.from_nested_list(NESTED_LIST)
+    assert(list(tree.traverse(output='data')) == list(range(10)))
+    assert([node.data for node in tree.traverse()] == list(range(10)))
+
+def test_preorder():
+    tree = ITree.from_nested_list(NESTED_LIST)
+    data = list(tree.traverse('preorder', output='data'))
+    assert(data == [0, 1, 3, 4, 7, 8, 2, 5, 9, 6])
+
+def test_postorder():
+    tree = ITree.from_nested_list(NESTED_LIST)
+    data = list(tree.traverse('postorder', output='data'))
+    assert(data == [3, 7, 8, 4, 1, 9, 5, 6, 2, 0])
+
+def test_traverse_indices():
+    tree = ITree.from_nested_list(NESTED_LIST)
+    indices = list(tree.traverse('preorder', output='index'))
+    assert(indices[:3] == [(0, 0), (1, 0), (2, 0)])
+    assert(sorted(indices) == sorted(n.index for n in tree))
+
+def test_traverse_subtree():
+    tree = ITree.from_nested_list(NESTED_LIST)
+    two = tree[1, 1]
+    assert(list(two.traverse(output='data')) == [2, 5, 6, 9])
+    assert(list(two.traverse('preorder', output='data')) == [2, 5, 9, 6])
+    assert(list(tree.traverse('postorder', start=(1, 1),
+                              output='data')) == [9, 5, 6, 2])
+
+def test_traverse_max_depth():
+    tree = ITree.from_nested_list(NESTED_LIST)
+    for order in ('levelorder', 'preorder', 'postorder'):
+        data = tree.traverse(order, max_depth=1, output='data')
+        assert(sorted(data) == [0, 1, 2])
+        data = tree[1, 0].traverse(order, max_depth=0, output='data')
+        assert(list(data) == [1])
+    data = tree[1, 0].traverse('postorder', max_depth=1, output='data')
+    assert(list(data) == [3, 4, 1])
+
+def test_traverse_invalid():
+    tree = ITree.from_nested_list(NESTED_LIST)
+    with pytest.raises(ITreeError):
+        tree.traverse('inorder')
+    with pytest.raises(ITreeError):
+        tree.traverse(output='proxy')
+    with pytest.raises(ITreeError):
+        tree.traverse(start=(5, 0))
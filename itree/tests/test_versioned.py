@@ -0,0 +1,55 @@
+"""versioned itree unittests"""
+import threading
+import pytest
+from itree import ITree, ITreeError, VersionedITree, utils
+
+
+def test_write_publishes_new_version():
+    versioned = VersionedITree(ITree.from_nested_list([0, [1, 2]]))
+    before = versioned.read()
+    with versioned.write() as tree:
+        tree[1, 0].append_child(3)
+        tree[1, 1].data = 4
+        # readers don't see a batch until it is published
+        assert(versioned.read() is before)
+    assert(versioned.version == 1)
+    assert(versioned.read().to_nested_list() == [0, [1, [3], 4]])
+    assert(before.to_nested_list() == [0, [1, 2]])
+    with pytest.raises(ITreeError):
+        versioned.read().root.append_child(5)
+
+def test_failed_write_is_not_published():
+    versioned = VersionedITree(ITree.from_nested_list([0, [1, 2]]))
+    with pytest.raises(KeyError):
+        with versioned.write() as tree:
+            tree.root.append_child(3)
+            raise KeyError('abort')
+    assert(versioned.version == 0)
+    assert(versioned.read().to_nested_list() == [0, [1, 2]])
+
+def test_readers_see_consistent_versions():
+    versioned = VersionedITree(ITree.from_nested_list(
+        [0, utils.generate_nested_list(500, 50)]))
+    errors = []
+    done = threading.Event()
+
+    def read():
+        while not done.is_set():
+            tree = versioned.read()
+            # every batch appends two nodes and adds two to the root data
+            if len(tree) != 501 + tree.root.data:
+                errors.append(tree.root.data)
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    for _ in range(100):
+        with versioned.write() as tree:
+            tree.root.children[0].append_child(-1)
+            tree.root.append_child(-2)
+            tree.root.data += 2
+    done.set()
+    for reader in readers:
+        reader.join()
+    assert(not errors)
+    assert(len(versioned.read()) == 501 + 200)
@@ -0,0 +1,151 @@
+"""iterative traversals of the tree in an ITreeMatrix. they all walk the
+matrix indices with an explicit stack (or level by level) and yield
+(level, sibling) index pairs, no node proxies are created."""
+from itree.structs import ITreeError, TOMBSTONE
+
+
+def levelorder(matrix, start=(0, 0), max_depth=None):
+    """breadth first traversal of the subtree rooted at :start:
+
+    :matrix: ITreeMatrix - the tree to traverse
+    :start: tuple - (level, sibling) of the node to start from
+    :max_depth: int - optional, how many levels below start to go down to
+
+    """
+    levels = matrix.levels
+    skip_dead = matrix.dead > 0
+    level_index, first = start
+    stop = first + 1
+    depth = 0
+    while first < stop:
+        level = levels[level_index]
+        for sibling_index in range(first, stop):
+            if skip_dead and level[sibling_index].data is TOMBSTONE:
+                continue
+            yield (level_index, sibling_index)
+        if max_depth is not None and depth >= max_depth:
+            return
+        first, stop = matrix.child_range(level_index, first, stop)
+        level_index += 1
+        depth += 1
+
+
+def preorder(matrix, start=(0, 0), max_depth=None):
+    """depth first traversal of the subtree rooted at :start: that visits
+    each node before its children
+
+    :matrix: ITreeMatrix - the tree to traverse
+    :start: tuple - (level, sibling) of the node to start from
+    :max_depth: int - optional, how many levels below start to go down to
+
+    """
+    start_level, start_sibling = start
+    # the child ranges are read straight off the nodes
+    matrix.settle(start_level)
+    levels = matrix.levels
+    skip_dead = matrix.dead > 0
+    deepest = None if max_depth is None else start_level + max_depth
+    yield start
+    node = levels[start_level][start_sibling]
+    if node._first_child_index is None or max_depth == 0:
+        return
+    stack = [[start_level + 1, node._first_child_index,
+              node._last_child_index]]
+    while stack:
+        frame = stack[-1]
+        level_index, sibling_index, last_index = frame
+        if sibling_index > last_index:
+            stack.pop()
+            continue
+        frame[1] = sibling_index + 1
+        # deleted nodes only have deleted descendants, skip them all
+        if skip_dead:
+            node = levels[level_index][sibling_index]
+            if node.data is TOMBSTONE:
+                continue
+        yield (level_index, sibling_index)
+        if deepest is None or level_index < deepest:
+            node = levels[level_index][sibling_index]
+            if node._first_child_index is not None:
+                stack.append([level_index + 1, node._first_child_index,
+                              node._last_child_index])
+
+
+def postorder(matrix, start=(0, 0), max_depth=None):
+    """depth first traversal of the subtree rooted at :start: that visits
+    each node after its children
+
+    :matrix: ITreeMatrix - the tree to traverse
+    :start: tuple - (level, sibling) of the node to start from
+    :max_depth: int - optional, how many levels below start to go down to
+
+    """
+    start_level, start_sibling = start
+    matrix.settle(start_level)
+    levels = matrix.levels
+    skip_dead = matrix.dead > 0
+    deepest = None if max_depth is None else start_level + max_depth
+    node = levels[start_level][start_sibling]
+    if node._first_child_index is None or max_depth == 0:
+        yield start
+        return
+    # each frame also remembers the parent of its range, we visit the parent
+    # once we are done with the range
+    stack = [[start_level + 1, node._first_child_index,
+              node._last_child_index, start_sibling]]
+    while stack:
+        frame = stack[-1]
+        level_index, sibling_index, last_index, parent_index = frame
+        if sibling_index > last_index:
+            stack.pop()
+            yield (level_index - 1, parent_index)
+            continue
+        frame[1] = sibling_index + 1
+        node = levels[level_index][sibling_index]
+        if skip_dead and node.data is TOMBSTONE:
+            continue
+        if ((deepest is None or level_index < deepest) and
+                node._first_child_index is not None):
+            stack.append([level_index + 1, node._first_child_index,
+                          node._last_child_index, sibling_index])
+        else:
+            yield (level_index, sibling_index)
+
+
+ORDERS = {'levelorder': levelorder,
+          'preorder': preorder,
+          'postorder': postorder}
+
+OUTPUTS = ('node', 'index', 'data')
+
+
+def traverse(matrix, order='levelorder', start=(0, 0), max_depth=None,
+             output='index', make_node=None):
+    """traverse the subtree of :matrix: rooted at :start:
+
+    :order: str - one of levelorder, preorder, postorder
+    :output: str - what to yield for each node, one of:
+        index - (level, sibling) tuples
+        data - the data of the node
+        node - node proxies
+    :make_node: callable - makes the proxy for a (level, sibling) when
+    output is node
+
+    """
+    try:
+        walk = ORDERS[order]
+    except KeyError:
+        raise ITreeError('unknown traversal order %s, expected one of %s'
+                         % (order, ', '.join(sorted(ORDERS))))
+    if output not in OUTPUTS:
+        raise ITreeError('unknown traversal output %s, expected one of %s'
+                         % (output, ', '.join(OUTPUTS)))
+    indices = walk(matrix, start, max_depth)
+    if output == 'index':
+        return indices
+    if output == 'data':
+        levels = matrix.levels
+        return (levels[level_index][sibling_index].data
+                for level_index, sibling_index in indices)
+    return (make_node(level_index, sibling_index)
+            for level_index, sibling_index in indices)
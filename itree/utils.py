@@ -1,9 +1,19 @@
 import json
 import random
 
+from itree import ITree, ITreeError
 
-def generate_nested_list(num_elem, num_sublists):
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def generate_nested_list(num_elem, num_sublists, rng=random):
     """ Generates a nested list from which a new tree may be initialized.
+
+    :rng: random.Random - optional, where the randomness comes from,
+    defaults to the random module
     """
     assert num_elem > 1
     assert num_sublists >= 0
@@ -11,8 +21,8 @@ def generate_nested_list(num_elem, num_sublists):
     r = 1
     for i in range(num_sublists):
         while(True):
-            open_b, close_b = sorted([random.randrange(r, len(l) - r),
-                                      random.randrange(r, len(l) - r)])
+            open_b, close_b = sorted([rng.randrange(r, len(l) - r),
+                                      rng.randrange(r, len(l) - r)])
             if abs(open_b - close_b) <= r:
                 continue
             # we want brackets to be at least r positions apart
@@ -29,3 +39,195 @@ def generate_nested_list(num_elem, num_sublists):
             num += 1
     string_list = '[%s]' % ','.join(l).replace('[,', '[').replace(',]', ']')
     return json.loads(string_list)
+
+
+# generators of random trees of a given shape. they build the parent index
+# arrays of each level directly, in level order, so they take linear time
+# (numpy makes them vectorized) and trees of millions of nodes take seconds.
+# the same seed gives the same tree, for the same numpy (or no numpy).
+
+OUTPUTS = ('tree', 'arrays')
+
+
+def _rng(seed):
+    if numpy is not None:
+        return numpy.random.default_rng(seed)
+    return random.Random(seed)
+
+
+def _arange(start, stop):
+    if numpy is not None:
+        return numpy.arange(start, stop)
+    return list(range(start, stop))
+
+
+def _repeat(counts, limit):
+    """parent indices of the (first :limit: nodes of the) level below a
+    level whose nodes have :counts: children each"""
+    if numpy is not None:
+        counts = numpy.minimum(counts, limit)
+        stop = numpy.searchsorted(numpy.cumsum(counts), limit) + 1
+        return numpy.repeat(numpy.arange(len(counts[:stop])),
+                            counts[:stop])[:limit]
+    parents = []
+    for index, count in enumerate(counts):
+        parents.extend([index] * min(count, limit - len(parents)))
+        if len(parents) == limit:
+            break
+    return parents
+
+
+def _output(parents, output, args, kwargs, data=None):
+    """the tree made of :parents: as an ITree or as arrays. the data of each
+    node is its position in level order, unless :data: is given"""
+    if output not in OUTPUTS:
+        raise ITreeError('unknown output %s, expected one of %s'
+                         % (output, ', '.join(OUTPUTS)))
+    if data is None:
+        data, offset = [], 0
+        for level in parents:
+            data.append(_arange(offset, offset + len(level)))
+            offset += len(level)
+    if output == 'arrays':
+        return {'parent': parents, 'data': data}
+    return ITree.from_arrays(parents, data, *args, **kwargs)
+
+
+def _grow(size, children):
+    """parent indices of a tree of :size: nodes grown level by level.
+    children(width, depth) gives how many children each node of a level of
+    :width: nodes at :depth: has. the last level is cut short at size"""
+    if size < 1:
+        raise ITreeError('a tree needs at least one node')
+    parents = [_arange(-1, 0)]
+    left = size - 1
+    while left > 0:
+        level = _repeat(children(len(parents[-1]), len(parents) - 1), left)
+        if not len(level):
+            raise ITreeError('the tree stopped growing at %d nodes'
+                             % (size - left))
+        parents.append(level)
+        left -= len(level)
+    return parents
+
+
+def _spine(size, children):
+    """parent indices and data of a tree of :size: nodes where only the first
+    node of each level has children, :children: of them. these trees are as
+    deep as they are large, so the levels are built as plain lists in one
+    pass - growing them level by level costs a few numpy calls per node"""
+    if size < 1:
+        raise ITreeError('a tree needs at least one node')
+    parents, data = [[-1]], [[0]]
+    offset = 1
+    while offset < size:
+        width = min(children, size - offset)
+        parents.append([0] * width)
+        data.append(list(range(offset, offset + width)))
+        offset += width
+    return parents, data
+
+
+def branching_tree(size, branching=2, output='tree', *args, **kwargs):
+    """a complete tree where every node has :branching: children, the last
+    level is filled from the left
+
+    :size: int - how many nodes
+    :output: str - tree for an ITree, arrays for a dict of the parent and
+    data arrays of each level (see ITree.from_arrays)
+    :args: positional arguments to pass to the itree constructor
+    :kwargs: keyword arguments to pass to the itree constructor, eg:
+    tree=ColumnarITreeMatrix() which builds much faster for large trees
+
+    """
+    if branching < 1:
+        raise ITreeError('branching must be at least 1')
+    return _output(_grow(size, lambda width, depth: [branching] * width),
+                   output, args, kwargs)
+
+
+def chain(size, output='tree', *args, **kwargs):
+    """a tree where every node has one child - as deep as it gets. see
+    branching_tree for the arguments"""
+    parents, data = _spine(size, 1)
+    return _output(parents, output, args, kwargs, data)
+
+
+def caterpillar(size, legs=2, output='tree', *args, **kwargs):
+    """a chain (the spine) where every spine node also has :legs: leaf
+    children. the spine node is the first node of each level. see
+    branching_tree for the arguments"""
+    parents, data = _spine(size, legs + 1)
+    return _output(parents, output, args, kwargs, data)
+
+
+def power_law_tree(size, exponent=2., seed=None, output='tree', *args,
+                   **kwargs):
+    """a tree where the number of children k of each node follows a power
+    law, P(k) ~ (k + 1) ** -exponent, like the fan out of file systems or
+    web sites. if a level has no children at all one of its nodes gets one
+    so the tree reaches size. see branching_tree for the other arguments
+
+    :exponent: float - larger than 1, the smaller the heavier the tail
+    :seed: int - seed of the random numbers
+
+    """
+    if exponent <= 1:
+        raise ITreeError('the exponent must be larger than 1')
+    rng = _rng(seed)
+
+    def children(width, depth):
+        if numpy is not None:
+            counts = rng.zipf(exponent, width) - 1
+        else:
+            counts = [int(rng.paretovariate(exponent - 1)) - 1
+                      for _ in range(width)]
+        if not sum(counts):
+            counts[-1] = 1
+        return counts
+    return _output(_grow(size, children), output, args, kwargs)
+
+
+def random_recursive_tree(size, seed=None, output='tree', *args, **kwargs):
+    """a uniform random recursive tree - nodes are added one at a time and
+    each picks its parent uniformly from the nodes added before it. these
+    are wide and shallow, about e * ln(size) levels deep. see power_law_tree
+    for the arguments"""
+    if size < 1:
+        raise ITreeError('a tree needs at least one node')
+    rng = _rng(seed)
+    parents = [_arange(-1, 0)]
+    if numpy is not None:
+        # the parent of node i + 1 is uniform in 0..i
+        parent = (rng.random(size - 1) * numpy.arange(1, size)).astype(
+            numpy.int64)
+        # children grouped by parent, each group in the order it was added
+        children = numpy.argsort(parent, kind='stable') + 1
+        counts = numpy.bincount(parent, minlength=size)
+        starts = numpy.cumsum(counts) - counts
+        level = numpy.zeros(1, dtype=numpy.int64)
+        while True:
+            level_counts = counts[level]
+            total = int(level_counts.sum())
+            if not total:
+                break
+            # the positions of the children of the level, range by range
+            shift = starts[level] - (numpy.cumsum(level_counts) -
+                                     level_counts)
+            positions = numpy.repeat(shift, level_counts) + numpy.arange(total)
+            parents.append(numpy.repeat(numpy.arange(len(level)),
+                                        level_counts))
+            level = children[positions]
+    else:
+        children = [[] for _ in range(size)]
+        for node in range(1, size):
+            children[rng.randrange(node)].append(node)
+        level = [0]
+        while True:
+            below = [child for node in level for child in children[node]]
+            if not below:
+                break
+            parents.append([index for index, node in enumerate(level)
+                            for _ in children[node]])
+            level = below
+    return _output(parents, output, args, kwargs)
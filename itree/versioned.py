@@ -0,0 +1,56 @@
+"""an itree that can be read from many threads while one thread writes to it.
+readers always get a published version - a read only snapshot that never
+changes under them. writers change a copy on write clone of the latest
+version and publish it as the new version in one reference assignment once
+they are done, so readers see all of a batch of changes or none of it. the
+clone and the snapshot share every level the batch didn't touch, see
+ITreeMatrix.copy."""
+import threading
+from contextlib import contextmanager
+
+
+class VersionedITree(object):
+
+    """publishes versions of an ITree to concurrent readers, eg:
+
+        versioned = VersionedITree(tree)
+        # any number of reader threads
+        tree = versioned.read()
+        # writer threads
+        with versioned.write() as tree:
+            tree.root.append_child(1)
+    """
+
+    def __init__(self, tree):
+        """
+
+        :tree: ITree - the first version, it should not be changed directly
+        after this
+
+        """
+        # writers are serialized, readers never wait
+        self.lock = threading.Lock()
+        self.version = 0
+        self.published = tree.snapshot()
+
+    def read(self):
+        """get the latest published version
+
+        :returns: ITree - a read only snapshot, it stays the same however
+        many versions are published after it
+        """
+        return self.published
+
+    @contextmanager
+    def write(self):
+        """change the tree. yields a writable clone of the latest version,
+        which is published when the block exits. if the block raises,
+        nothing is published. writes through the matrix methods (appending,
+        deleting, setting node.data) are allowed, assigning to rows directly
+        is not.
+        """
+        with self.lock:
+            tree = self.published.clone()
+            yield tree
+            self.published = tree.snapshot()
+            self.version += 1